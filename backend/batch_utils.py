@@ -0,0 +1,255 @@
+# backend/batch_utils.py
+# BATCH FILE OPERATIONS
+# Applies many move / rename / delete operations in one request. Permissions are resolved in memory
+# for the whole batch, each operation reports its own result, and every database change - path
+# updates, deletions and activity entries - is written in one transaction. Deleted files are parked
+# in a trash directory until that transaction commits, so a failed commit puts the disk back.
+
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, String, column, delete, update, values
+from sqlalchemy.orm import Session
+
+from models import File as FileModel, ActivityLog
+from permission_utils import BatchPermissionChecker
+from folder_stats import file_change, record_changes
+from upload_utils import UPLOAD_STAGING_PATH
+from jobs import progress, cancel_requested
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+MAX_BATCH_OPERATIONS = int(os.getenv("MAX_BATCH_OPERATIONS", "1000"))
+
+# Rows per UPDATE ... FROM (VALUES ...) statement
+UPDATE_CHUNK_SIZE = 1000
+
+BATCH_OPERATIONS = ("move", "rename", "delete")
+
+
+def _db_path(path: str) -> str:
+    return "/" + path.strip().replace("\\", "/").strip("/")
+
+
+def _abs_path(db_path: str) -> str:
+    full_path = os.path.abspath(os.path.join(BASE_DIR, db_path.strip("/")))
+    if not full_path.startswith(BASE_DIR):
+        raise HTTPException(status_code=400, detail="Invalid path")
+    return full_path
+
+
+class _Batch:
+    """Filesystem changes made so far, kept so they can be undone if the commit fails."""
+
+    def __init__(self):
+        self.trash_dir = os.path.join(UPLOAD_STAGING_PATH, f"batch-{uuid.uuid4().hex}")
+        self.renamed = []    # (old absolute path, new absolute path)
+        self.trashed = []    # (original absolute path, path in trash)
+        self.updates = []    # {"id", "path", "name", "parent_id"} for moved and renamed records
+        self.deleted = []    # FileModel records
+        self.stats = []      # folder rollup changes (see folder_stats.py)
+        self.logs = []       # (action, target_path)
+
+    def rename(self, src: str, dest: str):
+        os.rename(src, dest)
+        self.renamed.append((src, dest))
+
+    def trash(self, full_path: str):
+        os.makedirs(self.trash_dir, exist_ok=True)
+        parked = os.path.join(self.trash_dir, str(len(self.trashed)))
+        os.rename(full_path, parked)
+        self.trashed.append((full_path, parked))
+
+    def undo(self):
+        for original, parked in reversed(self.trashed):
+            os.rename(parked, original)
+        for src, dest in reversed(self.renamed):
+            os.rename(dest, src)
+        shutil.rmtree(self.trash_dir, ignore_errors=True)
+
+    def empty_trash(self):
+        shutil.rmtree(self.trash_dir, ignore_errors=True)
+
+
+def _move(op, record, checker: BatchPermissionChecker, batch: _Batch) -> str:
+    if not op.destination_path:
+        raise HTTPException(status_code=400, detail="destination_path is required for move")
+    checker.check_parent_permission(os.path.dirname(record.path))
+    checker.check_parent_permission(op.destination_path)
+    src_path = _abs_path(record.path)
+    dest_folder = _abs_path(op.destination_path)
+    if not os.path.isdir(dest_folder):
+        raise HTTPException(status_code=404, detail="Destination folder not found")
+    dest_path = os.path.join(dest_folder, record.name)
+    if os.path.exists(dest_path):
+        raise HTTPException(status_code=409, detail="A file with the same name already exists at destination")
+    batch.rename(src_path, dest_path)
+    new_path = f"{_db_path(op.destination_path).rstrip('/')}/{record.name}"
+    dest_record = checker.records.get(_db_path(op.destination_path))
+    batch.updates.append({
+        "id": record.id, "path": new_path, "name": record.name, "parent_id": dest_record.id if dest_record else None
+    })
+    batch.stats += [
+        file_change(record.path, record.size, record.stored_size, -1),
+        file_change(new_path, record.size, record.stored_size)
+    ]
+    batch.logs.append(("Moved File", new_path))
+    return new_path
+
+
+def _rename(op, record, checker: BatchPermissionChecker, batch: _Batch) -> str:
+    new_name = (op.new_name or "").strip()
+    if not new_name or "/" in new_name or "\\" in new_name or new_name in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid new name")
+    checker.check_parent_permission(os.path.dirname(record.path))
+    if os.path.splitext(record.name)[1].lower() != os.path.splitext(new_name)[1].lower():
+        raise HTTPException(status_code=400, detail="Changing file extension is not allowed")
+    old_path = _abs_path(record.path)
+    new_full_path = os.path.join(os.path.dirname(old_path), new_name)
+    if os.path.exists(new_full_path):
+        raise HTTPException(status_code=409, detail="A file with the new name already exists")
+    batch.rename(old_path, new_full_path)
+    new_path = f"{os.path.dirname(record.path).rstrip('/')}/{new_name}"
+    batch.updates.append({"id": record.id, "path": new_path, "name": new_name, "parent_id": record.parent_id})
+    batch.logs.append(("Rename File", new_path))
+    return new_path
+
+
+def _delete(op, record, checker: BatchPermissionChecker, batch: _Batch) -> None:
+    batch.trash(_abs_path(record.path))
+    batch.deleted.append(record)
+    batch.stats.append(file_change(record.path, record.size, record.stored_size, -1))
+    batch.logs.append(("Delete File", record.path))
+    return None
+
+
+_HANDLERS = {"move": _move, "rename": _rename, "delete": _delete}
+
+
+def _write_changes(db: Session, user_id: int, batch: _Batch):
+    """All database changes of the batch as a handful of statements; the caller commits."""
+    now = datetime.utcnow()
+    # Deleted first, so their paths are free for files renamed or moved onto them in the same batch
+    if batch.deleted:
+        db.execute(
+            delete(FileModel)
+            .where(FileModel.id.in_([record.id for record in batch.deleted]))
+            .execution_options(synchronize_session=False)
+        )
+    # Rows left at target paths by out-of-band deletes; rows this batch moves away are not stale
+    from tree_utils import drop_stale_rows
+    drop_stale_rows(db, [row["path"] for row in batch.updates], keep_ids=[row["id"] for row in batch.updates])
+    for i in range(0, len(batch.updates), UPDATE_CHUNK_SIZE):
+        chunk = batch.updates[i:i + UPDATE_CHUNK_SIZE]
+        new_values = values(
+            column("id", Integer), column("path", String), column("name", String), column("parent_id", Integer),
+            name="new_values"
+        ).data([(row["id"], row["path"], row["name"], row["parent_id"]) for row in chunk])
+        db.execute(
+            update(FileModel)
+            .where(FileModel.id == new_values.c.id)
+            .values(path=new_values.c.path, name=new_values.c.name, parent_id=new_values.c.parent_id, modified_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    record_changes(db, batch.stats)
+    timestamp = datetime.now(timezone.utc)
+    db.add_all([
+        ActivityLog(user_id=user_id, action=action, target_path=target_path, timestamp=timestamp)
+        for action, target_path in batch.logs
+    ])
+
+
+def _prepare(db: Session, user, operations: List):
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    paths = [_db_path(op.path) for op in operations]
+    checker = BatchPermissionChecker(
+        db, user,
+        paths + [_db_path(op.destination_path) for op in operations if op.op == "move" and op.destination_path]
+    )
+    return paths, checker
+
+
+def _check_operation(op, path: str, checker: BatchPermissionChecker, seen: set) -> FileModel:
+    """The record of the file op works on; HTTPException if op can't be applied."""
+    if op.op not in _HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation, expected one of {', '.join(BATCH_OPERATIONS)}")
+    if path in seen:
+        raise HTTPException(status_code=409, detail="Path is already used by an earlier operation in this batch")
+    seen.add(path)
+    record = checker.require_owner_or_admin(path)
+    if record.is_folder:
+        raise HTTPException(status_code=400, detail="Path is a folder, not a file")
+    if not os.path.isfile(_abs_path(path)):
+        raise HTTPException(status_code=404, detail="File not found")
+    return record
+
+
+def validate_batch(db: Session, user, operations: List):
+    """
+    The checks run_batch() applies to each operation, without applying any; raises the first
+    failure (detail prefixed with the operation's index). Used before a batch is run as a job.
+    """
+    paths, checker = _prepare(db, user, operations)
+    seen = set()
+    for index, (op, path) in enumerate(zip(operations, paths)):
+        try:
+            _check_operation(op, path, checker, seen)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Operation {index} ({path}): {e.detail}")
+
+
+def run_batch(db: Session, user, operations: List) -> List[dict]:
+    """
+    Apply operations in order and return one result per operation. A failing operation is
+    reported and skipped; the others still go through. Each file may appear in only one operation.
+    """
+    paths, checker = _prepare(db, user, operations)
+
+    batch = _Batch()
+    results = []
+    seen = set()
+    for index, (op, path) in enumerate(zip(operations, paths)):
+        result = {"index": index, "op": op.op, "path": path}
+        progress(index, len(operations))
+        if cancel_requested():
+            # Run as a job and cancelled: what was done so far is committed, the rest is skipped
+            result.update({"status": "error", "status_code": 499, "detail": "Cancelled"})
+            results.append(result)
+            continue
+        try:
+            record = _check_operation(op, path, checker, seen)
+            new_path = _HANDLERS[op.op](op, record, checker, batch)
+            result.update({"status": "ok", "new_path": new_path})
+        except HTTPException as e:
+            result.update({"status": "error", "status_code": e.status_code, "detail": e.detail})
+        except OSError as e:
+            print(f"Batch {op.op} failed for {path}: {e}")
+            result.update({"status": "error", "status_code": 500, "detail": f"Error during {op.op}"})
+        results.append(result)
+    progress(len(operations), len(operations))
+
+    if not batch.logs:
+        return results
+
+    released = [record.content_hash for record in batch.deleted]
+    try:
+        _write_changes(db, user.id, batch)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        batch.undo()
+        print(f"Batch commit failed, filesystem changes undone: {e}")
+        raise HTTPException(status_code=500, detail="Error saving batch changes")
+
+    batch.empty_trash()
+    if released:
+        # Drop shared blobs whose last reference was deleted
+        from blob_store import release_blobs
+        release_blobs(db, released)
+    return results
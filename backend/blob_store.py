@@ -0,0 +1,264 @@
+# backend/blob_store.py
+# CONTENT-ADDRESSABLE BLOB STORE (DEDUPLICATION)
+# With DEDUP_ENABLED, stored files are hard links to one blob per SHA-256 kept next to the
+# storage root. Identical uploads share a single copy on disk while every path in the tree stays
+# a regular file, so downloads, rename, move and the reconciler work unchanged.
+# files.content_hash references the blob; a blob is removed once no row references it and no
+# path in the tree still links to it. Stored files are never written in place (every write goes
+# to a new file that replaces the path), so a link can't change the content of the others. Blobs
+# keep their normal permissions: read-only links would block deletes and overwrites on Windows.
+
+import os
+import hashlib
+import secrets
+import threading
+from typing import Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import File as FileModel
+from compression import open_stored, read_header
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "false").lower() == "true"
+
+# Must be on the same filesystem as the storage tree (hard links); outside of it so listings never show blobs
+BLOB_STORE_PATH = os.path.abspath(
+    os.getenv("BLOB_STORE_PATH", os.path.join(os.path.dirname(BASE_DIR), ".blobs"))
+)
+
+# Rows hashed per backfill transaction
+BACKFILL_PAGE_SIZE = 500
+
+_backfill_lock = threading.Lock()
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(BLOB_STORE_PATH, digest[:2], digest[2:])
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of the logical content, the same digest the upload of the file recorded."""
+    digest = hashlib.sha256()
+    with open_stored(path) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def place_file(source: str, destination: str, digest: str, overwrite: bool = False) -> bool:
+    """
+    Move the finished file at source to destination through the blob store.
+    If a blob with this digest exists, destination becomes another link to it and source is
+    dropped; otherwise source becomes the blob. Returns False (and does nothing) when dedup is
+    disabled or the blob store can't hard-link into the tree, so the caller moves the file itself.
+    """
+    if not DEDUP_ENABLED:
+        return False
+    blob = blob_path(digest)
+    try:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if not _same_form(source, blob):
+            # One copy compressed at rest and the other not: a link would change how the path reads
+            return False
+        if not _adopt_blob(source, blob):
+            return False
+        _link(blob, destination, overwrite)
+    except OSError as e:
+        if isinstance(e, FileExistsError):
+            raise
+        # e.g. blob store on another filesystem
+        print(f"Blob store unavailable, storing {destination} without dedup: {e}")
+        return False
+    os.unlink(source)
+    return True
+
+
+def _adopt_blob(source: str, blob: str) -> bool:
+    """Make sure blob holds source's content; True when it does."""
+    try:
+        os.link(source, blob)
+        return True
+    except FileExistsError:
+        pass
+    # Same digest but a different size means the blob was damaged; replace it with source
+    if _logical_size(blob) != _logical_size(source):
+        print(f"Replacing damaged blob {blob}")
+        tmp = f"{blob}.{secrets.token_hex(4)}"
+        os.link(source, tmp)
+        os.replace(tmp, blob)
+    return True
+
+
+def _logical_size(path: str) -> int:
+    logical = read_header(path)
+    return os.path.getsize(path) if logical is None else logical
+
+
+def _same_form(path: str, blob: str) -> bool:
+    """False if blob exists and only one of path and blob is stored compressed."""
+    if not os.path.exists(blob):
+        return True
+    return (read_header(path) is None) == (read_header(blob) is None)
+
+
+def _link(blob: str, destination: str, overwrite: bool):
+    if not overwrite:
+        # Fails with FileExistsError instead of replacing a file that appeared meanwhile
+        os.link(blob, destination)
+        return
+    tmp = os.path.join(os.path.dirname(destination), f".{os.path.basename(destination)}.{secrets.token_hex(4)}")
+    os.link(blob, tmp)
+    os.replace(tmp, destination)
+
+
+def release_blobs(db: Session, digests: Iterable[Optional[str]]):
+    """
+    Remove the blobs of deleted rows that nothing refers to any more.
+    Call after the rows are deleted and committed. A blob still linked from the tree
+    (st_nlink > 1) is kept, even if the DB no longer knows the path.
+    """
+    digests = {d for d in digests if d}
+    if not digests:
+        return
+    still_used = {
+        d for (d,) in db.query(FileModel.content_hash).filter(FileModel.content_hash.in_(digests)).distinct()
+    }
+    for digest in digests - still_used:
+        _remove_if_unlinked(blob_path(digest))
+
+
+def _remove_if_unlinked(blob: str):
+    try:
+        if os.stat(blob).st_nlink == 1:
+            os.remove(blob)
+    except FileNotFoundError:
+        pass
+
+
+def collect_garbage(db: Session) -> int:
+    """Remove every blob that has no link in the tree and no referencing row. Returns the number removed."""
+    removed = 0
+    if not os.path.isdir(BLOB_STORE_PATH):
+        return removed
+    for prefix in os.listdir(BLOB_STORE_PATH):
+        prefix_dir = os.path.join(BLOB_STORE_PATH, prefix)
+        with os.scandir(prefix_dir) as entries:
+            candidates = [prefix + e.name for e in entries if e.is_file() and e.stat().st_nlink == 1]
+        if not candidates:
+            continue
+        used = {
+            d for (d,) in db.query(FileModel.content_hash).filter(FileModel.content_hash.in_(candidates)).distinct()
+        }
+        for digest in candidates:
+            if digest not in used:
+                _remove_if_unlinked(blob_path(digest))
+                removed += 1
+    return removed
+
+
+def dedup_report(db: Session) -> dict:
+    """Logical bytes (sum over all referencing files) vs physical bytes (one copy per blob, as stored)."""
+    rows = db.query(
+        FileModel.content_hash, func.count(FileModel.id), func.max(FileModel.size)
+    ).filter(
+        FileModel.is_folder == False,
+        FileModel.content_hash != None
+    ).group_by(FileModel.content_hash).all()
+
+    blobs = references = logical = physical = 0
+    for digest, count, size in rows:
+        try:
+            stored = os.path.getsize(blob_path(digest))
+        except FileNotFoundError:
+            continue  # stored before dedup was enabled (or without it), not shared
+        blobs += 1
+        references += count
+        logical += (size or 0) * count
+        physical += stored
+    return {
+        "enabled": DEDUP_ENABLED,
+        "blobs": blobs,
+        "references": references,
+        "logical_bytes": logical,
+        "physical_bytes": physical,
+        "saved_bytes": logical - physical,
+        "dedup_ratio": round(logical / physical, 2) if physical else 1.0
+    }
+
+
+def backfill():
+    """
+    Hash files stored before dedup existed and, with DEDUP_ENABLED, replace duplicates in
+    the tree with links to a shared blob. Runs in a background thread; only one at a time.
+    """
+    if not _backfill_lock.acquire(blocking=False):
+        return
+    db = SessionLocal()
+    try:
+        # Paged by id with a commit per page: a yield_per cursor would not survive the commits
+        processed = 0
+        last_id = 0
+        while True:
+            records = db.query(FileModel).filter(
+                FileModel.is_folder == False,
+                FileModel.content_hash == None,
+                FileModel.id > last_id
+            ).order_by(FileModel.id).limit(BACKFILL_PAGE_SIZE).all()
+            if not records:
+                break
+            last_id = records[-1].id
+            for record in records:
+                abs_path = os.path.abspath(os.path.join(BASE_DIR, record.path.strip("/")))
+                if not abs_path.startswith(BASE_DIR) or not os.path.isfile(abs_path):
+                    continue
+                try:
+                    digest = file_sha256(abs_path)
+                    if DEDUP_ENABLED:
+                        _relink(abs_path, digest)
+                    record.content_hash = digest
+                except OSError as e:
+                    print(f"Dedup backfill skipped {record.path}: {e}")
+                    continue
+                processed += 1
+            db.commit()
+        print(f"Dedup backfill done: {processed} files hashed")
+    finally:
+        db.close()
+        _backfill_lock.release()
+
+
+def _relink(abs_path: str, digest: str):
+    """Turn an existing file in the tree into a link to its blob."""
+    blob = blob_path(digest)
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    try:
+        os.link(abs_path, blob)
+    except FileExistsError:
+        if os.path.samefile(abs_path, blob) or not _same_form(abs_path, blob):
+            return
+        _link(blob, abs_path, overwrite=True)
+
+
+def link_copy(source: str, destination: str, digest: Optional[str]) -> bool:
+    """
+    Copy a stored file by adding one more link to its blob. Returns False (and does nothing)
+    when dedup is off or source isn't linked to the blob for digest, so the caller copies the bytes.
+    """
+    if not DEDUP_ENABLED or not digest:
+        return False
+    blob = blob_path(digest)
+    try:
+        if not os.path.samefile(source, blob):
+            return False
+        os.link(blob, destination)
+    except FileNotFoundError:
+        return False
+    except FileExistsError:
+        raise
+    except OSError as e:
+        print(f"Blob link failed for {destination}, copying instead: {e}")
+        return False
+    return True
@@ -0,0 +1,164 @@
+# backend/compression.py
+# TRANSPARENT COMPRESSION AT REST
+# With COMPRESSION_ENABLED, text-like uploads (documents, CSV, logs, XML, ...) are stored zstd
+# compressed when that actually saves space. A compressed file starts with a zstd skippable frame
+# that marks it and records its logical size, so it is still a valid .zst stream that can be sent
+# as-is to clients accepting Content-Encoding: zstd, and readers can tell compressed files apart
+# from plain ones without the database. Everything that reads stored bytes goes through open_stored().
+
+import io
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:
+    # Optional: without zstandard nothing is compressed (and compressed files can't be read)
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "false").lower() == "true"
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "3"))
+
+# Files are only kept compressed if that saves at least this fraction of their size
+COMPRESSION_MIN_SAVING = float(os.getenv("COMPRESSION_MIN_SAVING", "0.1"))
+COMPRESSION_MIN_SIZE = 4096
+
+# Formats that are not compressed already (DOCX/XLSX/PDF/images are, and are left alone)
+COMPRESSIBLE_EXTENSIONS = {
+    ".txt", ".md", ".csv", ".tsv", ".log", ".json", ".xml", ".html", ".htm", ".svg",
+    ".sql", ".yaml", ".yml", ".ini", ".rtf", ".doc", ".xls", ".ppt"
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+# Skippable frame (magic 0x184D2A50-5F) with a 12-byte payload: our tag and the logical size
+_SKIPPABLE_MAGIC = 0x184D2A5E
+_TAG = b"DMSZ"
+_HEADER = struct.Struct("<II4sQ")
+
+# Logical sizes keyed by (path, size, mtime_ns), so listings don't reopen unchanged files
+_SIZE_CACHE_SIZE = 16384
+_size_cache = OrderedDict()
+_size_lock = threading.Lock()
+
+
+def is_compressible(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def read_header(abs_path: str) -> Optional[int]:
+    """
+    Logical size recorded in a compressed file's header, or None for a plain file.
+    Looks at the content only, so it also works for staging files and blobs, which have no extension.
+    """
+    try:
+        with open(abs_path, "rb") as f:
+            header = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, frame_size, tag, logical = _HEADER.unpack(header)
+    if magic != _SKIPPABLE_MAGIC or frame_size != 12 or tag != _TAG:
+        return None
+    return logical
+
+
+def compressed_size(abs_path: str, st: Optional[os.stat_result] = None) -> Optional[int]:
+    """Logical size if abs_path is stored compressed, None if it is a plain file."""
+    if not is_compressible(abs_path):
+        return None
+    st = st or os.stat(abs_path)
+    key = (abs_path, st.st_size, st.st_mtime_ns)
+    with _size_lock:
+        if key in _size_cache:
+            _size_cache.move_to_end(key)
+            return _size_cache[key]
+    value = read_header(abs_path)
+    with _size_lock:
+        _size_cache[key] = value
+        if len(_size_cache) > _SIZE_CACHE_SIZE:
+            _size_cache.popitem(last=False)
+    return value
+
+
+def logical_size(abs_path: str, st: Optional[os.stat_result] = None) -> int:
+    """Size of the content as uploaded, whether or not it is stored compressed."""
+    st = st or os.stat(abs_path)
+    logical = compressed_size(abs_path, st)
+    return st.st_size if logical is None else logical
+
+
+def stored_size(abs_path: str) -> Optional[int]:
+    """Bytes on disk for a compressed file (files.stored_size), None for a plain one."""
+    st = os.stat(abs_path)
+    return st.st_size if compressed_size(abs_path, st) is not None else None
+
+
+def compress_file(path: str, name: str) -> bool:
+    """
+    Compress the finished (staging) file at path in place if its name makes it eligible and
+    it shrinks by at least COMPRESSION_MIN_SAVING. Returns True if it was compressed.
+    """
+    if not COMPRESSION_ENABLED or zstandard is None or not is_compressible(name):
+        return False
+    size = os.path.getsize(path)
+    if size < COMPRESSION_MIN_SIZE:
+        return False
+    tmp = path + ".zst"
+    try:
+        with open(path, "rb") as src, open(tmp, "xb") as dst:
+            dst.write(_HEADER.pack(_SKIPPABLE_MAGIC, 12, _TAG, size))
+            compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, write_content_size=True)
+            compressor.copy_stream(src, dst, size=size, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if os.path.getsize(tmp) > size * (1 - COMPRESSION_MIN_SAVING):
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+        return True
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def open_stored(abs_path: str):
+    """Binary file object with the logical content of a stored file, compressed or not."""
+    f = open(abs_path, "rb")
+    if compressed_size(abs_path) is None:
+        return f
+    if zstandard is None:
+        f.close()
+        raise OSError(f"{abs_path} is stored compressed but zstandard is not installed")
+    f.seek(_HEADER.size)
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=True), CHUNK_SIZE)
+
+
+def iter_stored(abs_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Logical bytes start..end (inclusive) of a stored file; compressed data is decompressed on the fly."""
+    with open_stored(abs_path) as f:
+        if compressed_size(abs_path) is None:
+            f.seek(start)
+        else:
+            # Compressed streams can't seek; decompress and drop everything before start
+            skip = start
+            while skip > 0:
+                chunk = f.read(min(CHUNK_SIZE, skip))
+                if not chunk:
+                    return
+                skip -= len(chunk)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
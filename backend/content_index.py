@@ -0,0 +1,207 @@
+# backend/content_index.py
+# FULL-TEXT CONTENT INDEX
+# Extracts text from stored documents on a worker pool and keeps it in file_contents,
+# where a generated tsvector column with a GIN index serves /api/files/content-search.
+
+import io
+import os
+import html
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterable, Optional
+from xml.etree import ElementTree
+from sqlalchemy import func
+from database import SessionLocal
+from models import File as FileModel, FileContent, User
+from search_utils import scope_to_subtree
+from compression import open_stored
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    # Optional: without pypdf, PDFs are recorded as unsupported and skipped by search
+    PdfReader = None
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+CONTENT_INDEX_WORKERS = int(os.getenv("CONTENT_INDEX_WORKERS", "2"))
+
+# PostgreSQL rejects tsvectors over 1MB, so very long documents are truncated
+MAX_CONTENT_CHARS = 500_000
+
+# Text search configuration used for both indexing and querying
+TS_CONFIG = "english"
+
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".log", ".json", ".xml", ".html", ".htm"}
+EXTRACTABLE_EXTENSIONS = TEXT_EXTENSIONS | {".docx", ".pdf"}
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_executor = ThreadPoolExecutor(max_workers=CONTENT_INDEX_WORKERS, thread_name_prefix="content-index")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def is_extractable(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in EXTRACTABLE_EXTENSIONS
+
+
+def extract_text(abs_path: str) -> Optional[str]:
+    """Plain text of a document, or None if the format isn't supported."""
+    ext = os.path.splitext(abs_path)[1].lower()
+    if ext == ".docx":
+        content = _extract_docx(abs_path)
+    elif ext == ".pdf":
+        content = _extract_pdf(abs_path)
+    elif ext in TEXT_EXTENSIONS:
+        with io.TextIOWrapper(open_stored(abs_path), encoding="utf-8", errors="replace") as f:
+            content = f.read(MAX_CONTENT_CHARS)
+    else:
+        return None
+    if content is None:
+        return None
+    # NUL bytes are not allowed in PostgreSQL text
+    return content.replace("\x00", " ")[:MAX_CONTENT_CHARS]
+
+
+def _extract_docx(abs_path: str) -> str:
+    paragraphs = []
+    with zipfile.ZipFile(abs_path) as docx:
+        with docx.open("word/document.xml") as document:
+            for _, element in ElementTree.iterparse(document):
+                if element.tag == _WORD_NS + "p":
+                    paragraphs.append("".join(t.text or "" for t in element.iter(_WORD_NS + "t")))
+                    element.clear()
+    return "\n".join(p for p in paragraphs if p)
+
+
+def _extract_pdf(abs_path: str) -> Optional[str]:
+    if PdfReader is None:
+        return None
+    pages = []
+    length = 0
+    for page in PdfReader(abs_path).pages:
+        page_text = page.extract_text() or ""
+        pages.append(page_text)
+        length += len(page_text)
+        if length >= MAX_CONTENT_CHARS:
+            break
+    return "\n".join(pages)
+
+
+def schedule_extraction(file_ids: Iterable[int]):
+    """
+    Queue files for (re-)extraction on the worker pool and return immediately.
+    Files already queued are not queued twice.
+    """
+    with _pending_lock:
+        new_ids = [file_id for file_id in file_ids if file_id not in _pending]
+        _pending.update(new_ids)
+    for file_id in new_ids:
+        _executor.submit(_run_job, file_id)
+
+
+def _run_job(file_id: int):
+    try:
+        index_file(file_id)
+    except Exception as e:
+        print(f"Content extraction failed for file {file_id}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(file_id)
+
+
+def index_file(file_id: int):
+    """Extract and store the text of one file, unless it is unchanged since the last extraction."""
+    db = SessionLocal()
+    try:
+        record = db.get(FileModel, file_id)
+        if record is None or record.is_folder or not is_extractable(record.name):
+            return
+
+        abs_path = os.path.abspath(os.path.join(BASE_DIR, record.path.strip("/")))
+        if not abs_path.startswith(BASE_DIR):
+            return
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return
+
+        content = db.get(FileContent, file_id)
+        if content is not None and content.source_size == st.st_size and content.source_mtime == st.st_mtime:
+            return
+
+        try:
+            extracted = extract_text(abs_path)
+            status = "indexed" if extracted is not None else "unsupported"
+        except Exception as e:
+            print(f"Could not extract text from {record.path}: {e}")
+            extracted = None
+            status = "failed"
+
+        if content is None:
+            content = FileContent(file_id=file_id)
+            db.add(content)
+        content.content = extracted
+        content.status = status
+        content.source_size = st.st_size
+        content.source_mtime = st.st_mtime
+        content.extracted_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def backfill():
+    """Queue every extractable file that has no extracted text yet (e.g. files stored before indexing existed)."""
+    db = SessionLocal()
+    try:
+        rows = db.query(FileModel.id, FileModel.name).outerjoin(
+            FileContent, FileContent.file_id == FileModel.id
+        ).filter(
+            FileModel.is_folder == False,
+            FileContent.file_id == None
+        ).all()
+    finally:
+        db.close()
+    schedule_extraction(file_id for file_id, name in rows if is_extractable(name))
+
+
+# Control characters marking matches in ts_headline output; removed from the document text first
+# so only ts_headline can produce them
+MATCH_START = "\x02"
+MATCH_STOP = "\x03"
+
+
+def _snippet_html(headline: Optional[str]) -> Optional[str]:
+    """Document text is untrusted: escape it, then turn the match markers into <mark> tags."""
+    if headline is None:
+        return None
+    return html.escape(headline).replace(MATCH_START, "<mark>").replace(MATCH_STOP, "</mark>")
+
+
+def search_content(db, query: str, parent_path: str, limit: int):
+    """
+    Ranked full-text search over extracted document text below parent_path.
+    Returns (FileModel, owner_email, rank, snippet) rows, best match first; the snippet is
+    HTML-escaped text with the matches in <mark> tags.
+    PostgreSQL defers ts_headline until after ORDER BY/LIMIT, so only returned rows pay for snippets.
+    """
+    ts_query = func.websearch_to_tsquery(TS_CONFIG, query)
+    rank = func.ts_rank_cd(FileContent.content_tsv, ts_query)
+    snippet = func.ts_headline(
+        TS_CONFIG, func.translate(FileContent.content, MATCH_START + MATCH_STOP, ""), ts_query,
+        f"MaxFragments=2, MaxWords=20, MinWords=8, StartSel={MATCH_START}, StopSel={MATCH_STOP}"
+    )
+    rows = db.query(FileModel, User.email, rank, snippet).join(
+        FileContent, FileContent.file_id == FileModel.id
+    ).outerjoin(
+        User, User.id == FileModel.owner_id
+    ).filter(
+        FileContent.content_tsv.op("@@")(ts_query)
+    )
+    rows = scope_to_subtree(rows, parent_path).order_by(rank.desc(), FileModel.path).limit(limit)
+    return [(record, owner_email, rank, _snippet_html(headline)) for record, owner_email, rank, headline in rows]
@@ -0,0 +1,144 @@
+# backend/copy_utils.py
+# SERVER-SIDE COPY
+# Copies files and folder trees inside the storage tree without the bytes ever leaving the server.
+# Each file is copied the cheapest way the filesystem allows: another link to its blob when dedup
+# is on, a reflink (shared extents on btrfs/XFS), copy_file_range (in-kernel copy), and only then
+# a plain chunked read/write. Files of a folder tree are copied on a small thread pool.
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from compression import logical_size, stored_size
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no reflinks, copies fall back to copy_file_range / chunked
+    fcntl = None
+
+COPY_WORKERS = int(os.getenv("COPY_WORKERS", "4"))
+CHUNK_SIZE = 1024 * 1024
+
+# ioctl(dest_fd, FICLONE, src_fd) - whole-file reflink on Linux
+FICLONE = 0x40049409
+
+# (path relative to the copied folder, is_folder, logical size, stored size if compressed); "" is the folder itself
+CopiedEntry = Tuple[str, bool, int, Optional[int]]
+
+
+def _reflink(fsrc, fdst) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        # Not supported by this filesystem, or source and destination on different filesystems
+        return False
+
+
+def _copy_file_range(fsrc, fdst) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        while os.copy_file_range(fsrc.fileno(), fdst.fileno(), CHUNK_SIZE * 64):
+            pass
+        return True
+    except OSError:
+        # e.g. ENOSYS/EXDEV on older kernels; start over with a plain copy
+        fsrc.seek(0)
+        fdst.seek(0)
+        fdst.truncate()
+        return False
+
+
+def copy_file(source: str, destination: str, digest: Optional[str] = None) -> str:
+    """
+    Copy source to destination, which must not exist yet. Returns how it was copied:
+    "link", "reflink", "copy_file_range" or "chunked". A partial destination is removed on failure.
+    """
+    from blob_store import link_copy
+    if link_copy(source, destination, digest):
+        return "link"
+    with open(source, "rb") as fsrc, open(destination, "xb") as fdst:
+        try:
+            if _reflink(fsrc, fdst):
+                return "reflink"
+            if _copy_file_range(fsrc, fdst):
+                return "copy_file_range"
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+            return "chunked"
+        except BaseException:
+            fdst.close()
+            os.remove(destination)
+            raise
+
+
+def copy_tree(
+    source: str,
+    destination: str,
+    digests: Optional[Dict[str, str]] = None,
+    is_allowed: Optional[Callable[[str], bool]] = None,
+    on_copied: Optional[Callable[[int, int], None]] = None
+) -> List[CopiedEntry]:
+    """
+    Copy the folder source to destination, which must not exist yet. Folders are created first,
+    then files are copied in parallel. digests maps relative paths to content hashes (for blob links).
+    is_allowed(rel_dir) is asked once per subfolder; one that is not allowed is left out with
+    everything below it. on_copied(files done, files total) is called on this thread as files finish.
+    Symlinks are skipped. On failure the partial copy is removed and the error re-raised.
+    """
+    digests = digests or {}
+    entries = []
+    files = []
+    os.mkdir(destination)
+    try:
+        for dirpath, dirnames, filenames in os.walk(source):
+            rel_dir = os.path.relpath(dirpath, source).replace("\\", "/")
+            rel_dir = "" if rel_dir == "." else rel_dir
+            if rel_dir and is_allowed is not None and not is_allowed(rel_dir):
+                dirnames.clear()
+                continue
+            if rel_dir:
+                os.mkdir(os.path.join(destination, rel_dir))
+            entries.append((rel_dir, True, 0, None))
+            dirnames[:] = [d for d in dirnames if not os.path.islink(os.path.join(dirpath, d))]
+            for name in filenames:
+                src_file = os.path.join(dirpath, name)
+                if not os.path.islink(src_file):
+                    files.append(f"{rel_dir}/{name}" if rel_dir else name)
+
+        def copy_one(rel_path):
+            copied = os.path.join(destination, rel_path)
+            copy_file(os.path.join(source, rel_path), copied, digests.get(rel_path))
+            return rel_path, False, logical_size(copied), stored_size(copied)
+
+        pool = ThreadPoolExecutor(max_workers=COPY_WORKERS, thread_name_prefix="copy")
+        try:
+            for done, entry in enumerate(pool.map(copy_one, files), 1):
+                entries.append(entry)
+                if on_copied is not None:
+                    on_copied(done, len(files))
+        finally:
+            # After an error, files not started yet are not copied at all
+            pool.shutdown(cancel_futures=True)
+    except BaseException:
+        shutil.rmtree(destination, ignore_errors=True)
+        raise
+    return entries
+
+
+def copy_name(folder: str, name: str) -> str:
+    """name, or "name (copy).ext", "name (copy 2).ext", ... - the first one not taken in folder."""
+    if not os.path.exists(os.path.join(folder, name)):
+        return name
+    stem, ext = os.path.splitext(name)
+    if os.path.isdir(os.path.join(folder, name)):
+        stem, ext = name, ""
+    n = 1
+    while True:
+        candidate = f"{stem} (copy){ext}" if n == 1 else f"{stem} (copy {n}){ext}"
+        if not os.path.exists(os.path.join(folder, candidate)):
+            return candidate
+        n += 1
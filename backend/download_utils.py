@@ -0,0 +1,251 @@
+# backend/download_utils.py
+# CONDITIONAL AND RANGED FILE RESPONSES FOR /api/files/download
+# Byte ranges (single, multi and If-Range), strong ETags and 304 revalidation
+# With DOWNLOAD_MODE=x-accel / x-sendfile the API only authorizes and logs a download and the
+# front proxy (nginx / Apache, lighttpd) sends the bytes, including ranges and revalidation.
+
+import os
+import hashlib
+import secrets
+import threading
+import urllib.parse
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from compression import compressed_size, iter_stored
+from response_utils import accepts_encoding
+
+# "stat" derives ETags from size + mtime (free); "hash" uses the SHA-256 of the content
+DOWNLOAD_ETAG_MODE = os.getenv("DOWNLOAD_ETAG_MODE", "stat")
+
+# More ranges than this in one request are answered with the whole file
+MAX_RANGES = 16
+
+CHUNK_SIZE = 64 * 1024
+
+# "direct": the worker reads and sends the file itself (FileResponse / StreamingResponse);
+# "x-accel": nginx sends it (X-Accel-Redirect); "x-sendfile": Apache mod_xsendfile / lighttpd
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "direct").lower()
+
+# x-accel: internal nginx location mapped onto the storage root, e.g.
+#   location /protected-files/ { internal; alias /srv/dms/storage/; }
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "/protected-files/")
+
+# Content hashes keyed by (path, size, mtime_ns), so each file version is hashed once
+_HASH_CACHE_SIZE = 4096
+_hash_cache = OrderedDict()
+_hash_lock = threading.Lock()
+
+
+def make_etag(full_path: str, st: os.stat_result) -> str:
+    """Strong ETag for the current version of a file."""
+    if DOWNLOAD_ETAG_MODE == "hash":
+        return f'"{content_hash(full_path, st)}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def content_hash(full_path: str, st: os.stat_result) -> str:
+    key = (full_path, st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if key in _hash_cache:
+            _hash_cache.move_to_end(key)
+            return _hash_cache[key]
+    digest = hashlib.sha256()
+    with open(full_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hash_lock:
+        _hash_cache[key] = value
+        if len(_hash_cache) > _HASH_CACHE_SIZE:
+            _hash_cache.popitem(last=False)
+    return value
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a "bytes=..." Range header into inclusive (start, end) pairs.
+    Returns None if the header should be ignored (malformed, other unit, too many ranges)
+    and [] if it is well-formed but no range overlaps the file (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    return ranges
+
+
+def _http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_matches(request: Request, etag: str, last_modified: str) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == etag
+    return if_range == last_modified
+
+
+def offload_response(full_path: str, base_path: str, filename: str) -> Optional[Response]:
+    """
+    Header-only response telling the front proxy which file to send, or None in direct mode.
+    Files stored compressed stay with the API: the proxy would send their raw zstd bytes.
+    """
+    if DOWNLOAD_MODE not in ("x-accel", "x-sendfile") or compressed_size(full_path) is not None:
+        return None
+    plain = FileResponse(full_path, filename=filename)
+    headers = {}
+    if "content-disposition" in plain.headers:
+        headers["content-disposition"] = plain.headers["content-disposition"]
+    if DOWNLOAD_MODE == "x-accel":
+        rel_path = os.path.relpath(full_path, base_path).replace("\\", "/")
+        headers["X-Accel-Redirect"] = DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + urllib.parse.quote(rel_path)
+    else:
+        headers["X-Sendfile"] = full_path
+    return Response(status_code=200, media_type=plain.media_type, headers=headers)
+
+
+def _read_range(full_path: str, start: int, end: int, compressed: bool = False):
+    if compressed:
+        yield from iter_stored(full_path, start, end)
+        return
+    with open(full_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request: Request, full_path: str, filename: str) -> Response:
+    """
+    FileResponse with HTTP caching and range support:
+    304 for If-None-Match / If-Modified-Since hits, 206 for satisfiable Range requests
+    (multipart/byteranges when several ranges are asked for), 416 when none overlap the file,
+    and If-Range so a resumed download never mixes two versions of a file.
+    Files stored compressed are sent as they are (Content-Encoding: zstd) to clients that accept it,
+    and decompressed while streaming for everyone else; ranges always refer to the logical content.
+    """
+    st = os.stat(full_path)
+    logical = compressed_size(full_path, st)
+    compressed = logical is not None
+    size = logical if compressed else st.st_size
+    etag = make_etag(full_path, st)
+    last_modified = _http_date(st.st_mtime)
+    headers = {"etag": etag, "last-modified": last_modified, "accept-ranges": "bytes"}
+    if compressed:
+        headers["vary"] = "Accept-Encoding"
+
+    range_header = request.headers.get("range")
+    if compressed and not range_header and accepts_encoding(request, "zstd"):
+        # A different representation of the same version, so it gets its own strong ETag
+        headers["etag"] = etag[:-1] + '-zstd"'
+        if _not_modified(request, headers["etag"], st.st_mtime):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(full_path, filename=filename, headers={**headers, "content-encoding": "zstd"})
+
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    if range_header and _if_range_matches(request, etag, last_modified):
+        ranges = parse_range(range_header, size)
+
+    if ranges is None and not compressed:
+        return FileResponse(full_path, filename=filename, headers=headers)
+
+    if ranges == []:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+    # Reuse FileResponse's Content-Disposition/Content-Type handling
+    plain = FileResponse(full_path, filename=filename)
+    media_type = plain.media_type
+    if "content-disposition" in plain.headers:
+        headers["content-disposition"] = plain.headers["content-disposition"]
+
+    if ranges is None:
+        # Whole file, decompressed on the fly
+        headers["content-length"] = str(size)
+        return StreamingResponse(_read_range(full_path, 0, size - 1, True), media_type=media_type, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers.update({
+            "content-range": f"bytes {start}-{end}/{size}",
+            "content-length": str(end - start + 1)
+        })
+        return StreamingResponse(
+            _read_range(full_path, start, end, compressed), status_code=206, media_type=media_type, headers=headers
+        )
+
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode("latin-1")
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode("latin-1")
+    headers["content-length"] = str(
+        sum(len(h) + (end - start + 1) + 2 for h, (start, end) in zip(part_headers, ranges)) + len(closing)
+    )
+
+    def multipart_body():
+        for part_header, (start, end) in zip(part_headers, ranges):
+            yield part_header
+            yield from _read_range(full_path, start, end, compressed)
+            yield b"\r\n"
+        yield closing
+
+    return StreamingResponse(
+        multipart_body(), status_code=206, media_type=f"multipart/byteranges; boundary={boundary}", headers=headers
+    )
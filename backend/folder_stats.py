@@ -0,0 +1,261 @@
+# backend/folder_stats.py
+# FOLDER SIZE / COUNT ROLLUPS
+# folder_stats holds, per folder, the recursive logical and stored size plus file and subfolder
+# counts of everything below it. Endpoints that add, remove or move items pass the changes to
+# record_changes() before they commit, which adds them to every folder above in one UPDATE, so
+# /api/folders/statistics reads a few rows instead of walking the storage tree.
+# FolderStatsVerifier recomputes all rollups from the files table now and then and fixes drift
+# (e.g. from files changed outside the API).
+
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import BigInteger, Integer, String, case, column, func, text, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import File as FileModel, FolderStats
+from tree_utils import subtree_filter
+
+FOLDER_STATS_VERIFY_INTERVAL = float(os.getenv("FOLDER_STATS_VERIFY_INTERVAL", "3600"))  # seconds between verifier passes
+
+# Only one worker process verifies at a time (PostgreSQL advisory lock key)
+FOLDER_STATS_LOCK_ID = 5_310_003
+
+# Rows per UPDATE ... FROM (VALUES ...) / INSERT statement
+STATS_CHUNK_SIZE = 1000
+
+# (path of the changed item, logical bytes, stored bytes, files, folders); negative when removed
+Change = Tuple[str, int, int, int, int]
+Totals = List[int]  # [total_size, stored_size, file_count, subfolder_count]
+
+
+def file_change(path: str, size: Optional[int], stored: Optional[int], sign: int = 1) -> Change:
+    """Change for adding (sign=1) or removing (sign=-1) one file; stored is None when not compressed."""
+    size = size or 0
+    return (path, sign * size, sign * (size if stored is None else stored), sign, 0)
+
+
+def folder_change(path: str, totals: Totals, sign: int = 1) -> Change:
+    """Change for adding or removing a folder that holds totals (the folder itself counts too)."""
+    return (path, sign * totals[0], sign * totals[1], sign * totals[2], sign * (totals[3] + 1))
+
+
+def _ancestors(db_path: str) -> List[str]:
+    parts = db_path.strip("/").split("/")[:-1]
+    return ["/" + "/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def record_changes(db: Session, changes: Iterable[Change]):
+    """Add changes to the rollups of every folder above the changed items. Nothing is committed."""
+    totals: Dict[str, Totals] = defaultdict(lambda: [0, 0, 0, 0])
+    for path, *delta in changes:
+        for ancestor in _ancestors(path):
+            folder = totals[ancestor]
+            for i, value in enumerate(delta):
+                folder[i] += value
+    rows = [(path, *delta) for path, delta in totals.items() if any(delta)]
+    for i in range(0, len(rows), STATS_CHUNK_SIZE):
+        deltas = values(
+            column("path", String), column("size", BigInteger), column("stored", BigInteger),
+            column("files", Integer), column("folders", Integer),
+            name="deltas"
+        ).data(rows[i:i + STATS_CHUNK_SIZE])
+        db.execute(
+            update(FolderStats)
+            .where(FolderStats.folder_id == FileModel.id, FileModel.path == deltas.c.path)
+            .values(
+                total_size=FolderStats.total_size + deltas.c.size,
+                stored_size=FolderStats.stored_size + deltas.c.stored,
+                file_count=FolderStats.file_count + deltas.c.files,
+                subfolder_count=FolderStats.subfolder_count + deltas.c.folders
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def init_folders(db: Session, folder_ids: Iterable[int]):
+    """Zero rollups for newly created (empty) folders. Nothing is committed."""
+    rows = [{"folder_id": folder_id} for folder_id in folder_ids]
+    if rows:
+        db.execute(pg_insert(FolderStats).on_conflict_do_nothing(), rows)
+
+
+def compute(db: Session, folder_path: Optional[str] = None) -> Dict[int, Totals]:
+    """
+    Rollups for every folder in the subtree at folder_path (the whole tree when None), from the
+    files table: one GROUP BY parent_id for the direct contents, then summed up deepest first.
+    """
+    direct = db.query(
+        FileModel.parent_id,
+        func.coalesce(func.sum(case((FileModel.is_folder == True, 0), else_=FileModel.size)), 0),
+        func.coalesce(func.sum(case(
+            (FileModel.is_folder == True, 0), else_=func.coalesce(FileModel.stored_size, FileModel.size)
+        )), 0),
+        func.count(case((FileModel.is_folder == True, None), else_=1)),
+        func.count(case((FileModel.is_folder == True, 1)))
+    ).filter(FileModel.parent_id != None)
+    folders = db.query(FileModel.id, FileModel.parent_id, FileModel.depth).filter(FileModel.is_folder == True)
+    if folder_path is not None:
+        direct = direct.filter(subtree_filter(folder_path))
+        folders = folders.filter(subtree_filter(folder_path))
+
+    folders = folders.all()
+    totals: Dict[int, Totals] = {folder_id: [0, 0, 0, 0] for folder_id, _, _ in folders}
+    for parent_id, size, stored, files, subfolders in direct.group_by(FileModel.parent_id):
+        if parent_id in totals:
+            totals[parent_id] = [int(size), int(stored), files, subfolders]
+    for folder_id, parent_id, _ in sorted(folders, key=lambda row: row[2] or 0, reverse=True):
+        if parent_id in totals:
+            parent, child = totals[parent_id], totals[folder_id]
+            for i in range(4):
+                # The child folder itself is already in the parent's direct subfolder count
+                parent[i] += child[i]
+    return totals
+
+
+def store(db: Session, totals: Dict[int, Totals]):
+    """Write absolute rollups (insert or overwrite). Nothing is committed."""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "folder_id": folder_id, "total_size": t[0], "stored_size": t[1],
+            "file_count": t[2], "subfolder_count": t[3], "verified_at": now
+        }
+        for folder_id, t in totals.items()
+    ]
+    for i in range(0, len(rows), STATS_CHUNK_SIZE):
+        statement = pg_insert(FolderStats)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[FolderStats.folder_id],
+                set_={name: statement.excluded[name] for name in ("total_size", "stored_size", "file_count", "subfolder_count", "verified_at")}
+            ),
+            rows[i:i + STATS_CHUNK_SIZE]
+        )
+
+
+def folder_totals(db: Session, folder_id: int, folder_path: str) -> Totals:
+    """Current rollup of one folder, computed (and stored) if it has none yet."""
+    row = db.query(FolderStats).filter(FolderStats.folder_id == folder_id).first()
+    if row is not None:
+        return [row.total_size, row.stored_size, row.file_count, row.subfolder_count]
+    totals = compute(db, folder_path)
+    store(db, totals)
+    return totals.get(folder_id, [0, 0, 0, 0])
+
+
+def _add(db: Session, deltas: Dict[int, Totals]):
+    """Add deltas to existing rollups by folder id. Nothing is committed."""
+    rows = [(folder_id, *delta) for folder_id, delta in deltas.items()]
+    for i in range(0, len(rows), STATS_CHUNK_SIZE):
+        chunk = values(
+            column("folder_id", Integer), column("size", BigInteger), column("stored", BigInteger),
+            column("files", Integer), column("folders", Integer),
+            name="deltas"
+        ).data(rows[i:i + STATS_CHUNK_SIZE])
+        db.execute(
+            update(FolderStats)
+            .where(FolderStats.folder_id == chunk.c.folder_id)
+            .values(
+                total_size=FolderStats.total_size + chunk.c.size,
+                stored_size=FolderStats.stored_size + chunk.c.stored,
+                file_count=FolderStats.file_count + chunk.c.files,
+                subfolder_count=FolderStats.subfolder_count + chunk.c.folders,
+                verified_at=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def verify(db: Session) -> int:
+    """
+    Recompute every rollup and fix the ones that drifted; commits. Returns how many were fixed.
+    The recompute reads the files table and the rollups in one snapshot on a separate session,
+    without blocking writers. The drift found there is then added to the rows (not written as
+    absolute values), so increments committed since the snapshot are kept; folder_stats is only
+    locked for that short write.
+    """
+    if db.bind.dialect.name == "postgresql":
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": FOLDER_STATS_LOCK_ID}).scalar():
+            db.rollback()
+            return 0
+
+    snapshot = SessionLocal()
+    try:
+        # Writers change files and folder_stats in the same transaction, so one snapshot sees both agree
+        snapshot.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        expected = compute(snapshot)
+        current = {
+            row.folder_id: [row.total_size, row.stored_size, row.file_count, row.subfolder_count]
+            for row in snapshot.query(FolderStats)
+        }
+    finally:
+        snapshot.close()
+
+    drift = {
+        folder_id: [e - c for e, c in zip(totals, current[folder_id])]
+        for folder_id, totals in expected.items() if folder_id in current and current[folder_id] != totals
+    }
+    missing = {folder_id: totals for folder_id, totals in expected.items() if folder_id not in current}
+    if not drift and not missing:
+        db.commit()
+        return 0
+
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE folder_stats IN SHARE ROW EXCLUSIVE MODE"))
+    _add(db, drift)
+    if missing:
+        # Folders without a row get the snapshot's totals (later changes: next pass); skip ones deleted since
+        still_there = {
+            folder_id for chunk in _id_chunks(list(missing))
+            for (folder_id,) in db.query(FileModel.id).filter(FileModel.id.in_(chunk))
+        }
+        store(db, {folder_id: totals for folder_id, totals in missing.items() if folder_id in still_there})
+    db.commit()
+    return len(drift) + len(missing)
+
+
+def _id_chunks(ids: List[int]):
+    for i in range(0, len(ids), STATS_CHUNK_SIZE):
+        yield ids[i:i + STATS_CHUNK_SIZE]
+
+
+class FolderStatsVerifier:
+    """Background thread running verify() every FOLDER_STATS_VERIFY_INTERVAL seconds (first pass right at start)."""
+
+    def __init__(self, interval: float = FOLDER_STATS_VERIFY_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="folder-stats-verifier", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                fixed = verify(db)
+                if fixed:
+                    print(f"Folder stats verifier: corrected {fixed} folders")
+            except Exception as e:
+                print(f"Folder stats verification failed: {e}")
+            finally:
+                db.close()
+            self._stop.wait(self.interval)
+
+
+folder_stats_verifier = FolderStatsVerifier()
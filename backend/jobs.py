@@ -0,0 +1,346 @@
+# backend/jobs.py
+# BACKGROUND JOBS
+# Folder uploads, folder deletes, moves and copies, file batches and team deletion can run as jobs
+# instead of inside the HTTP request: with async=true those endpoints answer 202 with a job id right
+# away and the same code runs on a bounded worker pool in this process. The jobs table holds the
+# state and progress counters, so /api/jobs/{id} and its event stream work from any worker process.
+# Operations report progress and stop at safe points through progress() and cancel_requested(),
+# which do nothing outside a job.
+
+import os
+import json
+import asyncio
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import Job, User
+from response_utils import dumps
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # jobs running at once per process; the rest wait queued
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))  # seconds between progress writes / event polls
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))  # finished jobs are deleted after this long
+
+# Queued or running jobs whose process has sent no heartbeat for this long (it stopped) are failed
+JOB_STALE_AFTER = timedelta(seconds=JOB_HEARTBEAT_INTERVAL * 4)
+
+# Comment line sent on an idle event stream so proxies keep the connection open
+EVENT_KEEPALIVE_SECONDS = 15
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised at a cancellation point of a job whose cancellation was requested."""
+
+
+class JobContext:
+    """Progress and cancellation state of the job running on the current thread."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.done = 0
+        self.total: Optional[int] = None
+        self.message: Optional[str] = None
+        self.cancelled = False  # cancellation requested, as of the last sync
+        self.honored = False    # ...and the operation stopped because of it
+        self._synced = 0.0
+        self._dirty = False
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        self._dirty = True
+        self.sync()
+
+    def sync(self, force: bool = False):
+        """Write progress and read the cancel flag, at most every JOB_PROGRESS_INTERVAL seconds."""
+        now = time.monotonic()
+        if not force and now - self._synced < JOB_PROGRESS_INTERVAL:
+            return
+        self._synced = now
+        values = {"updated_at": datetime.utcnow()}
+        if self._dirty:
+            values.update(progress_done=self.done, progress_total=self.total, message=self.message)
+        db = SessionLocal()
+        try:
+            self.cancelled = bool(db.execute(
+                update(Job).where(Job.id == self.job_id).values(**values).returning(Job.cancel_requested)
+            ).scalar())
+            db.commit()
+            self._dirty = False
+        finally:
+            db.close()
+
+
+_local = threading.local()
+
+
+def current_job() -> Optional[JobContext]:
+    return getattr(_local, "job", None)
+
+
+def progress(done: int, total: Optional[int] = None, message: Optional[str] = None):
+    """Report progress of the current job (done of total items); no-op outside a job."""
+    job = current_job()
+    if job is not None:
+        job.progress(done, total, message)
+
+
+def cancel_requested() -> bool:
+    """
+    True if the current job was asked to stop. A caller that gets True stops at that point (keeping
+    what it finished) and the job ends up cancelled. Always False outside a job.
+    """
+    job = current_job()
+    if job is None:
+        return False
+    job.sync()
+    if job.cancelled:
+        job.honored = True
+    return job.cancelled
+
+
+def check_cancelled():
+    """Raise JobCancelled if the current job was asked to stop (for code that cleans up on exceptions)."""
+    if cancel_requested():
+        raise JobCancelled()
+
+
+def get_job(db: Session, user, job_id: str) -> Job:
+    """The job, if user started it or is an admin."""
+    job = db.get(Job, job_id)
+    if not job or (job.user_id != user.id and user.role.name != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def job_status(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "target_path": job.target_path,
+        "status": job.status,
+        "progress": {
+            "done": job.progress_done or 0,
+            "total": job.progress_total,
+            "percent": round(100 * (job.progress_done or 0) / job.progress_total, 1) if job.progress_total else None
+        },
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "status_code": job.status_code,
+        "cancel_requested": bool(job.cancel_requested),
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+
+def accepted(job: Job) -> JSONResponse:
+    """202 answer of an endpoint called with async=true."""
+    return JSONResponse(status_code=202, content={
+        "message": "Job queued", "job_id": job.id, "status": job.status, "status_url": f"/api/jobs/{job.id}"
+    })
+
+
+def cancel(db: Session, user, job_id: str) -> Job:
+    """A queued job is cancelled at once; a running one stops at its next cancellation point. Commits."""
+    job = get_job(db, user, job_id)
+    if job.status in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    now = datetime.utcnow()
+    dequeued = db.execute(
+        update(Job).where(Job.id == job_id, Job.status == "queued")
+        .values(status="cancelled", cancel_requested=True, finished_at=now, updated_at=now)
+    ).rowcount
+    if not dequeued:
+        db.execute(update(Job).where(Job.id == job_id).values(cancel_requested=True))
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+async def stream_events(job_id: str) -> AsyncIterator[bytes]:
+    """
+    Server-sent events for a job: a "progress" event with job_status() whenever it changes and a
+    final "done" event once it finished. Reads the jobs table, so it works from any worker process.
+    """
+    def load():
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            return job_status(job) if job else None
+        finally:
+            db.close()
+
+    last = None
+    quiet_since = time.monotonic()
+    while True:
+        state = await run_in_threadpool(load)
+        if state is None:
+            return
+        if state["status"] in FINISHED:
+            yield b"event: done\ndata: " + dumps(state) + b"\n\n"
+            return
+        if state != last:
+            yield b"event: progress\ndata: " + dumps(state) + b"\n\n"
+            last = state
+            quiet_since = time.monotonic()
+        elif time.monotonic() - quiet_since > EVENT_KEEPALIVE_SECONDS:
+            yield b": keepalive\n\n"
+            quiet_since = time.monotonic()
+        await asyncio.sleep(JOB_PROGRESS_INTERVAL)
+
+
+class JobEngine:
+    """
+    Runs submitted jobs on a pool of JOB_WORKERS threads, each with its own DB session.
+    A background thread sends heartbeats for this process's jobs, fails jobs whose process
+    stopped, and deletes finished jobs after JOB_RETENTION_DAYS.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._active = set()  # ids of this process's queued and running jobs
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            # Queued jobs are left behind and failed once their heartbeat is stale
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(
+        self,
+        db: Session,
+        user,
+        kind: str,
+        target_path: Optional[str],
+        run: Callable[[Session, User], dict],
+        cleanup: Optional[Callable[[], None]] = None
+    ) -> Job:
+        """
+        Queue run(session, user), whose return value becomes the job's result; commits the new job.
+        cleanup() is called afterwards, also if the job is cancelled before it starts.
+        """
+        self.start()
+        now = datetime.utcnow()
+        job = Job(
+            id=secrets.token_hex(16), kind=kind, user_id=user.id, target_path=target_path,
+            status="queued", created_at=now, updated_at=now
+        )
+        db.add(job)
+        db.commit()
+        with self._lock:
+            self._active.add(job.id)
+        self._executor.submit(self._run, job.id, user.id, run, cleanup)
+        return job
+
+    def _run(self, job_id: str, user_id: int, run, cleanup):
+        db = SessionLocal()
+        context = JobContext(job_id)
+        try:
+            now = datetime.utcnow()
+            claimed = db.execute(
+                update(Job).where(Job.id == job_id, Job.status == "queued")
+                .values(status="running", started_at=now, updated_at=now)
+            ).rowcount
+            db.commit()
+            if not claimed:
+                # Cancelled while it was queued
+                return
+
+            values = {}
+            _local.job = context
+            try:
+                values["result"] = dumps(run(db, db.get(User, user_id))).decode("utf-8")
+                values["status"] = "cancelled" if context.honored else "succeeded"
+            except JobCancelled:
+                db.rollback()
+                values["status"] = "cancelled"
+            except HTTPException as e:
+                db.rollback()
+                values.update(status="failed", error=str(e.detail), status_code=e.status_code)
+            except Exception as e:
+                db.rollback()
+                print(f"Job {job_id} failed: {e}")
+                values.update(status="failed", error=str(e), status_code=500)
+            finally:
+                _local.job = None
+
+            now = datetime.utcnow()
+            db.execute(update(Job).where(Job.id == job_id).values(
+                progress_done=context.done, progress_total=context.total, message=context.message,
+                finished_at=now, updated_at=now, **values
+            ))
+            db.commit()
+        except Exception as e:
+            print(f"Job {job_id} could not be recorded: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._active.discard(job_id)
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"Cleanup of job {job_id} failed: {e}")
+
+    def _heartbeat(self):
+        while True:
+            db = SessionLocal()
+            try:
+                now = datetime.utcnow()
+                with self._lock:
+                    active = list(self._active)
+                if active:
+                    db.execute(update(Job).where(Job.id.in_(active), Job.status.notin_(FINISHED)).values(updated_at=now))
+                stale = update(Job).where(Job.status.notin_(FINISHED), Job.updated_at < now - JOB_STALE_AFTER)
+                if active:
+                    stale = stale.where(Job.id.notin_(active))
+                db.execute(stale.values(
+                    status="failed", error="Interrupted: the server process running it stopped",
+                    status_code=500, finished_at=now
+                ))
+                db.execute(delete(Job).where(
+                    Job.status.in_(FINISHED), Job.finished_at < now - timedelta(days=JOB_RETENTION_DAYS)
+                ))
+                db.commit()
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+            finally:
+                db.close()
+            if self._stop.wait(JOB_HEARTBEAT_INTERVAL):
+                return
+
+
+job_engine = JobEngine()
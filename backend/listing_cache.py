@@ -0,0 +1,146 @@
+# backend/listing_cache.py
+# DIRECTORY LISTING CACHE
+# Keeps the scanned and DB-enriched entries of recently listed folders in memory, so browsing the
+# same folders again skips the scandir and the metadata queries. Entries are keyed by folder path
+# and validated against the directory's mtime, so files added, removed or renamed on disk behind
+# the API's back are picked up. Endpoints that change a folder's contents or metadata invalidate
+# it explicitly as well. Each worker process has its own cache and explicit invalidation only
+# reaches the worker that made the change, so entries also expire after LISTING_CACHE_TTL_SECONDS:
+# other workers pick up metadata changes (remarks, sizes, owners) within that time.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+LISTING_CACHE_MAX_BYTES = int(os.getenv("LISTING_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Upper bound on how long another worker's change can go unnoticed
+LISTING_CACHE_TTL_SECONDS = float(os.getenv("LISTING_CACHE_TTL_SECONDS", "10"))
+
+# Rough memory held by one cached item besides its name and path
+ITEM_OVERHEAD_BYTES = 600
+
+# A directory modified this recently may change again without its mtime moving (timestamp
+# granularity), so its listing is not cached yet
+RACY_WINDOW_NS = 1_000_000_000
+
+
+def _folder_key(path: str) -> str:
+    key = "/" + path.replace("\\", "/").strip("/")
+    while "//" in key:
+        key = key.replace("//", "/")
+    return key
+
+
+def _estimate_size(items: List[dict]) -> int:
+    return sum(ITEM_OVERHEAD_BYTES + 2 * (len(item["name"]) + len(item["path"])) for item in items)
+
+
+class ListingCache:
+    """
+    Folder listings in memory, evicted least recently used first once they exceed max_bytes.
+    A listing is only returned for the directory mtime it was built at and for at most ttl seconds.
+    """
+
+    def __init__(self, max_bytes: int = LISTING_CACHE_MAX_BYTES, ttl: float = LISTING_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # folder path -> (mtime_ns, items, size in bytes, expiry on the monotonic clock), least recently used first
+        self._entries = OrderedDict()
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, folder_path: str, mtime_ns: int) -> Optional[List[dict]]:
+        """The cached items (shared: copy before changing them), or None."""
+        key = _folder_key(folder_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != mtime_ns:
+                # Changed on disk since it was cached
+                self._drop(key)
+                self.stale += 1
+                entry = None
+            elif entry is not None and entry[3] <= time.monotonic():
+                # Possibly changed through another worker
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, folder_path: str, mtime_ns: int, items: List[dict]):
+        size = _estimate_size(items)
+        if size > self.max_bytes or self.ttl <= 0 or time.time_ns() - mtime_ns < RACY_WINDOW_NS:
+            return
+        key = _folder_key(folder_path)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (mtime_ns, items, size, time.monotonic() + self.ttl)
+            self._total += size
+            while self._total > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        self._total -= self._entries.pop(key)[2]
+
+    def invalidate(self, *folder_paths: str):
+        """Forget the listings of these folders."""
+        with self._lock:
+            for path in folder_paths:
+                key = _folder_key(path)
+                if key in self._entries:
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def invalidate_parents(self, *item_paths: str):
+        """Forget the listings of the folders holding these items."""
+        self.invalidate(*[os.path.dirname(_folder_key(path)) for path in item_paths])
+
+    def invalidate_tree(self, folder_path: str):
+        """Forget the listings of a folder, everything below it and the folder holding it."""
+        key = _folder_key(folder_path)
+        prefix = key.rstrip("/") + "/"
+        with self._lock:
+            for cached in [cached for cached in self._entries if cached == key or cached.startswith(prefix)]:
+                self._drop(cached)
+                self.invalidations += 1
+        self.invalidate_parents(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+listing_cache = ListingCache()
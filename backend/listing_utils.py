@@ -0,0 +1,168 @@
+# backend/listing_utils.py
+# FOLDER LISTING
+# /api/folders/list scans the directory once (one stat per entry) and resolves DB metadata, owners
+# and team ids with one joined query per HYDRATION_CHUNK_SIZE paths - not several queries per
+# entry. The result is cached per folder (listing_cache.py); filtering, the user's team access,
+# sorting and paging are applied to it per request.
+
+import os
+import stat
+import json
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from compression import logical_size
+from metadata_utils import HYDRATION_CHUNK_SIZE
+from models import File as FileModel, Team, User, UserTeamAccess
+
+LISTING_SORTS = ("name", "size", "modified", "created")
+
+
+def scan_folder(abs_path: str, parent_path: str) -> List[dict]:
+    """Disk entries of abs_path as listing items, one stat() per entry. Entries that vanish during the scan are skipped."""
+    items = []
+    with os.scandir(abs_path) as it:
+        for entry in it:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            is_folder = stat.S_ISDIR(st.st_mode)
+            items.append({
+                "name": entry.name,
+                "path": os.path.join(parent_path, entry.name).replace("\\", "/"),
+                "is_folder": is_folder,
+                "size": 0 if is_folder else logical_size(entry.path, st),
+                "created_at": st.st_ctime,
+                "modified_at": st.st_mtime,
+                "is_team_folder": False,
+                "team_id": None,
+                "user_has_access": True  # Default to true, updated for team folders
+            })
+    return items
+
+
+def filter_items(items: List[dict], name_filter: Optional[str]) -> List[dict]:
+    """Items whose name contains name_filter (case-insensitive); all of them without one."""
+    if not name_filter:
+        return items
+    needle = name_filter.lower()
+    return [item for item in items if needle in item["name"].lower()]
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        # DB timestamps are naive UTC
+        return value.replace(tzinfo=timezone.utc).timestamp() if value.tzinfo is None else value.timestamp()
+    return value
+
+
+def _sort_key(item: dict, sort: str) -> list:
+    if sort == "size":
+        return [item["size"], item["name"]]
+    if sort == "modified":
+        return [_timestamp(item["modified_at"]), item["name"]]
+    if sort == "created":
+        return [_timestamp(item["created_at"]), item["name"]]
+    return [item["name"].lower(), item["name"]]
+
+
+def sort_items(items: List[dict], sort: str, descending: bool) -> List[dict]:
+    """Folders first, then files, each ordered by sort (ties broken by name)."""
+    folders = sorted((item for item in items if item["is_folder"]), key=lambda item: _sort_key(item, sort), reverse=descending)
+    files = sorted((item for item in items if not item["is_folder"]), key=lambda item: _sort_key(item, sort), reverse=descending)
+    return folders + files
+
+
+def encode_listing_cursor(item: dict, sort: str, descending: bool) -> str:
+    """Opaque keyset cursor: the sort position of the last item of a page."""
+    raw = json.dumps([sort, descending, item["is_folder"], _sort_key(item, sort)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_listing_cursor(cursor: str, sort: str, descending: bool) -> Tuple[bool, list]:
+    """Inverse of encode_listing_cursor; returns (is_folder, key). The cursor must match sort and order."""
+    try:
+        cursor_sort, cursor_descending, is_folder, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort or cursor_descending != descending or not isinstance(key, list):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return bool(is_folder), key
+
+
+def after_cursor(items: List[dict], cursor: Tuple[bool, list], sort: str, descending: bool) -> List[dict]:
+    """The sorted items that come after the cursor position (keyset: no offset, stable under inserts)."""
+    cursor_folder, cursor_key = cursor
+    for index, item in enumerate(items):
+        if item["is_folder"] != cursor_folder:
+            # Folders come first: a file is past any folder cursor
+            if cursor_folder:
+                return items[index:]
+            continue
+        key = _sort_key(item, sort)
+        if (key < cursor_key) if descending else (key > cursor_key):
+            return items[index:]
+    return []
+
+
+def enrich_items(db: Session, parent_path: str, items: List[dict]):
+    """
+    Add DB metadata (owner, DB timestamps) and, for top-level folders, team ids to items in place.
+    One query joining users and teams per HYDRATION_CHUNK_SIZE items. Nothing here depends on the
+    user, so the result can be cached (see listing_cache.py); see apply_team_access().
+    """
+    top_level = parent_path.strip("/") == ""
+    for start in range(0, len(items), HYDRATION_CHUNK_SIZE):
+        chunk = items[start:start + HYDRATION_CHUNK_SIZE]
+        paths = ["/" + item["path"].strip("/") for item in chunk]
+        rows = db.query(
+            FileModel.path, FileModel.owner_id, FileModel.created_at, FileModel.modified_at, User.email, Team.id
+        ).outerjoin(
+            User, User.id == FileModel.owner_id
+        ).outerjoin(
+            Team, Team.folder_id == FileModel.id
+        ).filter(FileModel.path.in_(paths)).all()
+
+        metadata: Dict[str, tuple] = {}
+        for row in rows:
+            metadata.setdefault(row[0], row[1:])
+        for path, item in zip(paths, chunk):
+            if path not in metadata:
+                continue
+            owner_id, created_at, modified_at, owner_email, team_id = metadata[path]
+            if top_level and item["is_folder"] and team_id is not None:
+                item["is_team_folder"] = True
+                item["team_id"] = team_id
+            if owner_email:
+                item["owner_id"] = owner_id
+                item["owner"] = owner_email
+            # Use DB timestamps if available
+            if created_at:
+                item["created_at"] = created_at
+            if modified_at:
+                item["modified_at"] = modified_at
+
+
+def apply_team_access(db: Session, user, items: List[dict]):
+    """Set user_has_access on team folders in items: admins see all, others the teams they were granted."""
+    if user.role.name == "admin" or not any(item["is_team_folder"] for item in items):
+        return
+    granted = {
+        team_id for (team_id,) in db.query(UserTeamAccess.team_id).filter(UserTeamAccess.user_id == user.id)
+    }
+    for item in items:
+        if item["is_team_folder"]:
+            item["user_has_access"] = item["team_id"] in granted
+
+
+def format_item(item: dict) -> dict:
+    """Copy of item with the timestamps as ISO 8601 strings, the disk ones in UTC."""
+    item = dict(item)
+    for field in ("created_at", "modified_at"):
+        value = item[field]
+        item[field] = value.isoformat() if isinstance(value, datetime) else datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+    return item
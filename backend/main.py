@@ -9,6 +9,7 @@ from routers import logs
 from routers import authorize
 from routers import system
 from routers import teams
+from routers import jobs
 
 app = FastAPI()
 
@@ -18,6 +19,38 @@ import models
 
 models.Base.metadata.create_all(bind=engine)
 
+# create_all skips tables that already exist, so add any (nullable) columns and indexes introduced since
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+with engine.begin() as conn:
+    inspector = inspect(conn)
+    added_columns = set()
+    for table in models.Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns and column.nullable:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}"))
+                added_columns.add((table.name, column.name))
+        for index in table.indexes:
+            try:
+                with conn.begin_nested():
+                    index.create(bind=conn, checkfirst=True)
+            except Exception as e:
+                # e.g. uq_files_path while duplicate paths exist; everything else still works without it
+                print(f"Could not create index {index.name}: {e}")
+
+    if ("files", "parent_id") in added_columns:
+        from tree_utils import backfill_parent_ids
+        backfill_parent_ids(conn)
+        conn.execute(text(
+            "ALTER TABLE files ADD CONSTRAINT files_parent_id_fkey "
+            "FOREIGN KEY (parent_id) REFERENCES files (id) ON DELETE CASCADE"
+        ))
+    # Non-unique predecessor of uq_files_path (same operator class), redundant once that one exists
+    if "uq_files_path" in {index["name"] for index in inspect(conn).get_indexes("files")}:
+        conn.execute(text("DROP INDEX IF EXISTS ix_files_path_prefix"))
+
 
 # Enable CORS so frontend can talk to backend
 app.add_middleware(
@@ -26,6 +59,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paging cursor and chosen plan for search/filter results, caching and range headers for downloads
+    expose_headers=["X-Next-Cursor", "X-Query-Plan", "ETag", "Last-Modified", "Accept-Ranges", "Content-Range", "Content-Disposition"],
 )
 
 # Include all routers (modular structure)
@@ -38,9 +73,79 @@ app.include_router(logs.router, prefix="/api", tags=["Logs"])
 app.include_router(authorize.router, prefix="/api", tags=["Authorization"])
 app.include_router(system.router, prefix="/api/system", tags=["System"])
 app.include_router(teams.router, tags=["Teams"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+
+
+# Background filesystem/DB reconciler (see reconciler.py)
+from reconciler import reconciler, RECONCILER_ENABLED
+
+
+@app.on_event("startup")
+def start_reconciler():
+    if RECONCILER_ENABLED:
+        reconciler.start()
+
+
+@app.on_event("startup")
+def backfill_content_index():
+    # Queue documents stored before content search existed; extraction runs on its worker pool
+    import content_index
+    content_index.backfill()
+
+
+@app.on_event("startup")
+def backfill_blob_store():
+    # Hash (and with dedup on, share) files stored before the blob store existed
+    import threading
+    import blob_store
+    if blob_store.DEDUP_ENABLED:
+        threading.Thread(target=blob_store.backfill, name="dedup-backfill", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_trash_purger():
+    # Removes trashed folders once their retention period is over (see trash.py)
+    from trash import trash_purger
+    trash_purger.start()
+
+
+@app.on_event("startup")
+def start_folder_stats_verifier():
+    # Fills folder_stats on first start and corrects drift afterwards (see folder_stats.py)
+    from folder_stats import folder_stats_verifier
+    folder_stats_verifier.start()
+
+
+@app.on_event("startup")
+def start_job_engine():
+    # Runs async=true operations and fails jobs left behind by stopped processes (see jobs.py)
+    from jobs import job_engine
+    job_engine.start()
+
+
+@app.on_event("shutdown")
+def stop_reconciler():
+    reconciler.stop()
+
+
+@app.on_event("shutdown")
+def stop_trash_purger():
+    from trash import trash_purger
+    trash_purger.stop()
+
+
+@app.on_event("shutdown")
+def stop_folder_stats_verifier():
+    from folder_stats import folder_stats_verifier
+    folder_stats_verifier.stop()
+
+
+@app.on_event("shutdown")
+def stop_job_engine():
+    from jobs import job_engine
+    job_engine.stop()
 
 
 @app.get("/")
 def read_root():
     return {"message": "DMS Backend is running ✅"}
-
@@ -0,0 +1,58 @@
+# backend/metadata_utils.py
+# BATCHED METADATA HYDRATION
+# Resolves walked disk paths against the files table in chunks instead of one query per entry
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from models import File as FileModel, User
+
+# Paths resolved per IN query; keeps the statement well below parameter limits
+HYDRATION_CHUNK_SIZE = 500
+
+# Chunks start this small and double, so the first results of a walk come back quickly
+HYDRATION_FIRST_CHUNK_SIZE = 50
+
+
+def fetch_metadata(db: Session, paths: List[str]) -> Dict[str, Tuple[FileModel, Optional[str]]]:
+    """
+    Look up DB records for many paths with a single IN query joined to users.
+    Returns {path: (record, owner_email)}; paths without a record are absent.
+    """
+    if not paths:
+        return {}
+    rows = db.query(FileModel, User.email).outerjoin(
+        User, User.id == FileModel.owner_id
+    ).filter(FileModel.path.in_(set(paths))).all()
+    return {record.path: (record, owner_email) for record, owner_email in rows}
+
+
+def hydrate_in_chunks(
+    db: Session,
+    entries: Iterable[Tuple[str, object]],
+    chunk_size: int = HYDRATION_CHUNK_SIZE,
+    first_chunk_size: int = HYDRATION_FIRST_CHUNK_SIZE
+) -> Iterator[Tuple[str, object, Optional[FileModel], Optional[str]]]:
+    """
+    Attach DB metadata to a stream of (path, payload) entries.
+    Entries are buffered and resolved with one query per chunk, so the query count
+    depends on the number of chunks, not the number of entries. Chunks grow from
+    first_chunk_size up to chunk_size.
+    Yields (path, payload, record, owner_email) in the original order.
+    """
+    chunk = []
+    current_size = min(first_chunk_size, chunk_size)
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= current_size:
+            yield from _resolve_chunk(db, chunk)
+            chunk = []
+            current_size = min(current_size * 2, chunk_size)
+    if chunk:
+        yield from _resolve_chunk(db, chunk)
+
+
+def _resolve_chunk(db: Session, chunk):
+    metadata = fetch_metadata(db, [path for path, _ in chunk])
+    for path, payload in chunk:
+        record, owner_email = metadata.get(path, (None, None))
+        yield path, payload, record, owner_email
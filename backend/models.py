@@ -1,6 +1,7 @@
 # backend/models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, DateTime, ForeignKey, Boolean, UniqueConstraint, Index, DDL, Computed, event, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -39,12 +40,156 @@ class File(Base):
     path = Column(String, nullable=False)  # Full relative path from root (e.g. "/docs/report.pdf")
     is_folder = Column(Boolean, default=False)
     size = Column(Integer, default=0)  # 0 for folders
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     modified_at = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the content, names its blob (see blob_store.py)
+    stored_size = Column(BigInteger, nullable=True)  # Bytes on disk when stored compressed (see compression.py); size stays logical
+    # Containing folder (None at the root): filled in on insert by the files_set_parent_id trigger, moves set it (see tree_utils.py)
+    parent_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), nullable=True, index=True)
+    depth = Column(Integer, Computed("length(path) - length(replace(path, '/', ''))", persisted=True))  # "/a" is 1, "/a/b" is 2
 
     owner = relationship("User", back_populates="files")
 
+    __table_args__ = (
+        # Trigram index so substring name searches (ILIKE '%term%') don't scan the whole table
+        Index(
+            "ix_files_name_trgm", "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        # One row per path. text_pattern_ops serves equality lookups as well as prefix range scans,
+        # i.e. subtree queries (path LIKE '/a/b/%') and folder rename/move rewrites
+        Index("uq_files_path", "path", unique=True, postgresql_ops={"path": "text_pattern_ops"}),
+        # Top-level folders (/api/folders/statistics), found without scanning the table
+        Index("ix_files_top_folders", "id", postgresql_where=text("depth = 1 AND is_folder")),
+    )
+
+
+# pg_trgm provides the gin_trgm_ops operator class used above
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+# New rows get the id of the folder row at their parent path, so no insert site has to look it up.
+# Rows inserted earlier in the same statement are visible here, so a folder and its contents can
+# go in together (parents first). Installed on every start, existing databases included.
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL("""
+CREATE OR REPLACE FUNCTION files_set_parent_id() RETURNS trigger AS $$
+BEGIN
+    IF NEW.parent_id IS NULL THEN
+        SELECT id INTO NEW.parent_id FROM files WHERE path = regexp_replace(NEW.path, '/[^/]*$', '');
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS files_set_parent_id ON files;
+CREATE TRIGGER files_set_parent_id BEFORE INSERT ON files FOR EACH ROW EXECUTE FUNCTION files_set_parent_id();
+""").execute_if(dialect="postgresql")
+)
+
+
+# RECURSIVE FOLDER ROLLUPS (maintained by folder_stats.py)
+
+class FolderStats(Base):
+    __tablename__ = "folder_stats"
+    folder_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), primary_key=True)
+    total_size = Column(BigInteger, nullable=False, default=0)  # logical bytes of all files below
+    stored_size = Column(BigInteger, nullable=False, default=0)  # bytes those files take on disk
+    file_count = Column(Integer, nullable=False, default=0)
+    subfolder_count = Column(Integer, nullable=False, default=0)
+    verified_at = Column(DateTime, nullable=True)  # last time the verifier recomputed (or corrected) it
+
+
+# EXTRACTED DOCUMENT TEXT FOR CONTENT SEARCH (filled by content_index.py)
+
+class FileContent(Base):
+    __tablename__ = "file_contents"
+    file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=True)  # None when the format is unsupported or extraction failed
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('english', coalesce(content, ''))", persisted=True))
+    status = Column(String, nullable=False, default="indexed")  # "indexed", "unsupported" or "failed"
+    source_size = Column(BigInteger, nullable=True)  # size and mtime of the file when it was extracted,
+    source_mtime = Column(Float, nullable=True)      # used to skip re-extraction of unchanged files
+    extracted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_file_contents_tsv", "content_tsv", postgresql_using="gin"),
+    )
+
+
+# RESUMABLE CHUNKED UPLOADS (see upload_utils.py)
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    id = Column(String, primary_key=True)  # random token, also names the staging file
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    parent_path = Column(String, nullable=False)  # destination folder, e.g. "/docs"
+    filename = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    sha256 = Column(String, nullable=True)  # expected checksum, may also be given at finalize
+    remark = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# FOLDER TRASH (see trash.py)
+
+class TrashEntry(Base):
+    __tablename__ = "trash_entries"
+    id = Column(String, primary_key=True)  # random token, also names the folder under TRASH_PATH
+    original_path = Column(String, nullable=False, index=True)  # where a restore puts it back, e.g. "/docs/old"
+    deleted_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+    item_count = Column(Integer, default=0)
+    total_size = Column(BigInteger, default=0)
+    purge_requested = Column(Boolean, default=False)  # purge on the next pass instead of after the retention period
+    purge_started_at = Column(DateTime, nullable=True)  # set by the purger; the entry can no longer be restored
+
+
+class TrashedFile(Base):
+    __tablename__ = "trashed_files"
+    # files rows of a trashed folder, moved here unchanged (ids included) so a restore puts them back as they were
+    id = Column(Integer, primary_key=True)
+    trash_id = Column(String, ForeignKey("trash_entries.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    is_folder = Column(Boolean, default=False)
+    size = Column(Integer, default=0)
+    owner_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime)
+    modified_at = Column(DateTime)
+    content_hash = Column(String(64), nullable=True)
+    stored_size = Column(BigInteger, nullable=True)
+    parent_id = Column(Integer, nullable=True)
+
+
+# BACKGROUND JOBS (see jobs.py)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)  # random token
+    kind = Column(String, nullable=False)  # operation, e.g. "upload_folder", "delete_team"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    target_path = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed, cancelled
+    progress_done = Column(Integer, default=0)
+    progress_total = Column(Integer, nullable=True)  # None while unknown
+    message = Column(String, nullable=True)
+    result = Column(Text, nullable=True)  # JSON of what the synchronous endpoint would have returned
+    error = Column(Text, nullable=True)
+    status_code = Column(Integer, nullable=True)  # HTTP status of the error, as the endpoint would have answered
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # heartbeat of the process running it
+
 
 # ACTIVITY LOG TABLE:
 
@@ -0,0 +1,181 @@
+# backend/multipart_utils.py
+# STREAMING MULTIPART UPLOADS
+# Parses a multipart/form-data body while it arrives and writes each file part straight to a
+# staging file next to the storage root, computing its size and SHA-256 on the way. Finished
+# files are renamed into the tree, so every byte is written to disk once and memory use
+# stays bounded no matter how large the uploads are.
+
+import os
+import hashlib
+import secrets
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from upload_utils import UPLOAD_STAGING_PATH, install_file
+from blob_store import place_file
+from compression import compress_file
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart < 0.0.13 ships the parser as "multipart"
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Plain form fields (parent_path, remark, relpaths, ...) are kept in memory, so cap them
+MAX_FIELD_SIZE = 1024 * 1024
+
+
+class StagedFile:
+    """A file part of the request body, fully written to its staging file."""
+
+    def __init__(self, field: str, filename: str):
+        self.field = field
+        self.filename = filename
+        self.path = os.path.join(UPLOAD_STAGING_PATH, "part-" + secrets.token_hex(16))
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, "xb")
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def install(self, destination: str, overwrite: bool = False):
+        """Rename the staged file to its final location (no copy), or link it to a shared blob."""
+        if not overwrite:
+            install_file(self.path, destination, self.sha256)
+            return
+        compress_file(self.path, os.path.basename(destination))
+        if not place_file(self.path, destination, self.sha256, overwrite=True):
+            os.replace(self.path, destination)
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_multipart(
+    request: Request,
+    on_first_file: Optional[Callable[[Dict[str, List[str]]], None]] = None
+) -> Tuple[Dict[str, List[str]], List[StagedFile]]:
+    """
+    Read a multipart/form-data request body incrementally.
+    Returns ({field: [values]}, [StagedFile, ...]) with files in body order.
+    on_first_file(fields) runs before the first file byte is written, with the fields received
+    so far, so a request can be rejected (by raising) before any data lands on disk.
+    On any error all staged files are removed.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    # Parser callbacks only record events; they are applied after each parser.write()
+    events = []
+    header_field = bytearray()
+    header_value = bytearray()
+    part_headers = {}
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        part_headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(part_headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = options.get(b"filename")
+        events.append(("begin", name, filename.decode("utf-8", errors="replace") if filename is not None else None))
+        part_headers.clear()
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end",))
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+
+    fields: Dict[str, List[str]] = {}
+    files: List[StagedFile] = []
+    current_file: Optional[StagedFile] = None
+    current_field: Optional[Tuple[str, bytearray]] = None
+
+    os.makedirs(UPLOAD_STAGING_PATH, exist_ok=True)
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+
+            pending = []  # data for the current file, written in one call per chunk
+            for event in events:
+                if event[0] == "begin":
+                    _, name, filename = event
+                    if filename is not None:
+                        if not files and on_first_file is not None:
+                            # Typically permission checks (DB queries): off the event loop
+                            await run_in_threadpool(on_first_file, fields)
+                        current_file = await run_in_threadpool(StagedFile, name, filename)
+                        files.append(current_file)
+                    else:
+                        current_field = (name, bytearray())
+                elif event[0] == "data":
+                    if current_file is not None:
+                        pending.append(event[1])
+                    elif current_field is not None:
+                        current_field[1].extend(event[1])
+                        if len(current_field[1]) > MAX_FIELD_SIZE:
+                            raise HTTPException(status_code=413, detail=f"Form field '{current_field[0]}' is too large")
+                else:
+                    if current_file is not None:
+                        await _flush(current_file, pending)
+                        current_file.close()
+                        current_file = None
+                    elif current_field is not None:
+                        name, value = current_field
+                        fields.setdefault(name, []).append(value.decode("utf-8", errors="replace"))
+                        current_field = None
+            if current_file is not None:
+                await _flush(current_file, pending)
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        for staged in files:
+            staged.discard()
+        raise
+    return fields, files
+
+
+async def _flush(staged: StagedFile, pending: list):
+    if pending:
+        data = b"".join(pending)
+        pending.clear()
+        # Disk writes go to the threadpool so a slow disk doesn't stall the event loop
+        await run_in_threadpool(staged.write, data)
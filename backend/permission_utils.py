@@ -100,3 +100,82 @@ def require_owner_or_admin(path: str, db: Session, user=Depends(get_current_user
 def check_parent_permission(parent_path: str, db, user):
     """Legacy function - redirects to team-aware version"""
     return check_parent_permission_with_team_access(parent_path, db, user)
+
+
+class BatchPermissionChecker:
+    """
+    Same rules as check_parent_permission / require_owner_or_admin, answered for many paths at once.
+    Records for the paths and all their ancestors are loaded with one query and team access with
+    two more, so a batch costs a fixed number of queries however many items it has.
+    """
+
+    def __init__(self, db: Session, user, paths):
+        self.user = user
+        self.is_admin = user.role.name == "admin"
+
+        wanted = set()
+        for path in paths:
+            parts = path.strip("/").split("/")
+            for i in range(1, len(parts) + 1):
+                if parts[i - 1]:
+                    wanted.add("/" + "/".join(parts[:i]))
+        self.records = {
+            record.path: record
+            for record in db.query(FileModel).filter(FileModel.path.in_(wanted))
+        } if wanted else {}
+
+        # Team folders among the top-level folders involved, and the user's access to them
+        roots = {"/" + path.strip("/").split("/")[0] for path in wanted}
+        self.team_roots = {}
+        rows = db.query(FileModel.path, Team.id).join(
+            Team, Team.folder_id == FileModel.id
+        ).filter(
+            FileModel.path.in_(roots),
+            FileModel.is_folder == True
+        ).all() if roots else []
+        team_ids = [team_id for _, team_id in rows]
+        member_of = {
+            team_id for (team_id,) in db.query(UserTeamAccess.team_id).filter(
+                UserTeamAccess.user_id == user.id,
+                UserTeamAccess.team_id.in_(team_ids)
+            )
+        } if team_ids else set()
+        for root_path, team_id in rows:
+            self.team_roots[root_path] = team_id in member_of
+        self._parent_cache = {}
+
+    def require_owner_or_admin(self, path: str):
+        """In-memory require_owner_or_admin_or_team_member; returns the record."""
+        record = self.records.get(path)
+        if not record:
+            raise HTTPException(status_code=404, detail="Resource not found")
+        if self.is_admin or record.owner_id == self.user.id:
+            return record
+        if self.team_roots.get("/" + path.strip("/").split("/")[0]):
+            return record
+        raise HTTPException(status_code=403, detail="Not authorised")
+
+    def check_parent_permission(self, parent_path: str):
+        """In-memory check_parent_permission_with_team_access, cached per folder."""
+        norm_parent = parent_path.strip().replace("\\", "/").strip("/")
+        if norm_parent not in self._parent_cache:
+            try:
+                self._check_parent(norm_parent)
+                self._parent_cache[norm_parent] = None
+            except HTTPException as e:
+                self._parent_cache[norm_parent] = e
+        error = self._parent_cache[norm_parent]
+        if error is not None:
+            raise error
+
+    def _check_parent(self, norm_parent: str):
+        if not norm_parent:
+            return
+        root_path = "/" + norm_parent.split("/")[0]
+        if root_path in self.team_roots:
+            if self.is_admin or self.team_roots[root_path]:
+                return
+            raise HTTPException(status_code=403, detail="Not authorised - no team access")
+        while norm_parent not in ("", "/"):
+            self.require_owner_or_admin(f"/{norm_parent}")
+            norm_parent = norm_parent.rsplit("/", 1)[0] if "/" in norm_parent else ""
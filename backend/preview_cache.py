@@ -0,0 +1,184 @@
+# backend/preview_cache.py
+# THUMBNAIL AND PREVIEW CACHE
+# Renders first-page thumbnails and low-resolution previews of PDFs and images on a worker pool
+# and keeps them in an on-disk LRU cache with a size budget. Cache keys include the file's path,
+# mtime and size, so a changed file never gets a stale preview.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Optional: without Pillow no previews are generated (every type reports unsupported)
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:
+    # Optional: without pypdfium2 only images get previews
+    pypdfium2 = None
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+# Outside the storage tree so listings and the reconciler never see cached previews
+PREVIEW_CACHE_PATH = os.path.abspath(
+    os.getenv("PREVIEW_CACHE_PATH", os.path.join(os.path.dirname(BASE_DIR), ".previews"))
+)
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_MB", "512")) * 1024 * 1024
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+
+# Longest edge in pixels per variant
+PREVIEW_SIZES = {"thumb": 256, "preview": 1024}
+JPEG_QUALITY = 80
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+PDF_EXTENSIONS = {".pdf"}
+
+# PDFium is not thread-safe, so PDF pages are rendered one at a time
+_pdfium_lock = threading.Lock()
+
+
+def is_previewable(name: str) -> bool:
+    ext = os.path.splitext(name)[1].lower()
+    if Image is None:
+        return False
+    return ext in IMAGE_EXTENSIONS or (ext in PDF_EXTENSIONS and pypdfium2 is not None)
+
+
+def cache_key(abs_path: str, st: os.stat_result, variant: str) -> str:
+    raw = f"{abs_path}\0{st.st_mtime_ns}\0{st.st_size}\0{variant}"
+    return hashlib.sha1(raw.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+
+def render_preview(abs_path: str, max_edge: int):
+    """PIL image of the file (first page for PDFs), scaled to fit max_edge."""
+    if os.path.splitext(abs_path)[1].lower() in PDF_EXTENSIONS:
+        with _pdfium_lock:
+            pdf = pypdfium2.PdfDocument(abs_path)
+            try:
+                page = pdf[0]
+                width, height = page.get_size()
+                image = page.render(scale=max_edge / max(width, height, 1)).to_pil()
+                page.close()
+            finally:
+                pdf.close()
+    else:
+        image = Image.open(abs_path)
+        # Lets the JPEG decoder skip most of the pixels of large photos
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge))
+    if image.mode != "RGB":
+        # JPEG has no alpha; flatten transparent images onto white
+        background = Image.new("RGB", image.size, "white")
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    return image
+
+
+class PreviewCache:
+    """
+    Generated previews on disk, evicted least recently used first once they exceed max_bytes.
+    get() never blocks on rendering: a miss queues the work and reports "pending".
+    """
+
+    def __init__(self, root: str = PREVIEW_CACHE_PATH, max_bytes: int = PREVIEW_CACHE_MAX_BYTES, workers: int = PREVIEW_WORKERS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total = 0
+        self._pending = set()
+        self._failed = set()
+        self._loaded = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".jpg")
+
+    def _load(self):
+        """Pick up previews from earlier runs, oldest access first."""
+        found = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith(".jpg"):
+                        st = os.stat(os.path.join(dirpath, name))
+                        found.append((st.st_atime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        self._loaded = True
+
+    def get(self, abs_path: str, variant: str) -> Tuple[str, Optional[str]]:
+        """
+        ("ready", cached file), ("pending", None) while it is being generated,
+        or ("failed", None) if this version of the file can't be rendered.
+        """
+        st = os.stat(abs_path)
+        key = cache_key(abs_path, st, variant)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key in self._entries:
+                if os.path.exists(self._path(key)):
+                    self._entries.move_to_end(key)
+                    return "ready", self._path(key)
+                # Removed from the cache directory behind our back; render it again
+                self._total -= self._entries.pop(key)
+            if key in self._failed:
+                return "failed", None
+            if key not in self._pending:
+                self._pending.add(key)
+                self._executor.submit(self._generate, key, abs_path, variant)
+        return "pending", None
+
+    def _generate(self, key: str, abs_path: str, variant: str):
+        target = self._path(key)
+        try:
+            image = render_preview(abs_path, PREVIEW_SIZES[variant])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = target + ".tmp"
+            image.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            os.replace(tmp, target)
+            size = os.path.getsize(target)
+        except Exception as e:
+            print(f"Preview generation failed for {abs_path}: {e}")
+            with self._lock:
+                self._pending.discard(key)
+                self._failed.add(key)
+            return
+        with self._lock:
+            self._pending.discard(key)
+            self._entries[key] = size
+            self._total += size
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "pending": len(self._pending),
+                "failed": len(self._failed)
+            }
+
+
+preview_cache = PreviewCache()
@@ -0,0 +1,518 @@
+# backend/reconciler.py
+# BACKGROUND FILESYSTEM / DB RECONCILER
+# Keeps files.size, files.modified_at and existence in line with what is actually on disk,
+# so request handlers can trust the files table instead of re-stating the storage tree.
+
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import text, update
+from database import SessionLocal, engine
+from models import File as FileModel
+from metadata_utils import fetch_metadata, HYDRATION_CHUNK_SIZE
+from compression import logical_size, stored_size
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    # Optional: without inotify_simple (or off Linux) the reconciler polls instead
+    INotify = None
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+RECONCILER_ENABLED = os.getenv("RECONCILER_ENABLED", "true").lower() == "true"
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "60"))  # seconds between passes
+RECONCILE_FULL_EVERY = int(os.getenv("RECONCILE_FULL_EVERY", "10"))  # full pass every N intervals
+RECONCILE_FIX_ORPHANS = os.getenv("RECONCILE_FIX_ORPHANS", "false").lower() == "true"
+
+# Only one worker process reconciles at a time: the one holding this PostgreSQL advisory lock
+# (session level, on a connection kept open while it leads)
+RECONCILER_LOCK_ID = 5_310_001
+
+# Orphan paths reported by status(); the counts are always complete
+ORPHAN_SAMPLE_SIZE = 50
+
+# Seconds to let a burst of inotify events settle before applying them
+EVENT_SETTLE_SECONDS = 1.0
+
+# (is_folder, size, mtime) for every path under the storage root
+DiskEntry = Tuple[bool, int, float]
+
+
+def _db_path(abs_path: str, base_path: str) -> str:
+    return "/" + os.path.relpath(abs_path, base_path).replace("\\", "/")
+
+
+def _chunks(paths, size=HYDRATION_CHUNK_SIZE):
+    paths = list(paths)
+    for i in range(0, len(paths), size):
+        yield paths[i:i + size]
+
+
+class StorageReconciler:
+    """
+    Watches BASE_DIR and keeps the files table in sync with it.
+
+    - With inotify available, changed paths are applied within a second or so of the event,
+      and every RECONCILE_FULL_EVERY intervals a full pass catches anything that was missed.
+    - Otherwise every RECONCILE_INTERVAL seconds the tree is re-stated and only paths whose
+      (type, size, mtime) changed since the previous pass are looked up in the DB.
+    - Full passes compare every DB row against disk, which is how DB rows whose path never
+      existed on disk are found.
+
+    Orphans are reported in both directions: DB rows missing on disk and disk entries with no
+    DB row. With RECONCILE_FIX_ORPHANS=true the former are deleted and the latter registered
+    under the owner of their nearest registered ancestor folder.
+    """
+
+    def __init__(self, base_path: str = BASE_DIR, interval: float = RECONCILE_INTERVAL):
+        self.base_path = base_path
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._snapshot: Dict[str, DiskEntry] = {}
+        self._passes = 0
+        self._last_full = 0.0
+        self._missing_paths = set()
+        self._untracked_paths = set()
+        self._leader_conn = None
+        self._inotify = None
+        self._watches: Dict[int, str] = {}
+        self._dirty = set()
+        self._overflowed = False
+        self._state = {
+            "mode": "inotify" if INotify is not None else "polling",
+            "running": False,
+            "leader": None,
+            "phase": "idle",
+            "scanned": 0,
+            "expected": 0,
+            "passes": 0,
+            "last_pass": None,
+            "last_full_pass_at": None,
+            "synced_as_of": None,
+            "updated": 0,
+            "missing_on_disk": [],
+            "missing_on_disk_count": 0,
+            "untracked_on_disk": [],
+            "untracked_on_disk_count": 0,
+            "last_error": None
+        }
+
+    # ---- lifecycle ----
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="storage-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def status(self) -> dict:
+        """Current progress plus lag: how many seconds of disk changes the DB may not reflect yet."""
+        with self._lock:
+            state = dict(self._state)
+            state["pending_events"] = len(self._dirty)
+        synced = state["synced_as_of"]
+        state["lag_seconds"] = round(time.time() - synced, 1) if synced else None
+        for key in ("synced_as_of", "last_full_pass_at"):
+            if state[key]:
+                state[key] = datetime.utcfromtimestamp(state[key]).isoformat()
+        return state
+
+    def _set(self, **values):
+        with self._lock:
+            self._state.update(values)
+
+    # ---- main loop ----
+
+    def _run(self):
+        self._set(running=True)
+        if INotify is not None:
+            try:
+                self._inotify = INotify()
+            except OSError as e:
+                print(f"Reconciler: inotify unavailable ({e}), polling instead")
+                self._set(mode="polling")
+
+        while not self._stop.is_set():
+            try:
+                leader = self._acquire_leadership()
+            except Exception as e:
+                print(f"Reconciler leadership check failed: {e}")
+                self._set(last_error=str(e))
+                leader = False
+            if not leader:
+                # Another worker process reconciles; scanning here as well would only duplicate its work
+                self._stop.wait(self.interval)
+                continue
+
+            full = self._overflowed or time.time() - self._last_full >= self.interval * RECONCILE_FULL_EVERY
+            try:
+                if full or self._inotify is None:
+                    self.run_pass(full=full)
+                else:
+                    self.run_event_pass()
+            except Exception as e:
+                print(f"Reconciler pass failed: {e}")
+                self._set(last_error=str(e), phase="idle")
+            self._passes += 1
+            self._wait()
+        self._release_leadership()
+        self._set(running=False)
+
+    def _acquire_leadership(self) -> bool:
+        """
+        True while this process holds the reconciler lock. The lock is taken on a dedicated
+        connection and kept across passes; if that connection breaks, leadership is given up
+        and the next pass that wins it starts from a full pass.
+        """
+        if engine.dialect.name != "postgresql":
+            self._set(leader=True)
+            return True
+        if self._leader_conn is not None:
+            try:
+                self._leader_conn.execute(text("SELECT 1"))
+                self._leader_conn.commit()
+                return True
+            except Exception as e:
+                print(f"Reconciler lost its lock connection: {e}")
+                self._release_leadership()
+
+        conn = engine.connect()
+        try:
+            got_lock = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": RECONCILER_LOCK_ID}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not got_lock:
+            conn.close()
+            self._set(leader=False)
+            return False
+        self._leader_conn = conn
+        # Whatever happened while another worker led is unknown here
+        self._snapshot = {}
+        self._last_full = 0.0
+        self._set(leader=True)
+        return True
+
+    def _release_leadership(self):
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is None:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RECONCILER_LOCK_ID})
+            conn.commit()
+        except Exception:
+            pass  # closing the connection releases the lock as well
+        finally:
+            conn.close()
+        self._set(leader=False)
+
+    def _wait(self):
+        """Sleep until the next pass; in inotify mode collect events meanwhile."""
+        if self._inotify is None:
+            self._stop.wait(self.interval)
+            return
+        deadline = time.time() + self.interval
+        while not self._stop.is_set() and time.time() < deadline:
+            started = time.time()
+            events = self._inotify.read(timeout=1000, read_delay=int(EVENT_SETTLE_SECONDS * 1000))
+            self._collect_events(events)
+            if self._dirty or self._overflowed:
+                return
+            # Nothing pending: the DB reflects everything up to when we started listening
+            if self._state["leader"]:
+                self._set(synced_as_of=started)
+
+    # ---- passes ----
+
+    def run_pass(self, full: bool = False):
+        """Walk the whole tree; compare changed paths (or everything when full) against the DB."""
+        started = time.time()
+        self._set(phase="scanning", scanned=0, expected=len(self._snapshot))
+        if self._inotify is not None:
+            self._dirty.clear()
+            self._overflowed = False
+        disk = self._scan(self.base_path)
+
+        if full or not self._snapshot:
+            paths = None
+        else:
+            paths = {p for p, entry in disk.items() if self._snapshot.get(p) != entry}
+            paths |= set(self._snapshot) - set(disk)
+
+        self._set(phase="applying")
+        self._apply(disk, paths)
+        self._snapshot = disk
+        self._set(synced_as_of=started, last_pass=("full" if paths is None else "incremental"))
+        if paths is None:
+            self._last_full = time.time()
+            self._set(last_full_pass_at=self._last_full)
+        self._set(phase="idle", passes=self._passes + 1)
+
+    def run_event_pass(self):
+        """Apply only the paths inotify reported as changed."""
+        started = time.time()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        self._set(phase="scanning", scanned=0, expected=len(dirty))
+
+        disk = {}
+        paths = set()
+        for abs_path in dirty:
+            path = _db_path(abs_path, self.base_path)
+            paths.add(path)
+            # Whatever we knew below this path may have moved or vanished with it
+            prefix = path + "/"
+            paths.update(p for p in self._snapshot if p.startswith(prefix))
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                continue
+            is_folder = os.path.isdir(abs_path)
+            disk[path] = (is_folder, 0 if is_folder else logical_size(abs_path, st), st.st_mtime)
+            if is_folder:
+                # New or moved-in folder: pick up its contents and watch it
+                subtree = self._scan(abs_path)
+                disk.update(subtree)
+                paths.update(subtree)
+
+        self._set(phase="applying")
+        self._apply(disk, paths)
+        for path in paths:
+            if path in disk:
+                self._snapshot[path] = disk[path]
+            else:
+                self._snapshot.pop(path, None)
+        self._set(synced_as_of=started, last_pass="events")
+        self._set(phase="idle", passes=self._passes + 1)
+
+    # ---- disk side ----
+
+    def _scan(self, abs_root: str) -> Dict[str, DiskEntry]:
+        """Stat everything below abs_root once; also (re)registers inotify watches."""
+        disk = {}
+        stack = [abs_root]
+        scanned = 0
+        while stack:
+            directory = stack.pop()
+            self._watch(directory)
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                    is_folder = entry.is_dir()
+                except OSError:
+                    continue
+                disk[_db_path(entry.path, self.base_path)] = (is_folder, 0 if is_folder else logical_size(entry.path, st), st.st_mtime)
+                if is_folder and not entry.is_symlink():
+                    stack.append(entry.path)
+            scanned += len(entries)
+            self._set(scanned=scanned)
+        return disk
+
+    def _watch(self, directory: str):
+        if self._inotify is None:
+            return
+        mask = (
+            inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MOVED_FROM |
+            inotify_flags.MOVED_TO | inotify_flags.CLOSE_WRITE | inotify_flags.ATTRIB |
+            inotify_flags.DELETE_SELF
+        )
+        try:
+            wd = self._inotify.add_watch(directory, mask)
+        except OSError:
+            # Typically fs.inotify.max_user_watches; the periodic full pass still covers this folder
+            return
+        self._watches[wd] = directory
+
+    def _collect_events(self, events):
+        with self._lock:
+            for event in events:
+                if event.mask & inotify_flags.Q_OVERFLOW:
+                    self._overflowed = True
+                    continue
+                if event.mask & inotify_flags.IGNORED:
+                    self._watches.pop(event.wd, None)
+                    continue
+                directory = self._watches.get(event.wd)
+                if directory is None:
+                    continue
+                self._dirty.add(os.path.join(directory, event.name) if event.name else directory)
+
+    # ---- DB side ----
+
+    def _apply(self, disk: Dict[str, DiskEntry], paths: Optional[Iterable[str]]):
+        """Sync DB rows with disk for the given paths (all rows when paths is None). Only called by the leader."""
+        db = SessionLocal()
+        try:
+            if paths is None:
+                rows = db.query(
+                    FileModel.id, FileModel.path, FileModel.is_folder, FileModel.size,
+                    FileModel.modified_at, FileModel.owner_id
+                ).yield_per(HYDRATION_CHUNK_SIZE)
+                records = {row.path: row for row in rows}
+                paths = set(records) | set(disk)
+                full = True
+            else:
+                paths = set(paths)
+                records = {}
+                for chunk in _chunks(paths):
+                    records.update({p: r for p, (r, _) in fetch_metadata(db, chunk).items()})
+                full = False
+
+            updates = []
+            changed_files = []
+            touched = []  # paths whose listing metadata changed
+            missing = []
+            untracked = []
+            for path in paths:
+                record = records.get(path)
+                entry = disk.get(path)
+                if record is not None and entry is None:
+                    missing.append(record)
+                elif record is None and entry is not None:
+                    untracked.append(path)
+                elif record is not None:
+                    is_folder, size, mtime = entry
+                    disk_modified = datetime.utcfromtimestamp(mtime)
+                    changes = {}
+                    if not is_folder and record.size != size:
+                        changes["size"] = size
+                        try:
+                            changes["stored_size"] = stored_size(os.path.join(self.base_path, path.strip("/")))
+                        except OSError:
+                            pass
+                    # Only move forward: API renames/moves stamp modified_at without touching mtime
+                    if record.modified_at is None or disk_modified > record.modified_at:
+                        changes["modified_at"] = disk_modified
+                    if changes:
+                        updates.append(dict(changes, id=record.id))
+                        touched.append(path)
+                        if not is_folder:
+                            changed_files.append(record.id)
+
+            if updates:
+                db.execute(update(FileModel), updates)
+
+            if RECONCILE_FIX_ORPHANS:
+                touched += [record.path for record in missing]
+                fixed = self._fix_orphans(db, disk, records, missing, untracked)
+                touched += [path for path in untracked if path not in fixed]
+                untracked = fixed
+                missing = []
+
+            db.commit()
+            if touched:
+                # Metadata changed without the directories' mtimes moving
+                from listing_cache import listing_cache
+                listing_cache.invalidate_parents(*touched)
+            if changed_files:
+                # Changed on disk, so the extracted text for content search may be stale
+                from content_index import schedule_extraction
+                schedule_extraction(changed_files)
+            self._record_orphans(paths, missing, untracked, full, len(updates))
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _fix_orphans(self, db, disk, records, missing, untracked):
+        # The scan may be minutes old: paths created or moved in since then keep their rows,
+        # and entries that went away since are not registered
+        missing = [record for record in missing if not os.path.lexists(self._abs_path(record.path))]
+        untracked = [path for path in untracked if os.path.lexists(self._abs_path(path))]
+        if missing:
+            ids = [record.id for record in missing]
+            for chunk in _chunks(ids):
+                db.query(FileModel).filter(FileModel.id.in_(chunk)).delete(synchronize_session=False)
+
+        # Parents first, so nested untracked folders inherit the owner registered just before them
+        owners = {path: record.owner_id for path, record in records.items()}
+        registered = []
+        for path in sorted(untracked, key=lambda p: p.count("/")):
+            owner_id = self._nearest_owner(db, path, owners)
+            if owner_id is None:
+                continue
+            is_folder, size, mtime = disk[path]
+            modified = datetime.utcfromtimestamp(mtime)
+            db.add(FileModel(
+                name=os.path.basename(path),
+                path=path,
+                is_folder=is_folder,
+                size=size,
+                owner_id=owner_id,
+                created_at=modified,
+                modified_at=modified
+            ))
+            owners[path] = owner_id
+            registered.append(path)
+        if missing or registered:
+            print(f"Reconciler: removed {len(missing)} stale rows, registered {len(registered)} untracked entries")
+        # Entries with no registered ancestor stay untracked
+        return [path for path in untracked if path not in owners]
+
+    def _abs_path(self, path: str) -> str:
+        return os.path.join(self.base_path, path.strip("/"))
+
+    def _nearest_owner(self, db, path, owners):
+        ancestors = []
+        parent = os.path.dirname(path)
+        while parent not in ("", "/"):
+            ancestors.append(parent)
+            parent = os.path.dirname(parent)
+        unknown = [p for p in ancestors if p not in owners]
+        if unknown:
+            for p, (record, _) in fetch_metadata(db, unknown).items():
+                owners[p] = record.owner_id
+            for p in unknown:
+                owners.setdefault(p, None)
+        for ancestor in ancestors:
+            if owners.get(ancestor) is not None:
+                return owners[ancestor]
+        return None
+
+    def _record_orphans(self, examined, missing, untracked, full, updated):
+        with self._lock:
+            if full:
+                # A full pass sees everything, so the lists are replaced outright
+                self._missing_paths = {record.path for record in missing}
+                self._untracked_paths = set(untracked)
+            else:
+                # Incremental passes only re-judge the paths they looked at
+                self._missing_paths = (self._missing_paths - examined) | {record.path for record in missing}
+                self._untracked_paths = (self._untracked_paths - examined) | set(untracked)
+            self._state.update(
+                updated=self._state["updated"] + updated,
+                missing_on_disk=sorted(self._missing_paths)[:ORPHAN_SAMPLE_SIZE],
+                missing_on_disk_count=len(self._missing_paths),
+                untracked_on_disk=sorted(self._untracked_paths)[:ORPHAN_SAMPLE_SIZE],
+                untracked_on_disk_count=len(self._untracked_paths),
+                last_error=None
+            )
+
+
+# Process-wide instance started from main.py
+reconciler = StorageReconciler()
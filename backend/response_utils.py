@@ -0,0 +1,78 @@
+# backend/response_utils.py
+# FAST, COMPRESSED JSON RESPONSES
+# Listing endpoints (folders/list, logs, disk-filter, disk-search) can return many thousands of
+# items. They are serialized with orjson when it is installed and, above a size threshold, brotli-
+# or gzip-compressed according to the client's Accept-Encoding. Only these JSON responses are
+# compressed: file downloads already stream as-is (or zstd-encoded, see compression.py).
+
+import gzip
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Optional
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    # Optional: the standard json module is used without orjson (same output, slower)
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without brotli, clients get gzip
+    brotli = None
+
+# Smaller bodies are not worth the CPU (and would barely shrink)
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes; datetimes become ISO 8601 strings, as jsonable_encoder writes them."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def accepts_encoding(request: Request, coding: str) -> bool:
+    """True if Accept-Encoding lists coding (or *) without q=0."""
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() in (coding, "*"):
+            q = params.strip().lower()
+            try:
+                return not (q.startswith("q=") and float(q[2:] or 0) == 0)
+            except ValueError:
+                return False
+    return False
+
+
+def compress_body(request: Optional[Request], body: bytes):
+    """(body, content-encoding or None) - brotli if available and accepted, else gzip."""
+    if request is None or len(body) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return body, None
+    if brotli is not None and accepts_encoding(request, "br"):
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if accepts_encoding(request, "gzip"):
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+
+def json_response(request: Optional[Request], content: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """JSON response serialized with dumps() and compressed for the client when it is large enough."""
+    body, encoding = compress_body(request, dumps(content))
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
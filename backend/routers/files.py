@@ -1,10 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as FastAPIFile, Form, Query, File, Body
+from fastapi import APIRouter, Depends, HTTPException, File as FastAPIFile, Query, Body, Request
 from sqlalchemy.orm import Session
 from models import File as FileModel, User, ActivityLog
 from database import get_db
 from dependencies import get_current_user
 import os
-import shutil
 import urllib.parse
 from datetime import datetime, timedelta
 from fastapi.responses import FileResponse
@@ -18,15 +17,26 @@ router = APIRouter()
 # Storage configuration - use environment variable with fallback
 BASE_STORAGE_PATH = os.path.abspath(os.getenv("STORAGE_PATH", "storage"))
 
+from schemas import DiskEntryResult
+
 # DISK-BASED SEARCH ENDPOINT
-@router.get("/disk-search")
+@router.get("/disk-search", response_model=List[DiskEntryResult])
 def disk_search(
+    request: Request,
     query: str = Query(..., min_length=1),
     parent_path: str = Query("/", description="Path to folder to search in"),
+    include_untracked: bool = Query(False, description="Walk the disk so items without a DB record are also returned"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Return at most this many results; the search stops once they are found"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    stream: bool = Query(False, description="Stream results as application/x-ndjson while the search runs"),
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     from permission_utils import check_parent_permission
+    from search_utils import (
+        search_by_name, serialize_search_result, iter_walk_search,
+        decode_cursor, paged_response, page_chunk_sizes
+    )
     
     # Permission check now includes team access
     check_parent_permission(parent_path.strip("/"), db, user)
@@ -37,69 +47,29 @@ def disk_search(
         raise HTTPException(status_code=400, detail="Invalid path")
     if not os.path.exists(abs_parent):
         raise HTTPException(status_code=404, detail="Folder not found")
-    results = []
-    for root, dirs, files in os.walk(abs_parent):
-        # Search folders
-        for d in dirs:
-            if query.lower() in d.lower():
-                rel_path = os.path.relpath(os.path.join(root, d), BASE_STORAGE_PATH)
-                path_with_slash = "/" + rel_path.replace("\\", "/")
-                
-                # Try to get folder metadata from DB
-                db_record = db.query(FileModel).filter(FileModel.path == path_with_slash).first()
-                
-                folder_info = {
-                    "name": d,
-                    "path": path_with_slash,
-                    "is_folder": True
-                }
-                
-                # Add DB metadata if available
-                if db_record:
-                    folder_info.update({
-                        "id": db_record.id,
-                        "created_at": jsonable_encoder(db_record.created_at),
-                        "modified_at": jsonable_encoder(db_record.modified_at),
-                        "owner_id": db_record.owner_id,
-                        "owner": db.query(User).filter(User.id == db_record.owner_id).first().email
-                    })
-                
-                results.append(folder_info)
-                
-        # Search files
-        for f in files:
-            if query.lower() in f.lower():
-                rel_path = os.path.relpath(os.path.join(root, f), BASE_STORAGE_PATH)
-                path_with_slash = "/" + rel_path.replace("\\", "/")
-                file_path = os.path.join(root, f)
-                
-                # Basic file info from disk
-                file_info = {
-                    "name": f,
-                    "path": path_with_slash,
-                    "is_folder": False,
-                    "size": os.path.getsize(file_path)
-                }
-                
-                # Try to get file metadata from DB
-                db_record = db.query(FileModel).filter(FileModel.path == path_with_slash).first()
-                
-                # Add DB metadata if available
-                if db_record:
-                    file_info.update({
-                        "id": db_record.id,
-                        "created_at": jsonable_encoder(db_record.created_at),
-                        "modified_at": jsonable_encoder(db_record.modified_at),
-                        "owner_id": db_record.owner_id,
-                        "owner": db.query(User).filter(User.id == db_record.owner_id).first().email
-                    })
-                
-                results.append(file_info)
-    return results
+
+    after = decode_cursor(cursor) if cursor else None
+    stream = stream or "application/x-ndjson" in request.headers.get("accept", "")
+
+    def iter_results(session):
+        # Fallback mode: walk the disk, picking up files that were never registered in the DB
+        if include_untracked:
+            return iter_walk_search(session, query, abs_parent, BASE_STORAGE_PATH, after=after, limit=limit)
+
+        # Default mode: answer from the indexed name column, scoped to the parent_path prefix
+        rows = search_by_name(session, query, parent_path, after_path=after[0] if after else None)
+        if limit is not None:
+            rows = rows.limit(limit + 1)
+        else:
+            rows = rows.yield_per(page_chunk_sizes(None)[0])
+        return (serialize_search_result(record, owner_email) for record, owner_email in rows)
+
+    return paged_response(iter_results, db, limit, stream, request=request)
 
 # DISK-BASED FILTER ENDPOINT
-@router.get("/disk-filter")
+@router.get("/disk-filter", response_model=List[DiskEntryResult])
 def disk_filter(
+    request: Request,
     parent_path: str = Query("/", description="Path to folder to filter in"),
     is_folder: Optional[bool] = Query(None, description="True for folders, False for files, None for both"),
     min_size: Optional[int] = Query(None, description="Minimum file size in bytes"),
@@ -107,6 +77,10 @@ def disk_filter(
     owner_email: Optional[str] = Query(None, description="Email of file owner"),
     created_after: Optional[datetime] = Query(None, description="Filter items created after this date"),
     created_before: Optional[datetime] = Query(None, description="Filter items created before this date"),
+    include_untracked: bool = Query(False, description="Walk the disk so items without a DB record are also returned"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Return at most this many results; the walk stops once they are found"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    stream: bool = Query(False, description="Stream results as application/x-ndjson while the walk runs"),
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -136,226 +110,430 @@ def disk_filter(
     if not os.path.exists(abs_parent):
         raise HTTPException(status_code=404, detail="Folder not found")
     
-    results = []
-
-    # First scan the filesystem to find all files/folders
-    for root, dirs, files in os.walk(abs_parent):
-        # Process folders if needed
-        if is_folder in (None, True):
-            for d in dirs:
-                rel_path = os.path.relpath(os.path.join(root, d), BASE_STORAGE_PATH)
-                path_with_slash = "/" + rel_path.replace("\\", "/")
-                
-                # Try to get folder metadata from DB
-                db_record = db.query(FileModel).filter(FileModel.path == path_with_slash).first()
-                
-                # Apply database filters
-                if db_record:
-                    # Skip if owner filter doesn't match
-                    if owner_id is not None and db_record.owner_id != owner_id:
-                        continue
-                    
-                    # Skip if date filters don't match
-                    if created_after:
-                        # Convert created_at to UTC for comparison if it has timezone info
-                        record_time = db_record.created_at
-                        if record_time.tzinfo is not None:
-                            record_time = record_time.replace(tzinfo=None)
-                        if record_time < created_after:
-                            continue
-                    
-                    if created_before:
-                        # Convert created_at to UTC for comparison if it has timezone info
-                        record_time = db_record.created_at
-                        if record_time.tzinfo is not None:
-                            record_time = record_time.replace(tzinfo=None)
-                        if record_time > created_before:
-                            continue
-                    
-                    # All filters passed, create result with DB metadata
-                    folder_info = {
-                        "id": db_record.id,
-                        "name": d,
-                        "path": path_with_slash,
-                        "is_folder": True,
-                        "created_at": jsonable_encoder(db_record.created_at),
-                        "modified_at": jsonable_encoder(db_record.modified_at),
-                        "owner_id": db_record.owner_id,
-                        "owner": db.query(User).filter(User.id == db_record.owner_id).first().email
-                    }
-                    results.append(folder_info)
-                # If no DB record, check if we can include based on filesystem dates
-                else:
-                    # Only skip if we have owner filter (can't check without DB record)
-                    if owner_id is not None:
-                        continue
-                    
-                    # Check filesystem dates if date filters are applied
-                    if created_after or created_before:
-                        try:
-                            folder_stat = os.stat(os.path.join(root, d))
-                            folder_created = datetime.fromtimestamp(folder_stat.st_ctime)
-                            
-                            if created_after and folder_created < created_after:
-                                continue
-                            if created_before and folder_created > created_before:
-                                continue
-                        except (OSError, ValueError):
-                            # If we can't get filesystem dates, skip when date filters are active
-                            continue
-                    
-                    # Include with basic filesystem info
-                    folder_info = {
-                        "name": d,
-                        "path": path_with_slash,
-                        "is_folder": True
-                    }
-                    results.append(folder_info)
-                
-        # Process files if needed
-        if is_folder in (None, False):
-            for f in files:
-                file_path = os.path.join(root, f)
-                size = os.path.getsize(file_path)
-                
-                # Apply size filters
+    from search_utils import (
+        walk_entries, decode_cursor, paged_response, page_chunk_sizes,
+        plan_filter, filter_records, serialize_filter_result
+    )
+    from metadata_utils import hydrate_in_chunks
+    from compression import logical_size
+
+    after = decode_cursor(cursor) if cursor else None
+    stream = stream or "application/x-ndjson" in request.headers.get("accept", "")
+    chunk_size, first_chunk_size = page_chunk_sizes(limit)
+
+    # DB plan unless the caller needs entries that have no DB record
+    plan = plan_filter(include_untracked, owner_id)
+
+    if plan == "db":
+        def iter_db_results(session):
+            rows = filter_records(
+                session, parent_path,
+                is_folder=is_folder, min_size=min_size, max_size=max_size, owner_id=owner_id,
+                created_after=created_after, created_before=created_before,
+                after_path=after[0] if after else None
+            )
+            if limit is not None:
+                rows = rows.limit(limit + 1)
+            else:
+                rows = rows.yield_per(chunk_size)
+            return (serialize_filter_result(record, email) for record, email in rows)
+
+        return paged_response(iter_db_results, db, limit, stream, headers={"X-Query-Plan": plan}, request=request)
+
+    def candidates():
+        # Walk the filesystem; size filters only need the disk, so apply them before hydration
+        for path, name, entry_is_folder, entry_path in walk_entries(
+            abs_parent, BASE_STORAGE_PATH,
+            include_folders=is_folder in (None, True),
+            include_files=is_folder in (None, False),
+            after=after
+        ):
+            size = None
+            if not entry_is_folder:
+                size = logical_size(entry_path)
                 if (min_size is not None and size < min_size) or (max_size is not None and size > max_size):
                     continue
-                    
-                rel_path = os.path.relpath(file_path, BASE_STORAGE_PATH)
-                path_with_slash = "/" + rel_path.replace("\\", "/")
-                
-                # Try to get file metadata from DB
-                db_record = db.query(FileModel).filter(FileModel.path == path_with_slash).first()
-                
-                # Apply database filters
-                if db_record:
-                    # Skip if owner filter doesn't match
-                    if owner_id is not None and db_record.owner_id != owner_id:
+            yield path, (name, entry_is_folder, size, entry_path)
+
+    def iter_results(session):
+        # DB metadata is resolved one chunk of paths at a time instead of per entry
+        for path_with_slash, (name, entry_is_folder, size, entry_path), db_record, owner_email in hydrate_in_chunks(session, candidates(), chunk_size, first_chunk_size):
+            # Apply database filters
+            if db_record:
+                # Skip if owner filter doesn't match
+                if owner_id is not None and db_record.owner_id != owner_id:
+                    continue
+
+                # Skip if date filters don't match
+                if created_after or created_before:
+                    # Convert created_at to naive UTC for comparison if it has timezone info
+                    record_time = db_record.created_at
+                    if record_time.tzinfo is not None:
+                        record_time = record_time.replace(tzinfo=None)
+                    if created_after and record_time < created_after:
                         continue
-                    
-                    # Skip if date filters don't match
-                    if created_after:
-                        # Convert created_at to UTC for comparison if it has timezone info
-                        record_time = db_record.created_at
-                        if record_time.tzinfo is not None:
-                            record_time = record_time.replace(tzinfo=None)
-                        if record_time < created_after:
+                    if created_before and record_time > created_before:
+                        continue
+
+                # All filters passed, create result with DB metadata
+                item_info = {
+                    "id": db_record.id,
+                    "name": name,
+                    "path": path_with_slash,
+                    "is_folder": entry_is_folder
+                }
+                if not entry_is_folder:
+                    item_info["size"] = size
+                item_info.update({
+                    "created_at": db_record.created_at,
+                    "modified_at": db_record.modified_at,
+                    "owner_id": db_record.owner_id,
+                    "owner": owner_email
+                })
+                yield item_info
+            # If no DB record, check if we can include based on filesystem dates
+            else:
+                # Only skip if we have owner filter (can't check without DB record)
+                if owner_id is not None:
+                    continue
+
+                # Check filesystem dates if date filters are applied
+                if created_after or created_before:
+                    try:
+                        entry_created = datetime.fromtimestamp(os.stat(entry_path).st_ctime)
+
+                        if created_after and entry_created < created_after:
                             continue
-                    
-                    if created_before:
-                        # Convert created_at to UTC for comparison if it has timezone info
-                        record_time = db_record.created_at
-                        if record_time.tzinfo is not None:
-                            record_time = record_time.replace(tzinfo=None)
-                        if record_time > created_before:
+                        if created_before and entry_created > created_before:
                             continue
-                    
-                    # All filters passed, create result with DB metadata
-                    file_info = {
-                        "id": db_record.id,
-                        "name": f,
-                        "path": path_with_slash,
-                        "is_folder": False,
-                        "size": size,
-                        "created_at": jsonable_encoder(db_record.created_at),
-                        "modified_at": jsonable_encoder(db_record.modified_at),
-                        "owner_id": db_record.owner_id,
-                        "owner": db.query(User).filter(User.id == db_record.owner_id).first().email
-                    }
-                    results.append(file_info)
-                # If no DB record, check if we can include based on filesystem dates
-                else:
-                    # Only skip if we have owner filter (can't check without DB record)
-                    if owner_id is not None:
+                    except (OSError, ValueError):
+                        # If we can't get filesystem dates, skip when date filters are active
                         continue
-                    
-                    # Check filesystem dates if date filters are applied
-                    if created_after or created_before:
-                        try:
-                            file_stat = os.stat(os.path.join(root, f))
-                            file_created = datetime.fromtimestamp(file_stat.st_ctime)
-                            
-                            if created_after and file_created < created_after:
-                                continue
-                            if created_before and file_created > created_before:
-                                continue
-                        except (OSError, ValueError):
-                            # If we can't get filesystem dates, skip when date filters are active
-                            continue
-                    
-                    # Include with basic filesystem info
-                    file_info = {
-                        "name": f,
-                        "path": path_with_slash,
-                        "is_folder": False,
-                        "size": size
-                    }
-                    results.append(file_info)
-                
-    print(f"Filter completed. Found {len(results)} results.")
-    return results
+
+                # Include with basic filesystem info
+                item_info = {
+                    "name": name,
+                    "path": path_with_slash,
+                    "is_folder": entry_is_folder
+                }
+                if not entry_is_folder:
+                    item_info["size"] = size
+                yield item_info
+
+    return paged_response(iter_results, db, limit, stream, headers={"X-Query-Plan": plan}, request=request)
 
 # ✅ MULTIPLE FILES UPLOAD
 @router.post("/upload")
-def upload_files(
-    parent_path: str = Form(...),
-    files: List[UploadFile] = File(...),
-    remark: Optional[str] = Form(None),
+async def upload_files(
+    request: Request,
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
-
+    """
+    Multipart form with parent_path, an optional remark and one or more files.
+    The body is parsed as it streams in: each file is written once, to a staging file that is
+    renamed into place, and its size and SHA-256 are computed while it is written.
+    """
+    from starlette.concurrency import run_in_threadpool
     from permission_utils import check_parent_permission
-    
-    # Permission check now includes team access
-    check_parent_permission(parent_path.strip("/"), db, user)
-    target_folder = os.path.abspath(os.path.join(BASE_STORAGE_PATH, parent_path.strip("/")))
+    from multipart_utils import receive_multipart
+    from upload_utils import register_files, upload_batch_details
+    from compression import stored_size
+
+    target = {}
+
+    def check_target(fields):
+        parent_path = fields.get("parent_path", [None])[0]
+        if parent_path is None:
+            raise HTTPException(status_code=422, detail="parent_path is required")
+
+        # Permission check now includes team access
+        check_parent_permission(parent_path.strip("/"), db, user)
+        target_folder = os.path.abspath(os.path.join(BASE_STORAGE_PATH, parent_path.strip("/")))
 
+        if not target_folder.startswith(BASE_STORAGE_PATH):
+            raise HTTPException(status_code=400, detail="Invalid upload path")
+
+        if not os.path.exists(target_folder):
+            raise HTTPException(status_code=404, detail="Target folder does not exist")
+        target.update(parent_path=parent_path, folder=target_folder)
+
+    # Reject before any file data is written when parent_path comes first (as the frontend sends it)
+    fields, staged_files = await receive_multipart(
+        request, on_first_file=lambda fields: check_target(fields) if "parent_path" in fields else None
+    )
+
+    def store_files():
+        # Compression, blob placement and the DB writes block: run in the threadpool, not on the event loop
+        try:
+            if not target:
+                check_target(fields)
+            files = [staged for staged in staged_files if staged.field == "files"]
+            if not files:
+                raise HTTPException(status_code=422, detail="files is required")
+            parent_path = target["parent_path"]
+            remark = fields.get("remark", [None])[0]
+
+            # Validate the whole batch before anything is moved into the tree
+            seen = set()
+            for staged in files:
+                if not staged.filename or "/" in staged.filename or "\\" in staged.filename:
+                    raise HTTPException(status_code=400, detail="Invalid file name")
+                if staged.filename in seen or os.path.exists(os.path.join(target["folder"], staged.filename)):
+                    raise HTTPException(status_code=400, detail=f"File '{staged.filename}' already exists")
+                seen.add(staged.filename)
+
+            # Move the staged files into place; on any failure the ones already moved are taken out again
+            installed = []
+            try:
+                for staged in files:
+                    file_location = os.path.join(target["folder"], staged.filename)
+                    staged.install(file_location)
+                    installed.append(file_location)
+
+                # Store metadata: one multi-row INSERT, committed together with the activity entry
+                now = datetime.utcnow()
+                ids = register_files(db, [
+                    {
+                        "name": staged.filename,
+                        "path": os.path.join("/", parent_path.strip("/"), staged.filename).replace("\\", "/"),
+                        "is_folder": False,
+                        "size": staged.size,
+                        "stored_size": stored_size(os.path.join(target["folder"], staged.filename)),
+                        "content_hash": staged.sha256,
+                        "owner_id": user.id,
+                        "created_at": now,
+                        "modified_at": now
+                    }
+                    for staged in files
+                ])
+                if len(files) == 1:
+                    target_path, details = os.path.join("/", parent_path.strip("/"), files[0].filename).replace("\\", "/"), remark
+                else:
+                    target_path, details = "/" + parent_path.strip("/"), upload_batch_details(remark, files)
+                log_activity(db, user.id, action="Upload File", target_path=target_path, details=details)
+            except BaseException:
+                db.rollback()
+                for file_location in installed:
+                    try:
+                        os.remove(file_location)
+                    except OSError:
+                        pass
+                from blob_store import release_blobs
+                release_blobs(db, [staged.sha256 for staged in files])
+                raise
+
+            uploaded_file_data = [
+                {"name": staged.filename, "size": staged.size, "id": file_id, "sha256": staged.sha256}
+                for staged, file_id in zip(files, ids)
+            ]
+        finally:
+            for staged in staged_files:
+                staged.discard()
+        return ids, uploaded_file_data
+
+    ids, uploaded_file_data = await run_in_threadpool(store_files)
+
+    from listing_cache import listing_cache
+    listing_cache.invalidate(target["parent_path"])
+
+    # Text extraction for content search runs on the worker pool, not in this request
+    from content_index import schedule_extraction
+    schedule_extraction(ids)
+    return {"message": "Files uploaded successfully", "files": uploaded_file_data}
+
+
+# ✅ RESUMABLE CHUNKED UPLOAD
+# POST /uploads opens a session, PUT /uploads/{id}?offset=N appends the raw request body,
+# GET /uploads/{id} reports the offset to resume from and POST /uploads/{id}/complete
+# verifies the checksum and moves the file into place.
+from schemas import UploadSessionCreate, UploadSessionComplete
+from models import UploadSession
+
+
+def _upload_target(parent_path: str, filename: str):
+    """(target folder, final file path) for an upload, validated like upload_files."""
+    if not filename or filename in (".", "..") or "/" in filename or "\\" in filename:
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    target_folder = os.path.abspath(os.path.join(BASE_STORAGE_PATH, parent_path.strip("/")))
     if not target_folder.startswith(BASE_STORAGE_PATH):
         raise HTTPException(status_code=400, detail="Invalid upload path")
-
-    if not os.path.exists(target_folder):
+    if not os.path.isdir(target_folder):
         raise HTTPException(status_code=404, detail="Target folder does not exist")
+    file_location = os.path.join(target_folder, filename)
+    if os.path.exists(file_location):
+        raise HTTPException(status_code=400, detail=f"File '{filename}' already exists")
+    return target_folder, file_location
+
+
+def _get_upload_session(upload_id: str, db: Session, user) -> UploadSession:
+    session = db.get(UploadSession, upload_id)
+    if not session or session.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+def _upload_status(session: UploadSession, offset: int):
+    return {
+        "upload_id": session.id,
+        "parent_path": session.parent_path,
+        "filename": session.filename,
+        "size": session.total_size,
+        "offset": offset,
+        "complete": offset == session.total_size
+    }
+
+
+@router.post("/uploads")
+def create_upload_session(
+    data: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    from permission_utils import check_parent_permission
+    from upload_utils import new_upload_id, create_staging_file, purge_expired_sessions, UPLOAD_CHUNK_SIZE
 
-    uploaded_file_data = []
+    check_parent_permission(data.parent_path.strip("/"), db, user)
+    _upload_target(data.parent_path, data.filename)
+    if data.size < 0:
+        raise HTTPException(status_code=400, detail="Invalid file size")
 
-    for uploaded_file in files:
-        file_location = os.path.join(target_folder, uploaded_file.filename)
+    purge_expired_sessions(db)
 
-        if os.path.exists(file_location):
-            raise HTTPException(status_code=400, detail=f"File '{uploaded_file.filename}' already exists")
+    session = UploadSession(
+        id=new_upload_id(),
+        user_id=user.id,
+        parent_path="/" + data.parent_path.strip("/"),
+        filename=data.filename,
+        total_size=data.size,
+        sha256=data.sha256.lower() if data.sha256 else None,
+        remark=data.remark,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    create_staging_file(session.id)
+    db.add(session)
+    db.commit()
+    return {**_upload_status(session, 0), "chunk_size": UPLOAD_CHUNK_SIZE}
+
+
+@router.get("/uploads/{upload_id}")
+def get_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    from upload_utils import received_bytes
+    session = _get_upload_session(upload_id, db, user)
+    return _upload_status(session, received_bytes(session.id))
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    from upload_utils import write_chunk
+    session = _get_upload_session(upload_id, db, user)
+    new_offset = await write_chunk(session, offset, request.stream())
+    session.updated_at = datetime.utcnow()
+    db.commit()
+    return _upload_status(session, new_offset)
+
+
+@router.post("/uploads/{upload_id}/complete")
+def complete_upload_session(
+    upload_id: str,
+    data: Optional[UploadSessionComplete] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    from permission_utils import check_parent_permission
+    from upload_utils import received_bytes, staging_file, file_sha256, install_file, discard_session
+    from blob_store import DEDUP_ENABLED
+    from compression import stored_size
 
-        # Save file to disk
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(uploaded_file.file, buffer)
+    session = _get_upload_session(upload_id, db, user)
+    offset = received_bytes(session.id)
+    if offset != session.total_size:
+        raise HTTPException(status_code=409, detail=f"Upload incomplete: {offset} of {session.total_size} bytes received")
 
-        # Store metadata
+    # Same checks upload_files applies, re-done now in case access or the tree changed meanwhile
+    check_parent_permission(session.parent_path.strip("/"), db, user)
+    _, file_location = _upload_target(session.parent_path, session.filename)
+
+    expected = (data.sha256 if data and data.sha256 else session.sha256 or "").lower()
+    actual = None
+    if expected or DEDUP_ENABLED:
+        actual = file_sha256(staging_file(session.id))
+        if expected and actual != expected:
+            discard_session(db, session)
+            raise HTTPException(status_code=422, detail="Checksum mismatch, upload discarded")
+
+    install_file(staging_file(session.id), file_location, actual)
+
+    from tree_utils import drop_stale_rows
+    file_db_path = os.path.join("/", session.parent_path.strip("/"), session.filename).replace("\\", "/")
+    try:
+        drop_stale_rows(db, [file_db_path])
         file_record = FileModel(
-            name=uploaded_file.filename,
-            path=os.path.join("/", parent_path.strip("/"), uploaded_file.filename).replace("\\", "/"),
+            name=session.filename,
+            path=file_db_path,
             is_folder=False,
-            size=os.path.getsize(file_location),
+            size=session.total_size,
+            stored_size=stored_size(file_location),
+            content_hash=actual,
             owner_id=user.id,
             created_at=datetime.utcnow(),
             modified_at=datetime.utcnow()
         )
         db.add(file_record)
+        db.delete(session)
+        from folder_stats import record_changes, file_change
+        record_changes(db, [file_change(file_record.path, file_record.size, file_record.stored_size)])
         db.commit()
-        db.refresh(file_record)
-
-        uploaded_file_data.append({
-            "name": uploaded_file.filename,
-            "size": file_record.size,
-            "id": file_record.id,
-        })
-    log_activity(db, user.id, action="Upload File", target_path=file_record.path, details=remark)
-    return {"message": "Files uploaded successfully", "files": uploaded_file_data}
+    except BaseException:
+        # The installed file would otherwise be left without a row; the session is kept
+        db.rollback()
+        try:
+            os.remove(file_location)
+        except OSError:
+            pass
+        if actual:
+            from blob_store import release_blobs
+            release_blobs(db, [actual])
+        raise
+    db.refresh(file_record)
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(file_record.path)
+    log_activity(db, user.id, action="Upload File", target_path=file_record.path, details=session.remark)
+
+    from content_index import schedule_extraction
+    schedule_extraction([file_record.id])
+    return {
+        "message": "File uploaded successfully",
+        "file": {"name": file_record.name, "size": file_record.size, "id": file_record.id}
+    }
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    from upload_utils import discard_session
+    discard_session(db, _get_upload_session(upload_id, db, user))
+    return {"message": "Upload aborted"}
 
 
 # ✅ DOWNLOAD FILE
 @router.get("/download")
 def download_file(
+    request: Request,
     path: str = Query(...),
     user=Depends(get_current_user),
     db: Session = Depends(get_db) 
@@ -371,8 +549,141 @@ def download_file(
 
     if os.path.isdir(full_path):
         raise HTTPException(status_code=400, detail="Path is a folder, not a file")
-    log_activity(db, user.id, action="Download File", target_path=path)
-    return FileResponse(full_path, filename=os.path.basename(full_path))
+
+    # Checked before any response is built, so offloaded downloads are covered as well
+    from permission_utils import check_parent_permission
+    check_parent_permission(os.path.dirname(decoded_path), db, user)
+
+    from download_utils import ranged_file_response, offload_response
+
+    # Log each download once: skip cache revalidations and the follow-up segments of a ranged download
+    range_header = request.headers.get("range", "").replace(" ", "")
+    response = offload_response(full_path, BASE_STORAGE_PATH, os.path.basename(full_path))
+    if response is not None:
+        # The proxy answers ranges and revalidations itself, so only the request tells them apart
+        revalidation = "if-none-match" in request.headers or "if-modified-since" in request.headers
+        first_download = not revalidation and (not range_header or range_header.startswith("bytes=0-"))
+    else:
+        response = ranged_file_response(request, full_path, os.path.basename(full_path))
+        first_download = response.status_code == 200 or (response.status_code == 206 and range_header.startswith("bytes=0-"))
+
+    if first_download:
+        log_activity(db, user.id, action="Download File", target_path=path)
+    return response
+
+
+# ✅ THUMBNAILS AND PREVIEWS
+@router.get("/preview")
+def get_preview(
+    path: str = Query(...),
+    size: str = Query("thumb", pattern="^(thumb|preview)$", description="thumb (256px) or preview (1024px)"),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    JPEG thumbnail (first page for PDFs) of a PDF or image.
+    Rendering happens in the background: until the preview is ready the response is
+    202 with a Retry-After header, after that the cached image is returned.
+    """
+    from permission_utils import check_parent_permission
+    from preview_cache import preview_cache, is_previewable
+    from fastapi.responses import JSONResponse
+
+    decoded_path = urllib.parse.unquote(path).strip("/")
+    full_path = os.path.abspath(os.path.join(BASE_STORAGE_PATH, decoded_path))
+
+    if not full_path.startswith(BASE_STORAGE_PATH):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    if not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    check_parent_permission(os.path.dirname(decoded_path), db, user)
+    if not is_previewable(full_path):
+        raise HTTPException(status_code=415, detail="No preview available for this file type")
+
+    state, cached_path = preview_cache.get(full_path, size)
+    if state == "pending":
+        return JSONResponse(status_code=202, content={"status": "generating"}, headers={"Retry-After": "1"})
+    if state == "failed":
+        raise HTTPException(status_code=422, detail="Preview could not be generated")
+    # The cache key changes whenever the file does, so the browser may keep the image
+    return FileResponse(cached_path, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+
+# ✅ DOWNLOAD FOLDERS / SELECTIONS AS ZIP
+from schemas import ZipDownloadRequest
+
+@router.post("/download-zip")
+def download_zip(
+    data: ZipDownloadRequest,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream a ZIP of a folder or any selection of files and folders, built on the fly.
+    Every entry is subject to the same check_parent_permission rules as a single download.
+    """
+    from permission_utils import check_parent_permission
+    from zip_utils import iter_zip_entries, stream_zip, unique_archive_names
+    from fastapi.responses import StreamingResponse
+    from database import SessionLocal
+
+    if not data.paths:
+        raise HTTPException(status_code=400, detail="No paths selected")
+
+    selections = []
+    for path, arc_name in zip(data.paths, unique_archive_names(data.paths)):
+        decoded_path = urllib.parse.unquote(path).strip("/")
+        full_path = os.path.abspath(os.path.join(BASE_STORAGE_PATH, decoded_path))
+        if not full_path.startswith(BASE_STORAGE_PATH) or full_path == BASE_STORAGE_PATH:
+            raise HTTPException(status_code=400, detail=f"Invalid path: {path}")
+        if not os.path.exists(full_path):
+            raise HTTPException(status_code=404, detail=f"Not found: {path}")
+        check_parent_permission(os.path.dirname(decoded_path), db, user)
+        if os.path.isdir(full_path):
+            # The folder is the parent of everything directly inside it
+            check_parent_permission(decoded_path, db, user)
+        selections.append((arc_name, full_path))
+
+    log_activity(
+        db, user.id, action="Download Zip",
+        target_path="/" + data.paths[0].strip("/") if len(data.paths) == 1 else os.path.dirname("/" + data.paths[0].strip("/")),
+        details=f"{len(data.paths)} item(s): " + ", ".join(data.paths)
+    )
+
+    user_id = user.id
+
+    def body():
+        # Folder contents are checked while the walk runs, so use a session that outlives the request's
+        session = SessionLocal()
+        session_user = session.get(User, user_id)
+        allowed = {}
+
+        def is_allowed(abs_dir):
+            # Files in abs_dir need permission on abs_dir itself, as their parent folder
+            if abs_dir not in allowed:
+                try:
+                    check_parent_permission(os.path.relpath(abs_dir, BASE_STORAGE_PATH).replace("\\", "/"), session, session_user)
+                    allowed[abs_dir] = True
+                except HTTPException:
+                    allowed[abs_dir] = False
+            return allowed[abs_dir]
+
+        try:
+            yield from stream_zip(
+                iter_zip_entries(selections, is_allowed),
+                on_skip=lambda arcname, e: print(f"ZIP download skipped {arcname}: {e}")
+            )
+        finally:
+            session.close()
+
+    filename = data.filename or (selections[0][0] + ".zip" if len(selections) == 1 else "download.zip")
+    if not filename.lower().endswith(".zip"):
+        filename += ".zip"
+    return StreamingResponse(
+        body(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(filename)}"}
+    )
 
 # ✅ DELETE FILE
 @router.delete("/delete")
@@ -407,8 +718,16 @@ def delete_file(
         raise HTTPException(status_code=500, detail="Error deleting file from server")
 
     # Delete metadata
+    from folder_stats import record_changes, file_change
     db.delete(file_record)
+    record_changes(db, [file_change(file_record.path, file_record.size, file_record.stored_size, -1)])
     db.commit()
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(file_record.path)
+
+    # Drop the shared blob if this was its last reference
+    from blob_store import release_blobs
+    release_blobs(db, [file_record.content_hash])
     log_activity(db, user.id, action="Delete File", target_path=file_record.path)
     return {"message": "File deleted successfully"}
 
@@ -456,14 +775,24 @@ def rename_file(
 
     # ✅ Rename file on disk
     os.rename(old_path, new_path)
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(data.path)
 
     # ✅ Update DB record
     db_file = db.query(FileModel).filter(FileModel.path == data.path).first()
     if db_file:
-        db_file.name = data.new_name
-        db_file.path = os.path.join(os.path.dirname(data.path), data.new_name).replace("\\", "/")
-        db_file.modified_at = datetime.utcnow()
-        db.commit()
+        from tree_utils import drop_stale_rows
+        try:
+            new_db_path = os.path.join(os.path.dirname(data.path), data.new_name).replace("\\", "/")
+            drop_stale_rows(db, [new_db_path])
+            db_file.name = data.new_name
+            db_file.path = new_db_path
+            db_file.modified_at = datetime.utcnow()
+            db.commit()
+        except Exception:
+            db.rollback()
+            os.rename(new_path, old_path)
+            raise
     log_activity(db, user.id, action="Rename File", target_path=db_file.path)
     return {
         "message": "File renamed successfully",
@@ -508,17 +837,150 @@ def move_file(
 
     #  Move file on disk
     os.rename(src_path, dest_path)
+    from listing_cache import listing_cache
+    listing_cache.invalidate(src_parent, dest_parent)
 
     #  Update database path
     db_file = db.query(FileModel).filter(FileModel.path == data.source_path).first()
     if db_file:
-        db_file.path = os.path.join(data.destination_path, os.path.basename(src_path)).replace("\\", "/")
-        db_file.modified_at = datetime.utcnow()
-        db.commit()
+        from tree_utils import parent_id_for, drop_stale_rows
+        from folder_stats import record_changes, file_change
+        old_db_path = db_file.path
+        new_db_path = os.path.join(data.destination_path, os.path.basename(src_path)).replace("\\", "/")
+        try:
+            drop_stale_rows(db, [new_db_path])
+            db_file.path = new_db_path
+            db_file.parent_id = parent_id_for(db, db_file.path)
+            db_file.modified_at = datetime.utcnow()
+            record_changes(db, [
+                file_change(old_db_path, db_file.size, db_file.stored_size, -1),
+                file_change(db_file.path, db_file.size, db_file.stored_size)
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            os.rename(dest_path, src_path)
+            raise
     log_activity(db, user.id, action="Moved File", target_path=db_file.path)
     return {"message": "File moved successfully", "new_path": db_file.path}
 
 
+# BATCH MOVE / RENAME / DELETE
+from schemas import BatchFileRequest
+
+@router.post("/batch")
+def batch_file_operations(
+    data: BatchFileRequest,
+    run_async: bool = Query(False, alias="async", description="Run as a background job and return its id right away"),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """
+    Apply many move, rename and delete operations at once, e.g.
+    {"operations": [{"op": "move", "path": "/a/x.pdf", "destination_path": "/b"},
+                    {"op": "rename", "path": "/a/y.pdf", "new_name": "z.pdf"},
+                    {"op": "delete", "path": "/a/old.txt"}]}
+    Same permission rules as the single-file endpoints; every operation gets its own result.
+    With async=true every operation is checked first and the request is rejected if one fails.
+    """
+    if run_async:
+        from batch_utils import validate_batch
+        from jobs import job_engine, accepted
+        validate_batch(db, user, data.operations)
+        return accepted(job_engine.submit(
+            db, user, "file_batch", None,
+            lambda job_db, job_user: batch_file_operations(data, run_async=False, db=job_db, user=job_user)
+        ))
+
+    from batch_utils import run_batch
+    from listing_cache import listing_cache
+    results = run_batch(db, user, data.operations)
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    listing_cache.invalidate_parents(*[
+        path for result in results if result["status"] == "ok" for path in (result["path"], result["new_path"]) if path
+    ])
+    return {
+        "message": f"{succeeded} of {len(results)} operations succeeded",
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+
+# SERVER-SIDE COPY
+from schemas import CopyRequest
+
+@router.post("/copy")
+def copy_file_on_server(
+    data: CopyRequest,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """
+    Copy a file into a folder without sending it through the client.
+    The copy belongs to the user making it.
+    """
+    from permission_utils import check_parent_permission
+    from copy_utils import copy_file, copy_name
+    from upload_utils import register_files
+    from compression import logical_size, stored_size
+
+    source = data.source_path.strip("/")
+    src_path = os.path.abspath(os.path.join(BASE_STORAGE_PATH, source))
+    dest_folder = os.path.abspath(os.path.join(BASE_STORAGE_PATH, data.destination_path.strip("/")))
+    if not src_path.startswith(BASE_STORAGE_PATH) or not dest_folder.startswith(BASE_STORAGE_PATH):
+        raise HTTPException(status_code=400, detail="Invalid path")
+
+    # Reading the source needs the same access as downloading it, writing the copy the same as uploading
+    check_parent_permission(os.path.dirname(source), db, user)
+    check_parent_permission(data.destination_path.strip("/"), db, user)
+
+    if not os.path.isfile(src_path):
+        raise HTTPException(status_code=404, detail="Source file not found")
+    if not os.path.isdir(dest_folder):
+        raise HTTPException(status_code=404, detail="Destination folder not found")
+
+    if data.new_name:
+        name = data.new_name.strip()
+        if not name or "/" in name or "\\" in name or name in (".", ".."):
+            raise HTTPException(status_code=400, detail="Invalid file name")
+        if os.path.splitext(name)[1].lower() != os.path.splitext(src_path)[1].lower():
+            raise HTTPException(status_code=400, detail="Changing file extension is not allowed")
+    else:
+        name = copy_name(dest_folder, os.path.basename(src_path))
+    dest_path = os.path.join(dest_folder, name)
+
+    source_record = db.query(FileModel).filter(FileModel.path == f"/{source}").first()
+    content_hash = source_record.content_hash if source_record else None
+    try:
+        copy_file(src_path, dest_path, content_hash)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail="A file with the same name already exists at destination")
+    except OSError as e:
+        print(f"Copy of {src_path} failed: {e}")
+        raise HTTPException(status_code=500, detail="Error copying file")
+
+    new_db_path = f"/{data.destination_path.strip('/')}/{name}".replace("//", "/")
+    now = datetime.utcnow()
+    try:
+        ids = register_files(db, [{
+            "name": name, "path": new_db_path, "is_folder": False,
+            "size": logical_size(dest_path), "stored_size": stored_size(dest_path), "content_hash": content_hash, "owner_id": user.id, "created_at": now, "modified_at": now
+        }])
+        log_activity(db, user.id, action="Copy File", target_path=new_db_path, details=f"Copied from /{source}")
+    except Exception as e:
+        db.rollback()
+        os.remove(dest_path)
+        raise HTTPException(status_code=500, detail=f"Failed to save copy to database: {str(e)}")
+
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(new_db_path)
+
+    from content_index import schedule_extraction
+    schedule_extraction(ids)
+    return {"message": "File copied successfully", "new_path": new_db_path}
+
+
 #CODE FOR SEARCHING FILES ON BASIS OF ACCESS [ADMIN/USER]
 from sqlalchemy import or_
 @router.get("/search")
@@ -566,8 +1028,9 @@ def get_metadata(
     if not os.path.exists(abs_path):
         raise HTTPException(status_code=404, detail="Item not found")
 
-    # Fetch DB metadata
-    record = db.query(FileModel).filter(FileModel.path == f"/{decoded_path}").first()
+    # Fetch DB metadata and owner email in one query
+    from metadata_utils import fetch_metadata
+    record, owner_email = fetch_metadata(db, [f"/{decoded_path}"]).get(f"/{decoded_path}", (None, None))
 
     if not record:
         raise HTTPException(status_code=404, detail="Metadata not found")
@@ -591,9 +1054,40 @@ def get_metadata(
         "size": record.size,
         "created_at": jsonable_encoder(record.created_at),
         "modified_at": jsonable_encoder(record.modified_at),
-        "owner": db.query(User).filter(User.id == record.owner_id).first().email
+        "owner": owner_email
     }
 
+#FULL-TEXT SEARCH INSIDE DOCUMENTS (PDF, DOCX, TEXT)
+@router.get("/content-search")
+def content_search(
+    query: str = Query(..., min_length=1, description="Words or phrases; supports \"quoted phrases\", OR and -exclusions"),
+    parent_path: str = Query("/", description="Path to folder to search in"),
+    limit: int = Query(50, ge=1, le=200),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    from permission_utils import check_parent_permission
+    from content_index import search_content
+
+    # Permission check now includes team access
+    check_parent_permission(parent_path.strip("/"), db, user)
+
+    return [
+        {
+            "id": record.id,
+            "name": record.name,
+            "path": record.path,
+            "size": record.size,
+            "created_at": jsonable_encoder(record.created_at),
+            "modified_at": jsonable_encoder(record.modified_at),
+            "owner_id": record.owner_id,
+            "owner": owner_email,
+            "rank": round(rank, 4),
+            "snippet": snippet
+        }
+        for record, owner_email, rank, snippet in search_content(db, query, parent_path, limit)
+    ]
+
 #FILTTER/SEARCH BY OWNER, DATE:
 @router.get("/filter")
 def filter_files(
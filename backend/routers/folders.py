@@ -1,15 +1,15 @@
 # backend/routers/folders.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request
 from sqlalchemy.orm import Session
-from schemas import FolderCreate
+from schemas import FolderCreate, FolderListItem
 from dependencies import get_current_user
 from database import get_db
 import os
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 import shutil
 from utils import log_activity
-from models import File, User, ActivityLog, Team, UserTeamAccess
+from models import File, User, ActivityLog
 from typing import Dict, List, Optional, Any
 
 router = APIRouter()
@@ -46,7 +46,9 @@ def create_folder(data: FolderCreate, db: Session = Depends(get_db), user=Depend
     #  Create folder
     os.makedirs(full_path)
 
-    #  Save to DB
+    #  Save to DB, replacing a row left behind if the folder was deleted outside the API
+    from tree_utils import drop_stale_rows
+    drop_stale_rows(db, [f"/{parent_path}/{folder_name}".replace("//", "/")])
     new_folder = File(
         name=folder_name,
         path=f"/{parent_path}/{folder_name}".replace("//", "/"),
@@ -57,7 +59,13 @@ def create_folder(data: FolderCreate, db: Session = Depends(get_db), user=Depend
         modified_at=datetime.utcnow()
     )
     db.add(new_folder)
+    db.flush()
+    from folder_stats import init_folders, record_changes
+    init_folders(db, [new_folder.id])
+    record_changes(db, [(new_folder.path, 0, 0, 0, 1)])
     db.commit()
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(new_folder.path)
     
     # Log folder creation activity
     folder_path = f"/{parent_path}/{folder_name}".replace("//", "/")
@@ -66,77 +74,62 @@ def create_folder(data: FolderCreate, db: Session = Depends(get_db), user=Depend
     return {"message": "Folder created successfully", "path": folder_path}
 BASE_STORAGE_PATH = BASE_DIR  # Reuse fixed BASE_DIR
 
-@router.get("/list")
+@router.get("/list", response_model=List[FolderListItem])
 def list_folder_contents(
+    request: Request,
     parent_path: str = Query("/", description="Path to folder"),
+    name: Optional[str] = Query(None, description="Only entries whose name contains this (case-insensitive)"),
+    sort: str = Query("name", description="name, size, modified or created; folders always come first"),
+    order: str = Query("asc", description="asc or desc"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Return at most this many entries"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Team access is now handled by the folder permissions system
+    from listing_utils import (
+        LISTING_SORTS, scan_folder, filter_items, sort_items, enrich_items, apply_team_access,
+        format_item, encode_listing_cursor, decode_listing_cursor, after_cursor
+    )
+    from listing_cache import listing_cache
+    from search_utils import to_db_path
+    from response_utils import json_response
+
+    if sort not in LISTING_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(LISTING_SORTS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    descending = order == "desc"
+    after = decode_listing_cursor(cursor, sort, descending) if cursor else None
     
     abs_path = os.path.abspath(os.path.join(BASE_STORAGE_PATH, parent_path.strip("/")))
 
     if not abs_path.startswith(BASE_STORAGE_PATH):
         raise HTTPException(status_code=400, detail="Invalid path access")
 
-    if not os.path.exists(abs_path):
+    if not os.path.isdir(abs_path):
         raise HTTPException(status_code=404, detail="Folder not found")
 
-    items = []
+    # Scanned and enriched once per version of the directory (see listing_cache.py)
+    folder_path = to_db_path(parent_path)
+    mtime_ns = os.stat(abs_path).st_mtime_ns
+    items = listing_cache.get(folder_path, mtime_ns)
+    if items is None:
+        items = scan_folder(abs_path, folder_path)
+        enrich_items(db, folder_path, items)
+        listing_cache.put(folder_path, mtime_ns, items)
 
-    for entry in os.scandir(abs_path):
-        item_path = os.path.join(parent_path, entry.name).replace("\\", "/")
-        # Normalize path for consistent DB lookup
-        normalized_path = "/" + item_path.strip("/")
-        
-        # Get basic file info from disk
-        basic_info = {
-            "name": entry.name,
-            "path": item_path,
-            "is_folder": entry.is_dir(),
-            "size": entry.stat().st_size if entry.is_file() else 0,
-            "created_at": datetime.fromtimestamp(entry.stat().st_ctime, tz=timezone.utc).isoformat(),
-            "modified_at": datetime.fromtimestamp(entry.stat().st_mtime, tz=timezone.utc).isoformat(),
-            "is_team_folder": False,
-            "team_id": None,
-            "user_has_access": True  # Default to true, will be updated for team folders
-        }
-        
-        # Check if this is a team folder (first-level folder under root)
-        if entry.is_dir() and parent_path.strip('/') == '':
-            # This is a first-level folder, check if it's a team folder
-            db_record = db.query(File).filter(File.path == normalized_path).first()
-            if db_record:
-                team = db.query(Team).filter(Team.folder_id == db_record.id).first()
-                if team:
-                    basic_info["is_team_folder"] = True
-                    basic_info["team_id"] = team.id
-                    
-                    # Check if current user has access to this team folder
-                    if user.role.name != "admin":
-                        has_access = db.query(UserTeamAccess).filter(
-                            UserTeamAccess.user_id == user.id,
-                            UserTeamAccess.team_id == team.id
-                        ).first()
-                        basic_info["user_has_access"] = has_access is not None
-        
-        # Try to enrich with DB metadata
-        db_record = db.query(File).filter(File.path == normalized_path).first()
-        if db_record:
-            # Add owner information if available
-            owner = db.query(User).filter(User.id == db_record.owner_id).first()
-            if owner:
-                basic_info["owner_id"] = db_record.owner_id
-                basic_info["owner"] = owner.email
-            
-            # Use DB timestamps if available
-            if db_record.created_at:
-                basic_info["created_at"] = db_record.created_at.isoformat() 
-            if db_record.modified_at:
-                basic_info["modified_at"] = db_record.modified_at.isoformat()
-        
-        items.append(basic_info)
-    return items
+    items = sort_items(filter_items(items, name), sort, descending)
+    if after is not None:
+        items = after_cursor(items, after, sort, descending)
+
+    headers = {}
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        headers["X-Next-Cursor"] = encode_listing_cursor(items[-1], sort, descending)
+    items = [format_item(item) for item in items]
+    apply_team_access(db, user, items)
+    return json_response(request, items, headers=headers)
 
 
 
@@ -169,8 +162,6 @@ def rename_folder(
     if os.path.exists(new_path):
         raise HTTPException(status_code=400, detail="Folder with new name already exists")
 
-    os.rename(old_path, new_path)
-
     # Update DB record
     old_db_path = data.old_path
     if not old_db_path.startswith('/'):
@@ -185,38 +176,40 @@ def rename_folder(
     new_db_path = f"/{parent_folder_path}/{new_folder_name}".replace("//", "/")
     
     print(f"Renaming folder from {old_db_path} to {new_db_path}")
-    
-    # Get all affected items (folder itself and all its contents)
-    affected_items = db.query(File).filter(
-        (File.path == old_db_path) | 
-        (File.path.startswith(old_db_path + "/"))
-    ).all()
-    
-    print(f"Found {len(affected_items)} items to update:")
-    for item in affected_items:
-        old_path = item.path
-        if item.path == old_db_path:
-            # This is the folder being renamed
-            item.name = new_folder_name
-            item.path = new_db_path
-            item.modified_at = datetime.utcnow()
-        else:
-            # This is a child item - update its path
-            relative_path = item.path[len(old_db_path):]
-            item.path = new_db_path + relative_path
-            item.modified_at = datetime.utcnow()
-        print(f"  - {item.id}: {old_path} -> {item.path}")
-    
-    db.commit()
+
+    os.rename(old_path, new_path)
+
+    # The folder and all its contents in one UPDATE
+    from tree_utils import rewrite_subtree
+    try:
+        updated = rewrite_subtree(db, old_db_path, new_db_path, new_name=new_folder_name)
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.rename(new_path, old_path)
+        raise
+    print(f"Updated {updated} items")
+    from listing_cache import listing_cache
+    listing_cache.invalidate_tree(old_db_path)
     log_activity(db, user.id, action="Renamed Folder", target_path=new_db_path)
     return {"message": "Folder renamed successfully"}
 
 
+def _delete_folder_job(db: Session, user, path: str, force: bool):
+    """Answer an async=true delete whose checks passed: the delete (checks re-run) goes to a job."""
+    from jobs import job_engine, accepted
+    return accepted(job_engine.submit(
+        db, user, "delete_folder", path,
+        lambda job_db, job_user: delete_folder(path, force, run_async=False, user=job_user, db=job_db)
+    ))
+
+
 #FOLDER DELETION:
 @router.delete("/delete")
 def delete_folder(
     path: str = Body(..., embed=True, description="Path to the folder to delete"),
     force: bool = Body(False, embed=True, description="Set to true if user confirms deletion of non-empty folder"),
+    run_async: bool = Query(False, alias="async", description="Run as a background job and return its id right away"),
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -245,19 +238,23 @@ def delete_folder(
     if not os.path.exists(abs_path) or not os.path.isdir(abs_path):
         # If folder is missing on disk but exists in DB, we can clean up DB entries
         folder_in_db = db.query(File).filter(File.path == folder_db_path, File.is_folder == True).first()
+        if folder_in_db and run_async:
+            return _delete_folder_job(db, user, path, force)
         if folder_in_db:
             # Delete DB entries since filesystem entries are already gone
-            items_to_delete = db.query(File).filter(
-                (File.path == folder_db_path) | 
-                (File.path.startswith(folder_db_path + "/"))
-            ).all()
-            
-            print(f"Folder missing on disk but found in DB. Cleaning up {len(items_to_delete)} database entries.")
-            for item in items_to_delete:
-                print(f"  - Deleting DB entry: {item.id}: {item.path} ({item.name})")
-                db.delete(item)
-            
+            from search_utils import scope_to_subtree
+            from folder_stats import folder_totals, folder_change, record_changes
+            record_changes(db, [folder_change(folder_db_path, folder_totals(db, folder_in_db.id, folder_db_path), -1)])
+            subtree = scope_to_subtree(db.query(File), folder_db_path)
+            digests = [digest for (digest,) in subtree.with_entities(File.content_hash).filter(File.content_hash != None)]
+            removed = subtree.delete(synchronize_session=False)
+            db.delete(folder_in_db)
             db.commit()
+            from listing_cache import listing_cache
+            listing_cache.invalidate_tree(folder_db_path)
+            print(f"Folder missing on disk but found in DB. Removed {removed + 1} database entries.")
+            from blob_store import release_blobs
+            release_blobs(db, digests)
             log_activity(db, user.id, action="Database Cleanup", target_path=folder_db_path)
             return {"message": "Folder entries removed from database"}
         else:
@@ -270,38 +267,73 @@ def delete_folder(
             "can_proceed": True
         }
 
-    #  Delete from filesystem
-    try:
-        shutil.rmtree(abs_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting folder: {str(e)}")
+    if run_async:
+        return _delete_folder_job(db, user, path, force)
+
+    # One rename plus one statement for the rows; the data is removed later by the trash purger
+    from trash import move_to_trash
+    entry = move_to_trash(db, user, folder_db_path, abs_path)
+    from listing_cache import listing_cache
+    listing_cache.invalidate_tree(folder_db_path)
+    print(f"Moved folder {folder_db_path} to trash {entry.id} ({entry.item_count} items)")
+
+    log_activity(db, user.id, action="Delete Folder", target_path=path, details=f"Moved to trash {entry.id}")
+    return {"message": "Folder moved to trash", "trash_id": entry.id}
+
+
+# ✅ TRASH
+@router.get("/trash")
+def list_trash(user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Trashed folders the user deleted (every entry for admins), newest first."""
+    from models import TrashEntry
+    from trash import purge_after
+
+    query = db.query(TrashEntry, User.email).outerjoin(User, User.id == TrashEntry.deleted_by)
+    if user.role.name != "admin":
+        query = query.filter(TrashEntry.deleted_by == user.id)
+    return [
+        {
+            "id": entry.id,
+            "name": os.path.basename(entry.original_path),
+            "original_path": entry.original_path,
+            "deleted_at": entry.deleted_at,
+            "deleted_by": deleted_by,
+            "item_count": entry.item_count,
+            "total_size": entry.total_size,
+            "purge_after": purge_after(entry),
+            "purging": bool(entry.purge_requested or entry.purge_started_at)
+        }
+        for entry, deleted_by in query.order_by(TrashEntry.deleted_at.desc())
+    ]
 
-    # Normalize and prepare folder path for DB queries
-    folder_db_path = path
-    if not folder_db_path.startswith('/'):
-        folder_db_path = f"/{folder_db_path}"
-    
-    # Make sure no double slashes remain
-    while "//" in folder_db_path:
-        folder_db_path = folder_db_path.replace("//", "/")
-        
-    print(f"Deleting folder: {folder_db_path} (Original path: {path})")
-    
-    # Delete both the folder and all its contents from DB
-    items_to_delete = db.query(File).filter(
-        (File.path == folder_db_path) | 
-        (File.path.startswith(folder_db_path + "/"))
-    ).all()
-    
-    # Log what we're deleting
-    print(f"Found {len(items_to_delete)} items to delete:")
-    for item in items_to_delete:
-        print(f"  - {item.id}: {item.path} ({item.name})")
-        db.delete(item)
-    
-    db.commit()
-    log_activity(db, user.id, action="Delete Folder", target_path=path)
-    return {"message": "Folder deleted successfully"}
+
+@router.post("/trash/{trash_id}/restore")
+def restore_folder(trash_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Move a trashed folder back to where it was deleted from."""
+    from permission_utils import check_parent_permission
+    from trash import get_entry, restore
+    from content_index import schedule_extraction
+
+    entry = get_entry(db, user, trash_id)
+    original_path = entry.original_path
+    check_parent_permission(os.path.dirname(original_path.strip("/")), db, user)
+
+    file_ids = restore(db, user, trash_id)
+    from listing_cache import listing_cache
+    listing_cache.invalidate_tree(original_path)
+    # Extracted text was dropped with the rows
+    schedule_extraction(file_ids)
+    log_activity(db, user.id, action="Restore Folder", target_path=original_path)
+    return {"message": "Folder restored", "path": original_path}
+
+
+@router.delete("/trash/{trash_id}")
+def purge_trash_entry(trash_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete a trashed folder for good; the purger removes it in the background."""
+    from trash import request_purge
+
+    request_purge(db, user, trash_id)
+    return {"message": "Folder scheduled for permanent deletion"}
 
 
 
@@ -312,6 +344,7 @@ from models import File as FileModel  # ensure already imported
 @router.put("/move")
 def move_folder(
     data: MoveFolderRequest,
+    run_async: bool = Query(False, alias="async", description="Run as a background job and return its id right away"),
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
@@ -327,7 +360,7 @@ def move_folder(
     # Permission checks
     check_parent_permission(src_parent, db, user)
     check_parent_permission(dest_parent, db, user)
-    require_owner_or_admin(data.source_path, db, user)
+    folder = require_owner_or_admin(data.source_path, db, user)
     
     #  Validations
     if not src.startswith(BASE_STORAGE_PATH) or not dest_dir.startswith(BASE_STORAGE_PATH):
@@ -339,8 +372,13 @@ def move_folder(
     if os.path.exists(new_folder_path):
         raise HTTPException(status_code=409, detail="Destination folder already exists")
 
-    #  Move on disk
-    os.rename(src, new_folder_path)
+    if run_async:
+        # Checks passed; the job runs them again when it starts and then moves the folder
+        from jobs import job_engine, accepted
+        return accepted(job_engine.submit(
+            db, user, "move_folder", data.source_path,
+            lambda job_db, job_user: move_folder(data, run_async=False, db=job_db, user=job_user)
+        ))
 
     #  Update DB paths recursively
     source_db_path = data.source_path
@@ -365,59 +403,222 @@ def move_folder(
     
     print(f"Moving folder from {source_db_path} to {new_folder_db_path}")
     
-    # Update all affected items
-    affected = db.query(FileModel).filter(
-        (FileModel.path == source_db_path) | 
-        (FileModel.path.startswith(source_db_path + "/"))
-    ).all()
-    
-    print(f"Found {len(affected)} items to update:")
-    for item in affected:
-        old_path = item.path
-        if item.path == source_db_path:
-            # This is the main folder
-            item.path = new_folder_db_path
-        else:
-            # This is a child item
-            relative_suffix = item.path[len(source_db_path):]
-            item.path = (new_folder_db_path + relative_suffix).replace("\\", "/")
-        item.modified_at = datetime.utcnow()
-        print(f"  - {item.id}: {old_path} -> {item.path}")
+    #  Move on disk
+    os.rename(src, new_folder_path)
 
-    db.commit()
+    # The folder and all its contents in one UPDATE
+    from tree_utils import rewrite_subtree
+    from folder_stats import folder_totals, folder_change, record_changes
+    try:
+        totals = folder_totals(db, folder.id, source_db_path)
+        updated = rewrite_subtree(db, source_db_path, new_folder_db_path)
+        # The whole subtree leaves the old ancestors' rollups and joins the new ones'
+        record_changes(db, [folder_change(source_db_path, totals, -1), folder_change(new_folder_db_path, totals)])
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.rename(new_folder_path, src)
+        raise
+    print(f"Updated {updated} items")
+    from listing_cache import listing_cache
+    listing_cache.invalidate_tree(source_db_path)
+    listing_cache.invalidate_parents(new_folder_db_path)
     log_activity(db, user.id, action="Folder Moved", target_path=new_folder_db_path)
     return {"message": "Folder moved successfully", "new_path": os.path.join(data.destination_path, os.path.basename(src))}
 
+# SERVER-SIDE FOLDER COPY
+from schemas import CopyRequest
+
+@router.post("/copy")
+def copy_folder(
+    data: CopyRequest,
+    run_async: bool = Query(False, alias="async", description="Run as a background job and return its id right away"),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """
+    Copy a folder tree into another folder on the server. Files are copied in parallel and all rows
+    of the new subtree are inserted with one statement. Subfolders the user can't access are left out.
+    """
+    from permission_utils import check_parent_permission, BatchPermissionChecker
+    from copy_utils import copy_tree, copy_name
+    from upload_utils import register_files
+    from jobs import progress, check_cancelled
+
+    source = data.source_path.strip("/")
+    src = os.path.abspath(os.path.join(BASE_DIR, source))
+    dest_dir = os.path.abspath(os.path.join(BASE_DIR, data.destination_path.strip("/")))
+    if not src.startswith(BASE_DIR) or src == BASE_DIR or not dest_dir.startswith(BASE_DIR):
+        raise HTTPException(status_code=400, detail="Invalid path")
+
+    check_parent_permission(os.path.dirname(source), db, user)
+    check_parent_permission(source, db, user)
+    check_parent_permission(data.destination_path.strip("/"), db, user)
+
+    if not os.path.isdir(src):
+        raise HTTPException(status_code=404, detail="Source folder not found")
+    if not os.path.isdir(dest_dir):
+        raise HTTPException(status_code=404, detail="Destination folder not found")
+    if dest_dir == src or dest_dir.startswith(src + os.sep):
+        raise HTTPException(status_code=400, detail="Cannot copy a folder into itself")
+
+    if data.new_name:
+        folder_name = data.new_name.strip()
+        if not folder_name or "/" in folder_name or "\\" in folder_name or folder_name in (".", ".."):
+            raise HTTPException(status_code=400, detail="Invalid folder name")
+        if os.path.exists(os.path.join(dest_dir, folder_name)):
+            raise HTTPException(status_code=409, detail="Destination folder already exists")
+    else:
+        folder_name = copy_name(dest_dir, os.path.basename(src))
+    new_folder = os.path.join(dest_dir, folder_name)
+
+    if run_async:
+        # Checks passed; the job runs them again when it starts and then copies the tree
+        from jobs import job_engine, accepted
+        return accepted(job_engine.submit(
+            db, user, "copy_folder", data.source_path,
+            lambda job_db, job_user: copy_folder(data, run_async=False, db=job_db, user=job_user)
+        ))
+
+    # Every row below the source in one query: content hashes for blob links, folders for permissions
+    source_db_path = f"/{source}"
+    rows = db.query(FileModel.path, FileModel.is_folder, FileModel.content_hash).filter(
+        FileModel.path.startswith(source_db_path + "/")
+    ).all()
+    digests = {path[len(source_db_path) + 1:]: content_hash for path, _, content_hash in rows if content_hash}
+    checker = BatchPermissionChecker(db, user, [path for path, is_folder, _ in rows if is_folder])
+
+    def is_allowed(rel_dir):
+        try:
+            checker.check_parent_permission(f"{source}/{rel_dir}")
+            return True
+        except HTTPException:
+            return False
+
+    def copied(done, total):
+        # Run as a job: report progress, and stop (the partial copy is removed) when cancelled
+        progress(done, total)
+        check_cancelled()
+
+    try:
+        entries = copy_tree(src, new_folder, digests, is_allowed, on_copied=copied)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail="Destination folder already exists")
+    except OSError as e:
+        print(f"Copy of {src} failed: {e}")
+        raise HTTPException(status_code=500, detail="Error copying folder")
+
+    new_folder_db_path = f"/{data.destination_path.strip('/')}/{folder_name}".replace("//", "/")
+    now = datetime.utcnow()
+    new_rows = []
+    for rel_path, is_folder, size, stored in entries:
+        path = f"{new_folder_db_path}/{rel_path}" if rel_path else new_folder_db_path
+        new_rows.append({
+            "name": os.path.basename(path), "path": path, "is_folder": is_folder, "size": size, "stored_size": stored,
+            "content_hash": None if is_folder else digests.get(rel_path),
+            "owner_id": user.id, "created_at": now, "modified_at": now
+        })
+    try:
+        new_ids = register_files(db, new_rows)
+        log_activity(
+            db, user.id, action="Copy Folder", target_path=new_folder_db_path,
+            details=f"Copied from {source_db_path} ({sum(1 for entry in entries if not entry[1])} files)"
+        )
+    except Exception as e:
+        db.rollback()
+        shutil.rmtree(new_folder, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Failed to save copy to database: {str(e)}")
+
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(new_folder_db_path)
+
+    from content_index import schedule_extraction
+    schedule_extraction([file_id for file_id, row in zip(new_ids, new_rows) if not row["is_folder"]])
+    return {"message": "Folder copied successfully", "new_path": new_folder_db_path, "items": len(new_rows)}
+
 # Upload a folder via multiple files with relative paths (best practice)
-from fastapi import UploadFile, File as FastAPIFile, Form
-from typing import List
+from fastapi import Request
 
 @router.post("/upload-folder-structure")
 async def upload_folder_structure(
-    parent_path: str = Form(..., description="Path to parent folder where to upload"),
-    files: List[UploadFile] = FastAPIFile(..., description="Files in the folder, with relative paths"),
-    relpaths: List[str] = Form(..., description="Relative paths for each file, matching order of files list"),
+    request: Request,
+    run_async: bool = Query(False, alias="async", description="Move the files into place and register them as a background job"),
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
+    """
+    Multipart form with parent_path, the files of the folder and one relpaths value per file
+    (relative path, matching the order of the files).
+    Files are streamed to staging files while the body arrives and renamed into place afterwards,
+    so they are never held in memory and each byte is written to disk once.
+    """
+    from starlette.concurrency import run_in_threadpool
     from permission_utils import check_parent_permission
-    import os
-    
-    # Authorization: user must have permission to upload in parent_path (includes team access)
-    check_parent_permission(parent_path, db, user)
+    from multipart_utils import receive_multipart
+
+    checked = []
 
-    # Save each file to the correct location and collect all folders
+    def check_parent(fields):
+        # Authorization: user must have permission to upload in parent_path (includes team access)
+        if "parent_path" not in fields:
+            raise HTTPException(status_code=422, detail="parent_path is required")
+        check_parent_permission(fields["parent_path"][0], db, user)
+        checked.append(True)
+
+    # Checked before any file data is written when parent_path comes first (as the frontend sends it)
+    fields, staged_files = await receive_multipart(
+        request, on_first_file=lambda fields: check_parent(fields) if "parent_path" in fields else None
+    )
+    handed_off = False
+    try:
+        if not checked:
+            await run_in_threadpool(check_parent, fields)
+        parent_path = fields["parent_path"][0]
+        files = [staged for staged in staged_files if staged.field == "files"]
+        relpaths = fields.get("relpaths", [])
+        if not files or not relpaths:
+            raise HTTPException(status_code=422, detail="files and relpaths are required")
+
+        if run_async:
+            # The body is already staged; moving it into place and registering it runs as a job
+            from jobs import job_engine, accepted
+            job = await run_in_threadpool(
+                job_engine.submit, db, user, "upload_folder", parent_path,
+                lambda job_db, job_user: _install_folder_structure(job_db, job_user, parent_path, files, relpaths),
+                cleanup=lambda: [staged.discard() for staged in staged_files]
+            )
+            handed_off = True
+            return accepted(job)
+        # Compresses, installs and registers the files: blocking, so not on the event loop
+        return await run_in_threadpool(_install_folder_structure, db, user, parent_path, files, relpaths)
+    finally:
+        # Anything not moved into the tree (extra parts, or everything after an error)
+        if not handed_off:
+            for staged in staged_files:
+                staged.discard()
+
+
+def _install_folder_structure(db: Session, user, parent_path: str, files: List, relpaths: List[str]):
+    """Move the staged files of a folder upload into place and register them and their folders."""
+    from compression import stored_size
+    from jobs import progress, cancel_requested
+
+    # Move each staged file to the correct location and collect all folders
     created_folders = set()
     created_files = []
-    for upload_file, relpath in zip(files, relpaths):
+    for done, (upload_file, relpath) in enumerate(zip(files, relpaths)):
+        progress(done, min(len(files), len(relpaths)))
+        if cancel_requested():
+            # Run as a job and cancelled: the files moved so far are still registered
+            break
         # Sanitize the relative path to prevent traversal attacks
         safe_relpath = relpath.strip().replace("..", "").replace("\\", "/").lstrip("/")
         dest_path = os.path.abspath(os.path.join(BASE_DIR, parent_path.strip("/"), safe_relpath))
-        
+
         # Security check
         if not dest_path.startswith(BASE_DIR):
             raise HTTPException(status_code=400, detail=f"Invalid file path: {relpath}")
-            
+
         dest_dir = os.path.dirname(dest_path)
         # Track all folders in the path
         rel_folder_parts = safe_relpath.split("/")[:-1]
@@ -432,22 +633,18 @@ async def upload_folder_structure(
             while "//" in folder_path:
                 folder_path = folder_path.replace("//", "/")
             created_folders.add(folder_path)
-            
+
         # Create directory if it doesn't exist
         if not os.path.exists(dest_dir):
             try:
                 os.makedirs(dest_dir)
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Failed to create directory {dest_dir}: {str(e)}")
-            
-        # Write file to disk with proper error handling
+
+        # The file was already written while the body streamed in; renaming it into place copies nothing
         try:
-            with open(dest_path, "wb") as f:
-                # Read in chunks to avoid memory issues with large files
-                content = await upload_file.read()
-                f.write(content)
-            # Get file size after successful write
-            file_size = os.path.getsize(dest_path)
+            upload_file.install(dest_path, overwrite=True)
+            file_size = upload_file.size
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to write file {safe_relpath}: {str(e)}")
         # Prepare file record for DB - ensure consistent path format
@@ -460,68 +657,93 @@ async def upload_folder_structure(
         file_db_path = file_db_path.replace("\\", "/")
         while "//" in file_db_path:
             file_db_path = file_db_path.replace("//", "/")
-            
-        created_files.append((os.path.basename(dest_path), file_db_path, file_size))
+
+        created_files.append((os.path.basename(dest_path), file_db_path, file_size, stored_size(dest_path), upload_file.sha256))
+    progress(len(created_files))
+
+    from metadata_utils import fetch_metadata
+    from upload_utils import register_files
+    from folder_stats import record_changes, file_change
+
+    # Ensure consistent path format
+    def normalize(path):
+        while "//" in path:
+            path = path.replace("//", "/")
+        return path
+
+    folder_paths = sorted({normalize(p) for p in created_folders}, key=lambda x: x.count("/"))
+    # A relpath sent twice keeps its last file, the same one left on disk
+    file_entries = {
+        normalize(path): (name, size, stored, content_hash) for name, path, size, stored, content_hash in created_files
+    }
+
+    # Existing records for every folder and file of the upload, in one query
+    existing = fetch_metadata(db, folder_paths + list(file_entries))
+    now = datetime.utcnow()
+    new_rows = []
 
     # Add folders to DB (if not already present)
-    for folder_path in sorted(created_folders, key=lambda x: x.count("/")):
-        # Ensure consistent path format
-        normalized_folder_path = folder_path
-        while "//" in normalized_folder_path:
-            normalized_folder_path = normalized_folder_path.replace("//", "/")
-            
-        existing_folder = db.query(File).filter(File.path == normalized_folder_path, File.is_folder == True).first()
-        if not existing_folder:
+    for folder_path in folder_paths:
+        existing_folder = existing.get(folder_path, (None, None))[0]
+        if existing_folder is None or not existing_folder.is_folder:
             # Calculate folder name properly - avoid empty names
-            folder_name = os.path.basename(normalized_folder_path.rstrip("/"))
+            folder_name = os.path.basename(folder_path.rstrip("/"))
             if not folder_name:
                 # Handle root or edge cases - extract from the full path
-                path_parts = normalized_folder_path.strip("/").split("/")
+                path_parts = folder_path.strip("/").split("/")
                 folder_name = path_parts[-1] if path_parts and path_parts[-1] else "root"
-            
-            db.add(File(
-                name=folder_name,
-                path=normalized_folder_path,
-                is_folder=True,
-                size=0,
-                owner_id=user.id,
-                created_at=datetime.utcnow(),
-                modified_at=datetime.utcnow()
-            ))
+
+            new_rows.append({
+                "name": folder_name, "path": folder_path, "is_folder": True, "size": 0,
+                "owner_id": user.id, "created_at": now, "modified_at": now
+            })
         else:
             # Update the modified_at timestamp for existing folders
-            existing_folder.modified_at = datetime.utcnow()
-            
+            existing_folder.modified_at = now
+
     # Add files to DB
-    for name, path, size in created_files:
-        # Ensure consistent path format
-        normalized_path = path
-        while "//" in normalized_path:
-            normalized_path = normalized_path.replace("//", "/")
-            
-        existing_file = db.query(File).filter(File.path == normalized_path, File.is_folder == False).first()
-        if not existing_file:
-            db.add(File(
-                name=name,
-                path=normalized_path,
-                is_folder=False,
-                size=size,
-                owner_id=user.id,
-                created_at=datetime.utcnow(),
-                modified_at=datetime.utcnow()
-            ))
+    replaced_hashes = []
+    updated_file_ids = []
+    resized = []
+    for path, (name, size, stored, content_hash) in file_entries.items():
+        existing_file = existing.get(path, (None, None))[0]
+        if existing_file is None or existing_file.is_folder:
+            new_rows.append({
+                "name": name, "path": path, "is_folder": False, "size": size, "stored_size": stored, "content_hash": content_hash,
+                "owner_id": user.id, "created_at": now, "modified_at": now
+            })
         else:
             # Update existing file
+            replaced_hashes.append(existing_file.content_hash)
+            resized += [file_change(path, size, stored), file_change(path, existing_file.size, existing_file.stored_size, -1)]
             existing_file.size = size
-            existing_file.modified_at = datetime.utcnow()
-    
+            existing_file.stored_size = stored
+            existing_file.content_hash = content_hash
+            existing_file.modified_at = now
+            updated_file_ids.append(existing_file.id)
+
     try:
-        db.commit()
+        # New rows go in with one multi-row INSERT; everything commits together with the activity entry
+        new_ids = register_files(db, new_rows)
+        record_changes(db, resized)
         from utils import log_activity
         log_activity(db, user.id, action="Upload Folder Structure", target_path=parent_path)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save folder structure to database: {str(e)}")
+
+    from listing_cache import listing_cache
+    listing_cache.invalidate_tree(parent_path)
+
+    # Overwritten files may have been the last reference to their blob
+    from blob_store import release_blobs
+    release_blobs(db, replaced_hashes)
+
+    # Text extraction for content search runs on the worker pool, not in this request
+    from content_index import schedule_extraction
+    schedule_extraction(
+        [file_id for file_id, row in zip(new_ids, new_rows) if not row["is_folder"]] + updated_file_ids
+    )
         
     return {"message": "Folder structure uploaded successfully", "created_folders": list(created_folders), "created_files": len(created_files)}
 
@@ -535,54 +757,44 @@ def get_folder_statistics(
     """
     Get folder statistics for dashboard display.
     Returns folder name, owner, number of subfolders, and number of files.
-    Statistics are gathered from disk rather than just the database.
+    Statistics come from the folder_stats rollups (see folder_stats.py), one row per top-level folder.
     """
-    # Use the base storage directory as the root path
-    abs_root_path = BASE_DIR
-    
+    from models import FolderStats
+    from folder_stats import folder_totals
+
+    rows = db.query(File, User.email, FolderStats).outerjoin(
+        User, User.id == File.owner_id
+    ).outerjoin(
+        FolderStats, FolderStats.folder_id == File.id
+    ).filter(
+        File.depth == 1,
+        File.is_folder == True
+    ).all()
+
     # Prepare result container
     results = []
-    
-    # Start with immediate subfolders of the root path
-    for entry in os.scandir(abs_root_path):
-        if not entry.is_dir():
-            continue
-        
+    for folder, owner_email, stats in rows:
+        if stats is not None:
+            totals = [stats.total_size, stats.stored_size, stats.file_count, stats.subfolder_count]
+        else:
+            # Not rolled up yet (database from before folder_stats, first verifier pass still running)
+            totals = folder_totals(db, folder.id, folder.path)
+            db.commit()
+
         folder_stats = {
-            "folder_name": entry.name,
-            "path": "/" + os.path.relpath(entry.path, BASE_DIR).replace("\\", "/"),
-            "subfolder_count": 0,
-            "file_count": 0,
-            "total_size": 0,
-            "owner": None,
-            "owner_id": None
+            "folder_name": folder.name,
+            "path": folder.path,
+            "subfolder_count": totals[3],
+            "file_count": totals[2],
+            "total_size": totals[0],
+            "stored_size": totals[1],
+            "owner": owner_email,
+            "owner_id": folder.owner_id
         }
-        
-        # Get owner info from database
-        folder_db_path = folder_stats["path"]
-        db_record = db.query(File).filter(File.path == folder_db_path, File.is_folder == True).first()
-        if db_record:
-            folder_stats["owner_id"] = db_record.owner_id
-            owner = db.query(User).filter(User.id == db_record.owner_id).first()
-            if owner:
-                folder_stats["owner"] = owner.email
-        
-        # Walk the folder to count files and subfolders
-        for root, dirs, files in os.walk(entry.path):
-            folder_stats["subfolder_count"] += len(dirs)
-            folder_stats["file_count"] += len(files)
-            
-            # Calculate total size of files
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    folder_stats["total_size"] += os.path.getsize(file_path)
-                except (FileNotFoundError, PermissionError):
-                    # Skip files that can't be accessed
-                    pass
-        
+
         # Format total size for human readability
         folder_stats["size_formatted"] = format_file_size(folder_stats["total_size"])
+        folder_stats["stored_size_formatted"] = format_file_size(folder_stats["stored_size"])
         
         results.append(folder_stats)
     
@@ -0,0 +1,53 @@
+# backend/routers/jobs.py
+# State, progress stream and cancellation of background jobs (see jobs.py)
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from database import get_db
+from dependencies import get_current_user
+from models import Job
+
+router = APIRouter()
+
+
+@router.get("")
+def list_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The user's most recent jobs, newest first."""
+    from jobs import job_status
+    jobs = db.query(Job).filter(Job.user_id == user.id).order_by(Job.created_at.desc()).limit(limit)
+    return [job_status(job) for job in jobs]
+
+
+@router.get("/{job_id}")
+def get_job_status(job_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """State, progress counters and, once finished, the result or error of a job."""
+    from jobs import get_job, job_status
+    return job_status(get_job(db, user, job_id))
+
+
+@router.get("/{job_id}/events")
+def stream_job_events(job_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Server-sent events: "progress" with the job status whenever it changes, then "done" once
+    the job finished, after which the stream ends.
+    """
+    from jobs import get_job, stream_events
+    get_job(db, user, job_id)
+    return StreamingResponse(
+        stream_events(job_id),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Cancel a queued job, or ask a running one to stop at its next safe point."""
+    from jobs import cancel, job_status
+    return job_status(cancel(db, user, job_id))
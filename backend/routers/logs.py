@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, and_, func, String
 from database import get_db
 from dependencies import require_admin
 from models import ActivityLog, User
-from fastapi.encoders import jsonable_encoder
-from typing import Optional
+from typing import List, Optional
+from schemas import ActivityLogEntry
+from response_utils import json_response
 from datetime import datetime
 import os
 
@@ -22,7 +23,7 @@ def check_file_status(target_path: str, action: str):
     # Define file/folder related actions
     file_folder_actions = [
         "Upload File", "Download File", "Delete File", "Rename File", "Moved File",
-        "Create Folder", "Renamed Folder", "Delete Folder", "Folder Moved", 
+        "Create Folder", "Renamed Folder", "Delete Folder", "Restore Folder", "Folder Moved", 
         "Upload Folder Structure", "Checked File Metadata"
     ]
     
@@ -52,30 +53,32 @@ def check_file_status(target_path: str, action: str):
     except Exception as e:
         return "Error", None
 
-@router.get("/logs/", tags=["Logs"])
-def get_activity_logs(admin=Depends(require_admin), db: Session = Depends(get_db)):
-    logs = db.query(ActivityLog).order_by(ActivityLog.timestamp.desc()).all()
+@router.get("/logs/", tags=["Logs"], response_model=List[ActivityLogEntry])
+def get_activity_logs(request: Request, admin=Depends(require_admin), db: Session = Depends(get_db)):
+    # User emails come from the same query instead of one lookup per log entry
+    logs = db.query(ActivityLog, User.email).outerjoin(
+        User, ActivityLog.user_id == User.id
+    ).order_by(ActivityLog.timestamp.desc()).all()
     result = []
-    for log in logs:
-        user = db.query(User).filter(User.id == log.user_id).first()
-        
+    for log, user_email in logs:
         # Check file/folder status on disk
         status, current_location = check_file_status(log.target_path, log.action)
         
         result.append({
             "id": log.id,
-            "timestamp": jsonable_encoder(log.timestamp),
+            "timestamp": log.timestamp,
             "user_id": log.user_id,
-            "user_email": user.email if user else None,
+            "user_email": user_email,
             "action": log.action,
             "details": log.details,
             "status": status,
             "current_location": current_location,
         })
-    return result
+    return json_response(request, result)
 
-@router.get("/logs/search", tags=["Logs"])
+@router.get("/logs/search", tags=["Logs"], response_model=List[ActivityLogEntry])
 def search_activity_logs(
+    request: Request,
     query: str = Query(..., description="Search term for logs"),
     admin=Depends(require_admin), 
     db: Session = Depends(get_db)
@@ -93,7 +96,7 @@ def search_activity_logs(
     # Define file/folder CRUD operations to filter results
     file_folder_actions = [
         "Upload File", "Download File", "Delete File", "Rename File", "Moved File",
-        "Create Folder", "Renamed Folder", "Delete Folder", "Folder Moved", 
+        "Create Folder", "Renamed Folder", "Delete Folder", "Restore Folder", "Folder Moved", 
         "Upload Folder Structure", "Checked File Metadata"
     ]
     
@@ -148,7 +151,7 @@ def search_activity_logs(
         
         results.append({
             "id": log.id,
-            "timestamp": jsonable_encoder(log.timestamp),
+            "timestamp": log.timestamp,
             "user_id": log.user_id,
             "user_email": user.email if user else None,
             "action": log.action,
@@ -158,4 +161,4 @@ def search_activity_logs(
         })
     
     print(f"Found {len(results)} results")  # Debug log
-    return results 
\ No newline at end of file
+    return json_response(request, results) 
\ No newline at end of file
@@ -9,7 +9,8 @@ import os
 import platform
 import datetime
 import time
-from models import User
+from sqlalchemy import func
+from models import User, File
 
 router = APIRouter()
 
@@ -77,6 +78,14 @@ def get_system_health(current_user: User = Depends(require_admin), db: Session =
         
         # Count total users
         user_count = db.query(User).count()
+
+        # Stored files as uploaded vs on disk (compressed files take less)
+        logical_bytes, physical_bytes = db.query(
+            func.coalesce(func.sum(File.size), 0),
+            func.coalesce(func.sum(func.coalesce(File.stored_size, File.size)), 0)
+        ).filter(File.is_folder == False).one()
+        files_logical_gb = round(logical_bytes / (1024 ** 3), 2)
+        files_physical_gb = round(physical_bytes / (1024 ** 3), 2)
         
         return {
             "server": {
@@ -87,7 +96,13 @@ def get_system_health(current_user: User = Depends(require_admin), db: Session =
             "resources": {
                 "cpu_usage": f"{cpu_percent}%",
                 "memory_usage": f"{memory_used_gb} GB / {memory_total_gb} GB ({memory_percent}%)",
-                "storage_usage": f"{storage_used_gb} GB / {storage_total_gb} GB ({storage_percent}%)"
+                "storage_usage": f"{storage_used_gb} GB / {storage_total_gb} GB ({storage_percent}%)",
+                "file_data": f"{files_logical_gb} GB logical / {files_physical_gb} GB on disk"
+            },
+            "files": {
+                "logical_bytes": logical_bytes,
+                "physical_bytes": physical_bytes,
+                "compression_saved_bytes": logical_bytes - physical_bytes
             },
             "status": {
                 "system_load": {
@@ -107,3 +122,59 @@ def get_system_health(current_user: User = Depends(require_admin), db: Session =
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving system health: {str(e)}")
+
+
+@router.get("/reconciler")
+def get_reconciler_status(current_user: User = Depends(require_admin)):
+    """
+    Progress, lag and orphan report of the background filesystem/DB reconciler (admin only)
+    """
+    from reconciler import reconciler
+    return reconciler.status()
+
+
+@router.get("/dedup")
+def get_dedup_report(current_user: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """
+    Space saved by the content-addressable blob store: logical vs physical bytes (admin only)
+    """
+    from blob_store import dedup_report
+    return dedup_report(db)
+
+
+@router.post("/dedup/backfill")
+def start_dedup_backfill(current_user: User = Depends(require_admin)):
+    """
+    Hash files stored before dedup existed and link duplicates to shared blobs, in the background (admin only)
+    """
+    import threading
+    from blob_store import backfill
+    threading.Thread(target=backfill, name="dedup-backfill", daemon=True).start()
+    return {"message": "Dedup backfill started"}
+
+
+@router.post("/dedup/gc")
+def collect_blob_garbage(current_user: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """
+    Remove blobs that no file references any more (admin only)
+    """
+    from blob_store import collect_garbage
+    return {"removed_blobs": collect_garbage(db)}
+
+
+@router.get("/previews")
+def get_preview_cache_stats(current_user: User = Depends(require_admin)):
+    """
+    Size, budget and queue of the thumbnail/preview cache (admin only)
+    """
+    from preview_cache import preview_cache
+    return preview_cache.stats()
+
+
+@router.get("/listing-cache")
+def get_listing_cache_stats(current_user: User = Depends(require_admin)):
+    """
+    Hits, misses, size and budget of this worker's folder listing cache (admin only)
+    """
+    from listing_cache import listing_cache
+    return listing_cache.stats()
@@ -1,6 +1,6 @@
 # backend/routers/teams.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List
 from pydantic import BaseModel
@@ -62,16 +62,25 @@ def create_team(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create team folder: {str(e)}")
     
-    # Create folder entry in database
-    folder_entry = FileModel(
-        name=team_data.name,
-        path=f"/{team_data.name}",
-        is_folder=True,
-        size=0,
-        owner_id=current_user.id
-    )
-    db.add(folder_entry)
-    db.flush()  # Get the ID
+    # Create folder entry in database, or reuse the one of a folder that already existed
+    folder_entry = db.query(FileModel).filter(FileModel.path == f"/{team_data.name}").first()
+    if folder_entry is not None and db.query(Team).filter(Team.folder_id == folder_entry.id).first():
+        raise HTTPException(status_code=409, detail="Folder already belongs to another team")
+    if folder_entry is None or not folder_entry.is_folder:
+        # A file row there is stale: the path is a folder on disk now
+        from tree_utils import drop_stale_rows
+        drop_stale_rows(db, [f"/{team_data.name}"])
+        folder_entry = FileModel(
+            name=team_data.name,
+            path=f"/{team_data.name}",
+            is_folder=True,
+            size=0,
+            owner_id=current_user.id
+        )
+        db.add(folder_entry)
+        db.flush()  # Get the ID
+    from folder_stats import init_folders
+    init_folders(db, [folder_entry.id])
     
     # Create team entry
     team = Team(
@@ -80,6 +89,9 @@ def create_team(
     )
     db.add(team)
     db.commit()
+    # The root listing shows team folders; the folder may have existed before (unchanged mtime)
+    from listing_cache import listing_cache
+    listing_cache.invalidate_parents(folder_entry.path)
     
     # Log activity
     log_activity(
@@ -240,15 +252,22 @@ def remove_user_from_team(
 @router.delete("/{team_id}")
 def delete_team(
     team_id: int,
+    run_async: bool = Query(False, alias="async", description="Run as a background job and return its id right away"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
     """Delete a team and its folder"""
-    
     # Check if team exists
     team = db.query(Team).filter(Team.id == team_id).first()
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
+
+    if run_async:
+        from jobs import job_engine, accepted
+        return accepted(job_engine.submit(
+            db, current_user, "delete_team", f"/{team.name}",
+            lambda job_db, job_user: delete_team(team_id, run_async=False, db=job_db, current_user=job_user)
+        ))
     
     # Get team folder
     folder = db.query(FileModel).filter(FileModel.id == team.folder_id).first()
@@ -260,9 +279,11 @@ def delete_team(
         team_folder_path = os.path.join(storage_path, team_name)
         
         try:
-            import shutil
-            if os.path.exists(team_folder_path):
-                shutil.rmtree(team_folder_path)
+            if os.path.exists(team_folder_path) and not _remove_tree(team_folder_path):
+                # Run as a job and cancelled: the team stays, without what was removed so far
+                from listing_cache import listing_cache
+                listing_cache.invalidate_tree(f"/{team_name}")
+                return {"message": f"Deletion of team {team_name} cancelled"}
         except Exception as e:
             # Log but don't fail the deletion
             print(f"Warning: Failed to delete team folder: {str(e)}")
@@ -275,6 +296,8 @@ def delete_team(
         db.delete(folder)
     
     db.commit()
+    from listing_cache import listing_cache
+    listing_cache.invalidate_tree(f"/{team_name}")
     
     # Log activity
     log_activity(
@@ -288,6 +311,28 @@ def delete_team(
     return {"message": f"Team {team_name} deleted successfully"}
 
 
+def _remove_tree(root: str) -> bool:
+    """
+    shutil.rmtree that reports job progress (entries removed of total) and checks for cancellation
+    before each removal. Returns False when cancelled; what was removed until then stays removed.
+    """
+    from jobs import progress, cancel_requested
+    # Deepest first: every directory comes right after its contents
+    removals = []
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        # Symlinked directories are not walked into, so they are removed like files
+        links = [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]
+        removals += [(os.unlink, os.path.join(dirpath, name)) for name in filenames + links]
+        removals.append((os.rmdir, dirpath))
+    progress(0, len(removals))
+    for done, (remove, path) in enumerate(removals):
+        if cancel_requested():
+            return False
+        remove(path)
+        progress(done + 1, len(removals))
+    return True
+
+
 # Get teams for current user (for frontend access checks)
 @router.get("/for-user", response_model=List[TeamResponse])
 def get_user_teams(
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
 
 class UserCreate(BaseModel):
     email: str
@@ -46,4 +47,71 @@ class UserLogin(BaseModel):
 class UserEdit(BaseModel):
     email: str
     password: str
-    role: str
\ No newline at end of file
+    role: str
+
+#schemas for resumable chunked uploads
+class UploadSessionCreate(BaseModel):
+    parent_path: str
+    filename: str
+    size: int
+    sha256: Optional[str] = None   # hex SHA-256 of the whole file, checked at finalize
+    remark: Optional[str] = None
+
+class UploadSessionComplete(BaseModel):
+    sha256: Optional[str] = None
+
+#schema for streaming ZIP downloads
+class ZipDownloadRequest(BaseModel):
+    paths: List[str]                 # files and/or folders, e.g. ["/docs", "/hr/policy.pdf"]
+    filename: Optional[str] = None   # archive name, defaults to the folder name or "download.zip"
+
+#schemas for batch file operations
+class BatchFileOperation(BaseModel):
+    op: str                                  # "move", "delete" or "rename"
+    path: str                                # file the operation applies to, e.g. /docs/a.pdf
+    destination_path: Optional[str] = None   # move: target folder, e.g. /archive
+    new_name: Optional[str] = None           # rename: new file name, same extension
+
+class BatchFileRequest(BaseModel):
+    operations: List[BatchFileOperation]
+
+#schema for server-side copies of files and folders
+class CopyRequest(BaseModel):
+    source_path: str                 # file or folder to copy, e.g. /docs/report.pdf
+    destination_path: str            # folder to copy into, e.g. /archive
+    new_name: Optional[str] = None   # defaults to the source name, or "name (copy)" if that is taken
+
+#response schemas for the listing endpoints (documented here, serialized by response_utils)
+class FolderListItem(BaseModel):
+    name: str
+    path: str
+    is_folder: bool
+    size: int
+    created_at: str
+    modified_at: str
+    is_team_folder: bool
+    team_id: Optional[int] = None
+    user_has_access: bool
+    owner_id: Optional[int] = None
+    owner: Optional[str] = None
+
+class ActivityLogEntry(BaseModel):
+    id: int
+    timestamp: datetime
+    user_id: int
+    user_email: Optional[str] = None
+    action: str
+    details: Optional[str] = None
+    status: Optional[str] = None
+    current_location: Optional[str] = None
+
+class DiskEntryResult(BaseModel):
+    name: str
+    path: str
+    is_folder: bool
+    size: Optional[int] = None          # files only
+    id: Optional[int] = None            # absent for entries without a DB record
+    created_at: Optional[datetime] = None
+    modified_at: Optional[datetime] = None
+    owner_id: Optional[int] = None
+    owner: Optional[str] = None
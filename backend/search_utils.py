@@ -0,0 +1,300 @@
+# backend/search_utils.py
+# DB-BACKED SCOPED SEARCH HELPERS
+
+import os
+import base64
+import binascii
+from itertools import islice
+from datetime import datetime
+from typing import Callable, Iterator, Optional, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, Request
+from compression import logical_size
+from fastapi.responses import StreamingResponse
+from response_utils import dumps, json_response
+from database import SessionLocal
+from models import File as FileModel, User
+from metadata_utils import hydrate_in_chunks, HYDRATION_CHUNK_SIZE, HYDRATION_FIRST_CHUNK_SIZE
+
+
+def to_db_path(path: str) -> str:
+    """Normalize a client supplied path to the "/a/b" form stored in files.path."""
+    db_path = "/" + path.replace("\\", "/").strip("/")
+    while "//" in db_path:
+        db_path = db_path.replace("//", "/")
+    return db_path
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def scope_to_subtree(query, parent_path: str):
+    """
+    Restrict a FileModel query to everything below parent_path.
+    The parent folder itself is not included, same as walking it with os.walk.
+    """
+    db_parent = to_db_path(parent_path)
+    prefix = "/" if db_parent == "/" else db_parent + "/"
+    return query.filter(FileModel.path.like(escape_like(prefix) + "%", escape="\\"))
+
+
+def encode_cursor(path: str, is_folder: bool) -> str:
+    """Opaque pagination cursor pointing at the last item of a page."""
+    raw = ("d" if is_folder else "f") + path
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, bool]:
+    """Inverse of encode_cursor; returns (path, is_folder)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(raw) < 2 or raw[0] not in "df" or raw[1] != "/":
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return raw[1:], raw[0] == "d"
+
+
+def search_by_name(db: Session, query: str, parent_path: str, after_path: Optional[str] = None):
+    """
+    Case-insensitive substring search on files.name scoped to parent_path.
+    Served by the ix_files_name_trgm trigram index on PostgreSQL.
+    Returns (FileModel, owner_email) rows ordered by path, starting after after_path if given.
+    """
+    rows = db.query(FileModel, User.email).outerjoin(
+        User, User.id == FileModel.owner_id
+    ).filter(
+        FileModel.name.ilike(f"%{escape_like(query)}%", escape="\\")
+    )
+    if after_path is not None:
+        rows = rows.filter(FileModel.path > after_path)
+    return scope_to_subtree(rows, parent_path).order_by(FileModel.path)
+
+
+def serialize_search_result(record: FileModel, owner_email: str, size: int = None):
+    """Build a disk-search result dict from a DB record (same shape as the disk walk)."""
+    item = {
+        "name": record.name,
+        "path": record.path,
+        "is_folder": record.is_folder
+    }
+    if not record.is_folder:
+        item["size"] = record.size if size is None else size
+    item.update({
+        "id": record.id,
+        "created_at": record.created_at,
+        "modified_at": record.modified_at,
+        "owner_id": record.owner_id,
+        "owner": owner_email
+    })
+    return item
+
+
+def plan_filter(include_untracked: bool, owner_id: Optional[int]) -> str:
+    """
+    Choose how disk-filter answers a request.
+    "db": every predicate runs as SQL against the files table and the disk is not touched.
+    "disk": walk the tree and hydrate from the DB, needed to return entries without a DB record.
+    Untracked entries can never match an owner filter, so those requests always get the DB plan.
+    """
+    if include_untracked and owner_id is None:
+        return "disk"
+    return "db"
+
+
+def filter_records(
+    db: Session,
+    parent_path: str,
+    is_folder: Optional[bool] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    owner_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    after_path: Optional[str] = None
+):
+    """
+    disk-filter predicates as one SQL query scoped to parent_path.
+    Size limits only apply to files, folders are never excluded by them (same as the disk walk).
+    Returns (FileModel, owner_email) rows ordered by path, starting after after_path if given.
+    """
+    rows = db.query(FileModel, User.email).outerjoin(User, User.id == FileModel.owner_id)
+    if is_folder is not None:
+        rows = rows.filter(FileModel.is_folder == is_folder)
+    if min_size is not None:
+        rows = rows.filter(or_(FileModel.is_folder == True, FileModel.size >= min_size))
+    if max_size is not None:
+        rows = rows.filter(or_(FileModel.is_folder == True, FileModel.size <= max_size))
+    if owner_id is not None:
+        rows = rows.filter(FileModel.owner_id == owner_id)
+    if created_after:
+        rows = rows.filter(FileModel.created_at >= created_after)
+    if created_before:
+        rows = rows.filter(FileModel.created_at <= created_before)
+    if after_path is not None:
+        rows = rows.filter(FileModel.path > after_path)
+    return scope_to_subtree(rows, parent_path).order_by(FileModel.path)
+
+
+def serialize_filter_result(record: FileModel, owner_email: str):
+    """Build a disk-filter result dict from a DB record."""
+    item = {
+        "id": record.id,
+        "name": record.name,
+        "path": record.path,
+        "is_folder": record.is_folder
+    }
+    if not record.is_folder:
+        item["size"] = record.size
+    item.update({
+        "created_at": record.created_at,
+        "modified_at": record.modified_at,
+        "owner_id": record.owner_id,
+        "owner": owner_email
+    })
+    return item
+
+
+def walk_entries(
+    abs_parent: str,
+    base_path: str,
+    include_folders: bool = True,
+    include_files: bool = True,
+    after: Optional[Tuple[str, bool]] = None
+) -> Iterator[Tuple[str, str, bool, str]]:
+    """
+    Walk abs_parent and yield (path_with_slash, name, is_folder, abs_entry_path) for each entry.
+    Order is deterministic: like os.walk, each directory yields its folders then its files
+    (both sorted by name) before descending into the folders.
+    after=(path, is_folder) resumes right behind that entry, pruning subtrees that lie before it.
+    """
+    rel_parent = os.path.relpath(abs_parent, base_path).replace("\\", "/")
+    parts = () if rel_parent == "." else tuple(rel_parent.split("/"))
+    after_key = None
+    if after is not None:
+        after_parts = tuple(after[0].strip("/").split("/"))
+        after_key = (after_parts[:-1], 1 if not after[1] else 0, after_parts[-1])
+    yield from _walk_dir(abs_parent, parts, include_folders, include_files, after_key)
+
+
+def _walk_dir(abs_dir, parts, include_folders, include_files, after_key):
+    try:
+        with os.scandir(abs_dir) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        # os.walk silently skips unreadable directories as well
+        return
+
+    folders = [e for e in entries if e.is_dir()]
+    files = [e for e in entries if not e.is_dir()]
+
+    # An entry's position is (its parent's path parts, folders before files, name)
+    listed = []
+    if include_folders:
+        listed += [(e, True) for e in folders]
+    if include_files:
+        listed += [(e, False) for e in files]
+    for entry, is_folder in listed:
+        if after_key is not None and (parts, 0 if is_folder else 1, entry.name) <= after_key:
+            continue
+        yield "/" + "/".join(parts + (entry.name,)), entry.name, is_folder, entry.path
+
+    for entry in folders:
+        if entry.is_symlink():
+            # Same as os.walk(followlinks=False)
+            continue
+        sub_parts = parts + (entry.name,)
+        if after_key is not None:
+            cursor_dir = after_key[0]
+            # Everything in a subtree that sorts before the cursor's directory was already returned
+            if sub_parts < cursor_dir and cursor_dir[:len(sub_parts)] != sub_parts:
+                continue
+        yield from _walk_dir(entry.path, sub_parts, include_folders, include_files, after_key)
+
+
+def iter_walk_search(
+    db: Session,
+    query: str,
+    abs_parent: str,
+    base_path: str,
+    after: Optional[Tuple[str, bool]] = None,
+    limit: Optional[int] = None
+):
+    """
+    On-disk search under abs_parent, enriched with DB metadata where a record exists.
+    Also yields items that have no DB record (e.g. copied in outside the API).
+    Results are produced lazily while the walk is running.
+    """
+    chunk_size, first_chunk_size = page_chunk_sizes(limit)
+    query_lower = query.lower()
+    matches = (
+        (path, (name, is_folder, entry_path))
+        for path, name, is_folder, entry_path in walk_entries(abs_parent, base_path, after=after)
+        if query_lower in name.lower()
+    )
+
+    for path, (name, is_folder, entry_path), db_record, owner_email in hydrate_in_chunks(db, matches, chunk_size, first_chunk_size):
+        size = None if is_folder else logical_size(entry_path)
+        if db_record:
+            item = serialize_search_result(db_record, owner_email, size)
+            # Disk names are authoritative in walk mode
+            item["name"] = name
+        else:
+            item = {"name": name, "path": path, "is_folder": is_folder}
+            if not is_folder:
+                item["size"] = size
+        yield item
+
+
+def page_chunk_sizes(limit: Optional[int]) -> Tuple[int, int]:
+    """Hydration (chunk_size, first_chunk_size) that let a top-K walk stop right after limit + 1 matches."""
+    if limit is not None:
+        size = min(HYDRATION_CHUNK_SIZE, limit + 1)
+        return size, size
+    return HYDRATION_CHUNK_SIZE, HYDRATION_FIRST_CHUNK_SIZE
+
+
+def paged_response(
+    make_items: Callable[[Session], Iterator[dict]],
+    db: Session,
+    limit: Optional[int],
+    stream: bool,
+    headers: Optional[dict] = None,
+    request: Optional[Request] = None
+):
+    """
+    Send the results of make_items(session) to the client.
+
+    - With a limit, production stops after limit + 1 results (top-K early termination);
+      the extra result only signals that a further page exists.
+    - As a JSON list by default; the cursor for the next page goes in the X-Next-Cursor header.
+    - As application/x-ndjson when stream is set, one result per line written while the walk
+      is still running; a final {"next_cursor": ...} line is added when the limit cut it short.
+    headers are added to either response. With the request, a large JSON list is compressed
+    according to its Accept-Encoding (see response_utils.py).
+    """
+    headers = dict(headers or {})
+    if stream:
+        def body():
+            # The request's session may already be closed while the body streams, so use our own
+            stream_db = SessionLocal()
+            try:
+                last = None
+                for count, item in enumerate(make_items(stream_db)):
+                    if limit is not None and count == limit:
+                        yield dumps({"next_cursor": encode_cursor(last["path"], last["is_folder"])}) + b"\n"
+                        break
+                    last = item
+                    yield dumps(item) + b"\n"
+            finally:
+                stream_db.close()
+        return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
+
+    items = list(islice(make_items(db), limit + 1 if limit is not None else None))
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(items[-1]["path"], items[-1]["is_folder"])
+    return json_response(request, items, headers=headers)
@@ -0,0 +1,261 @@
+# backend/trash.py
+# FOLDER TRASH
+# Deleting a folder renames it into TRASH_PATH and moves its files rows to trashed_files with a
+# single statement, so the request costs the same for an empty folder as for one holding a
+# million files. Trashed folders can be restored until TrashPurger removes them (after
+# TRASH_RETENTION_DAYS, or on its next pass when a purge is requested) in batches, off the request path.
+
+import os
+import shutil
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import case, delete, insert, literal, or_, select, update, func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import File as FileModel, TrashEntry, TrashedFile
+from tree_utils import subtree_filter
+from folder_stats import compute, folder_change, folder_totals, record_changes, store
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+# Next to the storage root (listings and the reconciler never see it) and on the same
+# filesystem, so moving a folder in or out of the trash is a single rename
+TRASH_PATH = os.path.abspath(
+    os.getenv("TRASH_PATH", os.path.join(os.path.dirname(BASE_DIR), ".trash"))
+)
+
+TRASH_RETENTION_DAYS = float(os.getenv("TRASH_RETENTION_DAYS", "30"))
+TRASH_PURGE_INTERVAL = float(os.getenv("TRASH_PURGE_INTERVAL", "600"))  # seconds between purger passes
+TRASH_PURGE_BATCH_SIZE = int(os.getenv("TRASH_PURGE_BATCH_SIZE", "1000"))  # trashed_files rows per delete
+
+# A purge that has not finished after this long (worker died) is picked up again
+PURGE_STALE_AFTER = timedelta(hours=1)
+
+
+def trash_dir(entry_id: str) -> str:
+    return os.path.join(TRASH_PATH, entry_id)
+
+
+def purge_after(entry: TrashEntry) -> datetime:
+    return entry.deleted_at + timedelta(days=TRASH_RETENTION_DAYS)
+
+
+def _shared_columns() -> List[str]:
+    """Columns copied between files and trashed_files (generated ones like depth are recomputed)."""
+    return [
+        column.name for column in FileModel.__table__.c
+        if column.name in TrashedFile.__table__.c and column.computed is None
+    ]
+
+
+def move_to_trash(db: Session, user, db_path: str, abs_path: str) -> TrashEntry:
+    """
+    Trash the folder at abs_path (db_path in the files table) with everything below it.
+    One rename on disk and one DELETE ... RETURNING / INSERT statement in the DB; commits.
+    """
+    entry = TrashEntry(id=secrets.token_hex(16), original_path=db_path, deleted_by=user.id, deleted_at=datetime.utcnow())
+    os.makedirs(TRASH_PATH, exist_ok=True)
+    try:
+        os.rename(abs_path, trash_dir(entry.id))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting folder: {str(e)}")
+
+    try:
+        db.add(entry)
+        db.flush()
+        # The folder leaves the rollups of the folders above it; its own go with its rows
+        folder_id = db.query(FileModel.id).filter(FileModel.path == db_path).scalar()
+        if folder_id is not None:
+            record_changes(db, [folder_change(db_path, folder_totals(db, folder_id, db_path), -1)])
+        columns = _shared_columns()
+        moved = delete(FileModel).where(subtree_filter(db_path)).returning(
+            *[FileModel.__table__.c[name] for name in columns]
+        ).cte("moved")
+        db.execute(
+            insert(TrashedFile)
+            .from_select(["trash_id"] + columns, select(literal(entry.id), *[moved.c[name] for name in columns]))
+            .add_cte(moved)
+        )
+        entry.item_count, entry.total_size = db.query(
+            func.count(TrashedFile.id), func.coalesce(func.sum(TrashedFile.size), 0)
+        ).filter(TrashedFile.trash_id == entry.id).one()
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.rename(trash_dir(entry.id), abs_path)
+        raise
+    return entry
+
+
+def get_entry(db: Session, user, entry_id: str, for_update: bool = False) -> TrashEntry:
+    """The trash entry, if user deleted it or is an admin."""
+    query = db.query(TrashEntry).filter(TrashEntry.id == entry_id)
+    if for_update:
+        query = query.with_for_update()
+    entry = query.first()
+    if not entry or (entry.deleted_by != user.id and user.role.name != "admin"):
+        raise HTTPException(status_code=404, detail="Trash entry not found")
+    return entry
+
+
+def restore(db: Session, user, entry_id: str) -> List[int]:
+    """
+    Put a trashed folder back at its original path; commits. Returns the ids of the restored
+    files (not folders), whose content index was dropped along with their rows.
+    """
+    # Row lock: a purger claiming this entry waits until the restore is done and then finds it gone
+    entry = get_entry(db, user, entry_id, for_update=True)
+    if entry.purge_requested or entry.purge_started_at:
+        raise HTTPException(status_code=409, detail="Trash entry is being purged")
+
+    abs_path = os.path.abspath(os.path.join(BASE_DIR, entry.original_path.strip("/")))
+    if not abs_path.startswith(BASE_DIR):
+        raise HTTPException(status_code=400, detail="Invalid path")
+    if os.path.exists(abs_path) or db.query(FileModel.id).filter(FileModel.path == entry.original_path).first():
+        raise HTTPException(status_code=409, detail="A file or folder already exists at the original location")
+    if not os.path.isdir(os.path.dirname(abs_path)):
+        raise HTTPException(status_code=409, detail="The original parent folder no longer exists")
+
+    try:
+        os.rename(trash_dir(entry.id), abs_path)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error restoring folder: {str(e)}")
+
+    try:
+        columns = _shared_columns()
+        moved = delete(TrashedFile).where(TrashedFile.trash_id == entry.id).returning(
+            *[TrashedFile.__table__.c[name] for name in columns]
+        ).cte("moved")
+        # The folder's parent is looked up again by the insert trigger: it may have been re-created since
+        selected = [
+            case((moved.c.path == entry.original_path, None), else_=moved.c.parent_id) if name == "parent_id" else moved.c[name]
+            for name in columns
+        ]
+        restored = db.execute(
+            insert(FileModel)
+            .from_select(columns, select(*selected))
+            .add_cte(moved)
+            .returning(FileModel.id, FileModel.is_folder)
+        ).all()
+        # Rollups were dropped with the rows: rebuild them for the subtree and add it to the folders above
+        totals = compute(db, entry.original_path)
+        store(db, totals)
+        folder_id = db.query(FileModel.id).filter(FileModel.path == entry.original_path).scalar()
+        record_changes(db, [folder_change(entry.original_path, totals.get(folder_id, [0, 0, 0, 0]))])
+        db.delete(entry)
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.rename(abs_path, trash_dir(entry_id))
+        raise
+    return [file_id for file_id, is_folder in restored if not is_folder]
+
+
+def request_purge(db: Session, user, entry_id: str):
+    """Have the purger remove an entry on its next pass instead of after the retention period."""
+    entry = get_entry(db, user, entry_id, for_update=True)
+    entry.purge_requested = True
+    db.commit()
+    trash_purger.wake()
+
+
+def purge_entry(db: Session, entry_id: str) -> bool:
+    """
+    Remove a trashed folder for good: its directory, then its rows in batches of
+    TRASH_PURGE_BATCH_SIZE, releasing blobs nothing refers to any more. False if another
+    worker is purging it or it was restored meanwhile.
+    """
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(TrashEntry)
+        .where(
+            TrashEntry.id == entry_id,
+            or_(TrashEntry.purge_started_at == None, TrashEntry.purge_started_at < now - PURGE_STALE_AFTER)
+        )
+        .values(purge_started_at=now)
+    ).rowcount
+    db.commit()
+    if not claimed:
+        return False
+
+    from blob_store import release_blobs
+    shutil.rmtree(trash_dir(entry_id), ignore_errors=True)
+    while True:
+        batch = select(TrashedFile.id).where(TrashedFile.trash_id == entry_id).limit(TRASH_PURGE_BATCH_SIZE)
+        digests = db.execute(
+            delete(TrashedFile).where(TrashedFile.id.in_(batch.scalar_subquery())).returning(TrashedFile.content_hash)
+        ).scalars().all()
+        db.commit()
+        # The tree's links are gone, so a blob only these rows referred to can go as well
+        release_blobs(db, digests)
+        if len(digests) < TRASH_PURGE_BATCH_SIZE:
+            break
+    db.execute(delete(TrashEntry).where(TrashEntry.id == entry_id))
+    db.commit()
+    return True
+
+
+class TrashPurger:
+    """Background thread purging expired and requested trash entries every TRASH_PURGE_INTERVAL seconds."""
+
+    def __init__(self, interval: float = TRASH_PURGE_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trash-purger", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pass()
+            except Exception as e:
+                print(f"Trash purge failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_pass(self) -> int:
+        """Purge every entry that is due; returns how many were removed."""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=TRASH_RETENTION_DAYS)
+            due = [
+                entry_id for (entry_id,) in db.query(TrashEntry.id).filter(
+                    or_(TrashEntry.purge_requested == True, TrashEntry.deleted_at < cutoff)
+                ).order_by(TrashEntry.deleted_at)
+            ]
+            db.commit()
+            purged = 0
+            for entry_id in due:
+                if self._stop.is_set():
+                    break
+                if purge_entry(db, entry_id):
+                    purged += 1
+            if purged:
+                print(f"Trash purger: {purged} entries removed")
+            return purged
+        finally:
+            db.close()
+
+
+trash_purger = TrashPurger()
@@ -0,0 +1,111 @@
+# backend/tree_utils.py
+# SET-BASED SUBTREE UPDATES ON THE FILES TABLE
+# Renaming or moving a folder changes the path of every row below it. The rewrite is one UPDATE
+# using the uq_files_path index, so no descendant rows are loaded into Python.
+# parent_id links each row to its folder row. Inserts get it from the files_set_parent_id trigger
+# (models.py); moves keep it in line here. depth is a generated column and follows path by itself.
+
+from datetime import datetime
+from typing import Iterable, Optional
+from fastapi import HTTPException
+from sqlalchemy import case, delete, func, literal, or_, text, update
+from sqlalchemy.orm import Session
+from models import File as FileModel, Team
+from search_utils import escape_like
+
+
+def parent_path(db_path: str) -> str:
+    """"/a/b" -> "/a"; "" for items at the root."""
+    return db_path.rsplit("/", 1)[0]
+
+
+def parent_id_for(db: Session, db_path: str) -> Optional[int]:
+    """id of the folder row that db_path belongs in (None at the root or if it isn't registered)."""
+    folder = parent_path(db_path)
+    if not folder:
+        return None
+    return db.query(FileModel.id).filter(FileModel.path == folder, FileModel.is_folder == True).scalar()
+
+
+def subtree_filter(db_path: str):
+    """The folder at db_path and everything below it (a prefix range scan on uq_files_path)."""
+    return or_(
+        FileModel.path == db_path,
+        FileModel.path.like(escape_like(db_path + "/") + "%", escape="\\")
+    )
+
+
+def rewrite_subtree(db: Session, old_path: str, new_path: str, new_name: Optional[str] = None) -> int:
+    """
+    Replace the old_path prefix with new_path on the folder and all its descendants in one
+    statement (after dropping stale rows left at new_path); new_name also renames the folder row itself. Only the folder changes parents,
+    the descendants keep theirs. Returns the number of rows changed. Nothing is committed.
+    """
+    # Nothing is on disk at new_path yet, so any rows there are stale and would collide
+    drop_stale_rows(db, [
+        path for (path,) in db.query(FileModel.path).filter(subtree_filter(new_path))
+    ])
+    values = {
+        "path": literal(new_path) + func.substr(FileModel.path, len(old_path) + 1),
+        "parent_id": case((FileModel.path == old_path, parent_id_for(db, new_path)), else_=FileModel.parent_id),
+        "modified_at": datetime.utcnow()
+    }
+    if new_name is not None:
+        values["name"] = case((FileModel.path == old_path, new_name), else_=FileModel.name)
+    result = db.execute(
+        update(FileModel)
+        .where(subtree_filter(old_path))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def drop_stale_rows(db: Session, db_paths: Iterable[str], chunk_size: int = 500, keep_ids: Iterable[int] = ()) -> int:
+    """
+    Delete rows still registered at paths the caller has just created on disk (or renamed or
+    moved something to): left behind when the entry was removed outside the API (the reconciler
+    keeps such rows unless it fixes orphans), they would make the new row's insert or update
+    violate uq_files_path. A stale folder row goes with its subtree, and the rollups above are
+    adjusted. A team's folder row is never dropped (409); neither are rows in keep_ids (rows the
+    caller moves away or deletes itself). Returns the number of rows deleted. Nothing is committed.
+    """
+    keep_ids = set(keep_ids)
+    from folder_stats import file_change, folder_change, folder_totals, record_changes
+    db_paths = list(db_paths)
+    stale = []
+    for i in range(0, len(db_paths), chunk_size):
+        stale += db.query(
+            FileModel.id, FileModel.path, FileModel.is_folder, FileModel.size, FileModel.stored_size, Team.name
+        ).outerjoin(Team, Team.folder_id == FileModel.id).filter(FileModel.path.in_(db_paths[i:i + chunk_size])).all()
+
+    removed = 0
+    dropped_folders = []
+    # Parents first: a stale folder takes the stale rows below it along
+    for file_id, path, is_folder, size, stored, team_name in sorted(stale, key=lambda row: row.path.count("/")):
+        if file_id in keep_ids or any(path.startswith(folder + "/") for folder in dropped_folders):
+            continue
+        if team_name is not None:
+            raise HTTPException(status_code=409, detail=f"{path} is the folder of team {team_name}")
+        if is_folder:
+            record_changes(db, [folder_change(path, folder_totals(db, file_id, path), -1)])
+            removed += db.execute(
+                delete(FileModel).where(subtree_filter(path)).execution_options(synchronize_session=False)
+            ).rowcount
+            dropped_folders.append(path)
+        else:
+            record_changes(db, [file_change(path, size, stored, -1)])
+            removed += db.execute(
+                delete(FileModel).where(FileModel.id == file_id).execution_options(synchronize_session=False)
+            ).rowcount
+    if removed:
+        print(f"Removed {removed} stale rows at reused paths")
+    return removed
+
+
+def backfill_parent_ids(conn):
+    """Set parent_id on rows stored before the column existed, parents resolved by path in one UPDATE."""
+    conn.execute(text(
+        "UPDATE files AS child SET parent_id = parent.id FROM files AS parent "
+        "WHERE child.parent_id IS NULL AND parent.path = regexp_replace(child.path, '/[^/]*$', '')"
+    ))
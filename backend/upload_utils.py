@@ -0,0 +1,205 @@
+# backend/upload_utils.py
+# RESUMABLE CHUNKED UPLOADS
+# Chunks are appended to a staging file per upload session; at finalize the file is checksummed
+# and renamed into the storage tree in one step, so a half-uploaded file is never visible there.
+
+import os
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from models import File as FileModel, UploadSession
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # Windows: byte-range lock through msvcrt instead of flock
+    fcntl = None
+    import msvcrt
+
+# Storage configuration - same root the folder endpoints use
+BASE_DIR = os.path.abspath(os.getenv("STORAGE_PATH", os.path.join(os.path.dirname(__file__), "storage")))
+
+# Staging files live next to the storage root (not inside it, so listings and the reconciler
+# never see them) and must be on the same filesystem for the final rename to be atomic
+UPLOAD_STAGING_PATH = os.path.abspath(
+    os.getenv("UPLOAD_STAGING_PATH", os.path.join(os.path.dirname(BASE_DIR), ".upload_staging"))
+)
+
+# Sessions without activity for this long are discarded together with their staging file
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+# Chunk size suggested to clients; any size is accepted
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def staging_file(upload_id: str) -> str:
+    return os.path.join(UPLOAD_STAGING_PATH, upload_id)
+
+
+def new_upload_id() -> str:
+    return secrets.token_hex(16)
+
+
+def create_staging_file(upload_id: str):
+    os.makedirs(UPLOAD_STAGING_PATH, exist_ok=True)
+    with open(staging_file(upload_id), "xb"):
+        pass
+
+
+def received_bytes(upload_id: str) -> int:
+    """Current offset of an upload: the staging file holds exactly the bytes received so far."""
+    try:
+        return os.path.getsize(staging_file(upload_id))
+    except OSError:
+        raise HTTPException(status_code=410, detail="Upload data is no longer available")
+
+
+def _try_lock(f) -> bool:
+    """Exclusive non-blocking lock on an open staging file; False if another writer holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            # Locks the first byte; writes through this same handle are not affected
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        # BlockingIOError from flock, PermissionError from msvcrt
+        return False
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _unlock(f):
+    # flock locks go away with the file; msvcrt ones must be released explicitly before closing
+    if fcntl is None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+async def write_chunk(session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> int:
+    """
+    Append a request body to the staging file at offset and return the new offset.
+    offset must equal the bytes already received, so retried or reordered chunks can't
+    leave gaps. Whatever arrives before a dropped connection is kept, and the client
+    resumes from the offset reported by the status endpoint.
+    """
+    try:
+        f = open(staging_file(session.id), "r+b")
+    except OSError:
+        raise HTTPException(status_code=410, detail="Upload data is no longer available")
+    with f:
+        # One writer per session, also across worker processes
+        if not _try_lock(f):
+            raise HTTPException(status_code=409, detail="Another chunk of this upload is being written")
+        try:
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise HTTPException(status_code=409, detail=f"Offset mismatch, expected {current}")
+
+            f.seek(offset)
+            async for data in body:
+                if current + len(data) > session.total_size:
+                    await run_in_threadpool(f.truncate, current)
+                    raise HTTPException(status_code=413, detail="Chunk exceeds the declared file size")
+                # Disk writes go to the threadpool so a slow disk doesn't stall the event loop
+                await run_in_threadpool(f.write, data)
+                current += len(data)
+            await run_in_threadpool(_sync, f)
+            return current
+        finally:
+            _unlock(f)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def install_file(source: str, destination: str, digest: Optional[str] = None):
+    """
+    Move a finished staging file to its final location without replacing an existing file.
+    link + unlink fails atomically if the destination appeared in the meantime; filesystems
+    without hard links fall back to rename.
+    With a digest and DEDUP_ENABLED the file goes through the blob store instead.
+    Eligible files are compressed first when COMPRESSION_ENABLED.
+    """
+    from blob_store import place_file
+    from compression import compress_file
+    compress_file(source, os.path.basename(destination))
+    try:
+        if digest and place_file(source, destination, digest):
+            return
+        os.link(source, destination)
+    except FileExistsError:
+        raise HTTPException(status_code=400, detail=f"File '{os.path.basename(destination)}' already exists")
+    except OSError:
+        if os.path.exists(destination):
+            raise HTTPException(status_code=400, detail=f"File '{os.path.basename(destination)}' already exists")
+        os.replace(source, destination)
+        return
+    os.unlink(source)
+
+
+def discard_session(db: Session, session: UploadSession):
+    """Delete a session row and its staging file (commits)."""
+    try:
+        os.remove(staging_file(session.id))
+    except FileNotFoundError:
+        pass
+    db.delete(session)
+    db.commit()
+
+
+def purge_expired_sessions(db: Session):
+    """Drop sessions that have been idle for longer than UPLOAD_SESSION_TTL_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    expired = db.query(UploadSession).filter(UploadSession.updated_at < cutoff).all()
+    for session in expired:
+        discard_session(db, session)
+
+
+def register_files(db: Session, rows: List[dict]) -> List[int]:
+    """
+    Insert files rows with one multi-row INSERT ... RETURNING and return their ids in input order.
+    The rows are added to the folder rollups (new folders start empty; see folder_stats.py).
+    Rows left at these paths by entries removed outside the API are dropped first.
+    Nothing is committed, so the caller commits the rows together with its activity entry.
+    """
+    if not rows:
+        return []
+    from tree_utils import drop_stale_rows
+    drop_stale_rows(db, [row["path"] for row in rows])
+    result = db.execute(
+        insert(FileModel).returning(FileModel.id, sort_by_parameter_order=True),
+        rows
+    )
+    ids = [file_id for (file_id,) in result]
+
+    from folder_stats import init_folders, record_changes, file_change
+    init_folders(db, [file_id for file_id, row in zip(ids, rows) if row.get("is_folder")])
+    record_changes(db, [
+        (row["path"], 0, 0, 0, 1) if row.get("is_folder") else file_change(row["path"], row.get("size"), row.get("stored_size"))
+        for row in rows
+    ])
+    return ids
+
+
+def upload_batch_details(remark: Optional[str], files) -> str:
+    """Activity log details for a multi-file upload: the remark followed by every file and its size."""
+    listing = ", ".join(f"{staged.filename} ({staged.size} bytes)" for staged in files)
+    summary = f"{len(files)} files: {listing}"
+    return f"{remark} | {summary}" if remark else summary
@@ -0,0 +1,122 @@
+# backend/zip_utils.py
+# STREAMING ZIP DOWNLOADS
+# Builds a ZIP (ZIP64 where needed) of folders and files while it is being sent: nothing is
+# written to disk and memory stays at one read chunk, whatever the size of the selection.
+
+import os
+import io
+import zipfile
+from typing import Callable, Iterator, List, Optional, Tuple
+from compression import logical_size, open_stored
+
+CHUNK_SIZE = 1024 * 1024
+
+# Formats that are already compressed gain nothing from deflate, so they are stored as-is
+STORED_EXTENSIONS = {
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mov", ".avi", ".mkv", ".webm"
+}
+
+# (name inside the archive, absolute path on disk); folders end with "/"
+ZipEntry = Tuple[str, str]
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target for ZipFile; whatever was written is handed out by drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip_entries(
+    selections: List[Tuple[str, str]],
+    is_allowed: Callable[[str], bool]
+) -> Iterator[ZipEntry]:
+    """
+    Expand selected (archive name, absolute path) pairs into ZIP entries, walking folders lazily.
+    is_allowed(abs_dir) is asked once per directory below a selected folder; a directory that is
+    not allowed is skipped with everything below it. Symlinks are never followed.
+    """
+    for arc_root, abs_root in selections:
+        if not os.path.isdir(abs_root):
+            yield arc_root, abs_root
+            continue
+        for dirpath, dirnames, filenames in os.walk(abs_root):
+            if dirpath != abs_root and not is_allowed(dirpath):
+                dirnames.clear()
+                continue
+            dirnames[:] = sorted(d for d in dirnames if not os.path.islink(os.path.join(dirpath, d)))
+            rel_dir = os.path.relpath(dirpath, abs_root).replace("\\", "/")
+            arc_dir = arc_root if rel_dir == "." else f"{arc_root}/{rel_dir}"
+            yield arc_dir + "/", dirpath
+            for name in sorted(filenames):
+                abs_path = os.path.join(dirpath, name)
+                if not os.path.islink(abs_path):
+                    yield f"{arc_dir}/{name}", abs_path
+
+
+def unique_archive_names(paths: List[str]) -> List[str]:
+    """Top-level archive names for the selected paths; repeated base names get " (2)", " (3)", ..."""
+    names = []
+    taken = set()
+    for path in paths:
+        base = os.path.basename(path.rstrip("/")) or "storage"
+        stem, ext = os.path.splitext(base)
+        name, n = base, 1
+        while name in taken:
+            n += 1
+            name = f"{stem} ({n}){ext}"
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+def stream_zip(entries: Iterator[ZipEntry], on_skip: Optional[Callable[[str, Exception], None]] = None) -> Iterator[bytes]:
+    """Generate the bytes of a ZIP archive of entries."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for arcname, abs_path in entries:
+            try:
+                if arcname.endswith("/"):
+                    archive.writestr(zipfile.ZipInfo.from_file(abs_path, arcname), b"")
+                else:
+                    yield from _write_file(archive, sink, arcname, abs_path)
+            except OSError as e:
+                # Removed or unreadable since the walk listed it; leave it out
+                if on_skip is not None:
+                    on_skip(arcname, e)
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def _write_file(archive: zipfile.ZipFile, sink: _ChunkSink, arcname: str, abs_path: str):
+    with open_stored(abs_path) as src:
+        # file_size lets zipfile switch to ZIP64 headers for files over 4 GB
+        info = zipfile.ZipInfo.from_file(abs_path, arcname)
+        info.file_size = logical_size(abs_path)
+        if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w") as dest:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dest.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data